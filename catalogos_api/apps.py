@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CatalogosApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalogos_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
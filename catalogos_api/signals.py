@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from db.models import TiposDenuncia
+
+from .tipos import invalidar
+
+
+@receiver(post_save, sender=TiposDenuncia)
+@receiver(post_delete, sender=TiposDenuncia)
+def tipos_denuncia_cambiados(sender, **kwargs):
+    invalidar()
@@ -0,0 +1,163 @@
+"""
+Índice en memoria de TiposDenuncia activos (por proceso).
+
+- Normaliza mayúsculas/tildes/puntuación y aplica sinónimos ("aseo" -> basura).
+- Busca por coincidencia exacta, contención, palabras y similitud de trigramas.
+- Se invalida con un sello de versión en caché que se incrementa al
+  guardar/borrar un TiposDenuncia (signals.py); además se recarga cada
+  TIPOS_INDICE_MAX_SEG por si la caché no es compartida entre procesos.
+"""
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+from db.models import TiposDenuncia
+
+
+VERSION_KEY = "catalogo:tipos:version"
+UMBRAL_TRIGRAMAS = 0.35
+
+# palabra del ciudadano -> palabra que aparece en el nombre del tipo
+SINONIMOS = {
+    "aseo": "basura",
+    "desechos": "basura",
+    "desperdicios": "basura",
+    "recoleccion": "basura",
+    "residuos": "basura",
+    "luz": "alumbrado",
+    "luminaria": "alumbrado",
+    "lampara": "alumbrado",
+    "foco": "alumbrado",
+    "poste": "alumbrado",
+    "bache": "vias",
+    "baches": "vias",
+    "hueco": "vias",
+    "calle": "vias",
+    "carretera": "vias",
+    "bulla": "ruido",
+    "alcantarilla": "alcantarillado",
+    "desague": "alcantarillado",
+}
+
+STOPWORDS = {"de", "del", "la", "las", "el", "los", "en", "y", "o", "por", "para", "con", "un", "una", "mal", "hay"}
+
+_re_no_alnum = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: str):
+    t = unicodedata.normalize("NFKD", texto or "")
+    t = "".join(ch for ch in t if not unicodedata.combining(ch)).lower()
+    return _re_no_alnum.sub(" ", t).strip()
+
+
+def _con_sinonimos(norm: str):
+    return " ".join(SINONIMOS.get(p, p) for p in norm.split())
+
+
+def _raiz(p: str):
+    # plural simple: "ruidos" -> "ruido", "luces" -> "luc"
+    if len(p) > 4 and p.endswith("es"):
+        return p[:-2]
+    if len(p) > 3 and p.endswith("s"):
+        return p[:-1]
+    return p
+
+
+def _palabras(norm: str):
+    return {_raiz(p) for p in norm.split() if p not in STOPWORDS}
+
+
+def _trigramas(norm: str):
+    out = set()
+    for p in norm.split():
+        p = f"  {p} "
+        out.update(p[i:i + 3] for i in range(len(p) - 2))
+    return out
+
+
+# =========================================================
+# Índice
+# =========================================================
+class _Indice:
+    def __init__(self, version):
+        self.version = version
+        self.cargado = time.monotonic()
+        self.tipos = []     # [{"id", "nombre"}] ordenado por nombre
+        self.entradas = []  # (id, norm, palabras, trigramas)
+        for t in TiposDenuncia.objects.filter(activo=True).order_by("nombre").only("id", "nombre"):
+            norm = normalizar(t.nombre)
+            self.tipos.append({"id": int(t.id), "nombre": t.nombre})
+            self.entradas.append((int(t.id), norm, _palabras(norm), _trigramas(norm)))
+
+    def buscar(self, texto: str):
+        n = normalizar(texto)
+        if not n:
+            return None
+        n = _con_sinonimos(n)
+
+        for tid, norm, _, _ in self.entradas:
+            if n == norm:
+                return tid
+        if len(n) >= 4 and n not in STOPWORDS:
+            for tid, norm, _, _ in self.entradas:
+                if norm and (norm in n or n in norm):
+                    return tid
+
+        palabras = _palabras(n)
+        tri = _trigramas(n)
+        mejor, mejor_score = None, 0.0
+        for tid, _, pals, tris in self.entradas:
+            comunes = len(palabras & pals)
+            jac = len(tri & tris) / len(tri | tris) if tris else 0.0
+            score = comunes + jac
+            if score > mejor_score:
+                mejor, mejor_score = tid, score
+        if mejor_score >= 1 or mejor_score >= UMBRAL_TRIGRAMAS:
+            return mejor
+        return None
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def version():
+    v = cache.get(VERSION_KEY)
+    if v is None:
+        cache.add(VERSION_KEY, 1, None)
+        v = cache.get(VERSION_KEY, 1)
+    return v
+
+
+def invalidar():
+    """Llamar al modificar TiposDenuncia (lo hacen los signals)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def get_indice():
+    global _indice
+    v = version()
+    max_seg = getattr(settings, "TIPOS_INDICE_MAX_SEG", 300)
+    idx = _indice
+    if idx is not None and idx.version == v and time.monotonic() - idx.cargado < max_seg:
+        return idx
+    with _lock:
+        if _indice is None or _indice.version != v or time.monotonic() - _indice.cargado >= max_seg:
+            _indice = _Indice(v)
+        return _indice
+
+
+def match_tipo(texto: str):
+    """id del tipo activo que mejor coincide con el texto, o None."""
+    return get_indice().buscar(texto)
+
+
+def tipos_activos():
+    return list(get_indice().tipos)
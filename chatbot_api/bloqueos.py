@@ -0,0 +1,108 @@
+"""
+Advisory locks de Postgres compartidos por todos los workers.
+
+Cada lock tomado ocupa una conexión dedicada (fuera de connections[...], así
+el fin del request no la cierra y se puede soltar desde cualquier hilo) y dura
+como máximo max_seg: si nadie lo suelta se cierra la conexión y Postgres lo
+libera, igual que si el proceso muere. Las conexiones libres se reutilizan.
+
+Lo usan turnos.py (un turno por conversación) y llm_gateway.py (cupos de
+LLM_MAX_CONCURRENTES). Con otra base de datos (SQLite en desarrollo) cada
+módulo vuelve a su lease en la caché.
+"""
+import logging
+import threading
+
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+MAX_CONEXIONES_LIBRES = 4
+
+_libres = []
+_libres_lock = threading.Lock()
+
+
+def disponible():
+    return connection.vendor == "postgresql"
+
+
+def _conexion():
+    with _libres_lock:
+        if _libres:
+            return _libres.pop()
+    conn = connections.create_connection("default")
+    conn.inc_thread_sharing()
+    return conn
+
+
+def _devolver(conn):
+    with _libres_lock:
+        if len(_libres) < MAX_CONEXIONES_LIBRES and conn.is_usable():
+            _libres.append(conn)
+            return
+    conn.close()
+
+
+class Bloqueo:
+    def __init__(self, clase: int, clave: int, conn, max_seg: float):
+        self.clase = clase
+        self.clave = clave
+        self.conn = conn
+        self.soltado = threading.Lock()
+        self.vence = threading.Timer(max_seg, self._vencer)
+        self.vence.daemon = True
+        self.vence.start()
+
+    def _vencer(self):
+        if self.soltado.acquire(blocking=False):
+            logger.warning("Advisory lock (%s, %s) superó su duración máxima: se suelta", self.clase, self.clave)
+            self.conn.close()
+
+    def soltar(self):
+        self.vence.cancel()
+        if not self.soltado.acquire(blocking=False):
+            return
+        try:
+            with self.conn.cursor() as c:
+                c.execute("SELECT pg_advisory_unlock(%s, %s)", (self.clase, self.clave))
+        except Exception:
+            # al cerrar la conexión Postgres libera el lock igual
+            self.conn.close()
+            return
+        _devolver(self.conn)
+
+
+def _consultar(sql, params):
+    conn = _conexion()
+    try:
+        with conn.cursor() as c:
+            c.execute(sql, params)
+            fila = c.fetchone()
+    except Exception:
+        conn.close()
+        raise
+    return conn, fila
+
+
+def tomar(clase: int, clave: int, max_seg: float):
+    """Bloqueo o None si lo tiene otro."""
+    conn, fila = _consultar("SELECT pg_try_advisory_lock(%s, %s)", (clase, clave))
+    if fila and fila[0]:
+        return Bloqueo(clase, clave, conn, max_seg)
+    _devolver(conn)
+    return None
+
+
+def tomar_alguno(clase: int, n: int, max_seg: float):
+    """Primer lock libre de (clase, 0..n-1) en orden aleatorio, o None si están todos tomados."""
+    # la condición volátil no se empuja dentro de la subconsulta: se prueba de a uno hasta el LIMIT
+    conn, fila = _consultar(
+        "SELECT s FROM (SELECT s FROM generate_series(0, %s - 1) AS s ORDER BY random()) AS t "
+        "WHERE pg_try_advisory_lock(%s, s) LIMIT 1",
+        (n, clase),
+    )
+    if fila:
+        return Bloqueo(clase, fila[0], conn, max_seg)
+    _devolver(conn)
+    return None
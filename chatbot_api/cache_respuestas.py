@@ -0,0 +1,176 @@
+"""
+Caché de respuestas para preguntas generales del chatbot.
+
+Solo se usa cuando la conversación todavía no tiene borrador (la respuesta
+no depende de datos del ciudadano) y el mensaje parece una pregunta. Solo se
+guardan respuestas generadas sin historial (primera pregunta tras el saludo,
+sin previous_response_id): la clave es el texto y se comparte entre ciudadanos.
+
+- Coincidencia exacta por texto normalizado (clave en la caché de Django,
+  con TTL por entrada).
+- Coincidencia aproximada: vector local de trigramas de caracteres
+  (hasheados, L2) y similitud coseno contra las preguntas ya respondidas
+  en este proceso y contra la tabla FAQ visible.
+- Métricas de aciertos por origen (exacta / similar / faq).
+"""
+import hashlib
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+
+from catalogos_api.tipos import normalizar, version as version_tipos
+from db.models import Faq
+
+logger = logging.getLogger(__name__)
+
+DIM = 2048
+MAX_RECIENTES = 500
+FAQ_RECARGA_SEG = 300
+MAX_PALABRAS = 20  # preguntas largas suelen traer contexto propio
+
+INTERROGATIVOS = {
+    "que", "como", "cuanto", "cuanta", "cuantos", "cuando", "donde", "cual", "cuales", "quien", "puedo",
+}
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def es_pregunta(texto: str):
+    norm = normalizar(texto)
+    palabras = norm.split()
+    if not palabras or len(palabras) > MAX_PALABRAS:
+        return False
+    return "?" in texto or "¿" in texto or palabras[0] in INTERROGATIVOS
+
+
+def vector(texto: str):
+    v = np.zeros(DIM, dtype=np.float32)
+    for p in normalizar(texto).split():
+        p = f"#{p}#"
+        for i in range(max(1, len(p) - 2)):
+            v[zlib.crc32(p[i:i + 3].encode()) % DIM] += 1.0
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+
+def _key(norm: str):
+    # la lista de tipos cambia la respuesta a "¿qué tipos hay?"
+    h = hashlib.sha1(norm.encode()).hexdigest()
+    return f"chat:resp:{version_tipos()}:{h}"
+
+
+# =========================================================
+# Índices en memoria
+# =========================================================
+class _Recientes:
+    """Preguntas respondidas por el LLM en este proceso (LRU) -> clave de caché."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = OrderedDict()  # key -> vector
+
+    def agregar(self, key, vec):
+        with self.lock:
+            self.items[key] = vec
+            self.items.move_to_end(key)
+            while len(self.items) > MAX_RECIENTES:
+                self.items.popitem(last=False)
+
+    def mas_similar(self, vec):
+        with self.lock:
+            if not self.items:
+                return None, 0.0
+            keys = list(self.items.keys())
+            M = np.stack(list(self.items.values()))
+        sims = M @ vec
+        i = int(np.argmax(sims))
+        return keys[i], float(sims[i])
+
+
+_recientes = _Recientes()
+
+_faq = {"cargado": 0.0, "respuestas": [], "M": None}
+_faq_lock = threading.Lock()
+
+
+def _faq_indice():
+    with _faq_lock:
+        if time.monotonic() - _faq["cargado"] >= FAQ_RECARGA_SEG:
+            filas = list(Faq.objects.filter(visible=True).values_list("pregunta", "respuesta"))
+            _faq["respuestas"] = [r for _, r in filas]
+            _faq["M"] = np.stack([vector(p) for p, _ in filas]) if filas else None
+            _faq["cargado"] = time.monotonic()
+        return _faq["respuestas"], _faq["M"]
+
+
+# =========================================================
+# Métricas
+# =========================================================
+_stats = {"consultas": 0, "exacta": 0, "similar": 0, "faq": 0, "guardadas": 0}
+_stats_lock = threading.Lock()
+
+
+def _contar(campo: str):
+    with _stats_lock:
+        _stats[campo] += 1
+
+
+def metricas():
+    with _stats_lock:
+        d = dict(_stats)
+    aciertos = d["exacta"] + d["similar"] + d["faq"]
+    d["hit_rate"] = round(aciertos / d["consultas"], 3) if d["consultas"] else 0.0
+    return d
+
+
+# =========================================================
+# API
+# =========================================================
+def buscar(texto: str):
+    """Texto de respuesta o None."""
+    if not es_pregunta(texto):
+        return None
+    _contar("consultas")
+    norm = normalizar(texto)
+
+    hit = cache.get(_key(norm))
+    if hit:
+        _contar("exacta")
+        return hit
+
+    vec = vector(texto)
+    key, sim = _recientes.mas_similar(vec)
+    if key and sim >= _cfg("CHAT_CACHE_UMBRAL", 0.9):
+        hit = cache.get(key)
+        if hit:
+            _contar("similar")
+            return hit
+
+    respuestas, M = _faq_indice()
+    if M is not None:
+        sims = M @ vec
+        i = int(np.argmax(sims))
+        if sims[i] >= _cfg("CHAT_CACHE_UMBRAL_FAQ", 0.75):
+            _contar("faq")
+            return respuestas[i]
+
+    return None
+
+
+def guardar(texto: str, respuesta: str, ttl=None):
+    """Guarda una respuesta buena del LLM a una pregunta general."""
+    if not respuesta or not es_pregunta(texto):
+        return
+    key = _key(normalizar(texto))
+    cache.set(key, respuesta, ttl or _cfg("CHAT_CACHE_TTL_SEG", 6 * 3600))
+    _recientes.agregar(key, vector(texto))
+    _contar("guardadas")
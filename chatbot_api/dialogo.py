@@ -0,0 +1,100 @@
+"""
+Máquina de estados de slots del borrador (camino rápido sin LLM).
+
+Si el mensaje es estructurado (ubicación del botón, "tipo: ...",
+"descripcion: ...") y completa un dato que faltaba, la siguiente pregunta
+sale de plantillas y el turno no llama al modelo.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# orden en que se piden los datos obligatorios
+SLOTS = ("tipo", "descripcion", "ubicacion")
+
+PREGUNTAS = {
+    "tipo": "¿Qué tipo de denuncia es? (Ej: basura, alumbrado, vías...)",
+    "descripcion": "Gracias 🙂. Ahora descríbeme brevemente el problema.",
+    "ubicacion": "📍 Por favor envía tu ubicación con el botón de Ubicación.",
+}
+PREGUNTA_CONFIRMAR = (
+    "Tengo todo lo necesario:\n"
+    "• Tipo: {tipo}\n"
+    "• Descripción: {descripcion}\n"
+    "{referencia}"
+    "¿Deseas enviar la denuncia ahora? Recuerda que se enviará al instante (sí/no)"
+)
+# lo que puede quedar del mensaje tras quitar los campos extraídos
+MAX_RESIDUAL = 3
+RELLENO = {"mi", "ubicacion", "ubicación", "aqui", "aquí", "es", "esta", "está", "y", "la", "el", "en", "de"}
+
+
+def faltantes(datos: dict):
+    datos = datos or {}
+    out = []
+    if not datos.get("tipo_denuncia_id"):
+        out.append("tipo")
+    if not datos.get("descripcion"):
+        out.append("descripcion")
+    if datos.get("latitud") is None or datos.get("longitud") is None:
+        out.append("ubicacion")
+    return out
+
+
+def es_estructurado(residual: str):
+    palabras = "".join(ch if ch.isalnum() else " " for ch in (residual or "").lower()).split()
+    return sum(len(p) for p in palabras if p not in RELLENO) <= MAX_RESIDUAL
+
+
+def respuesta_local(antes: list, datos: dict, extracted: dict, residual: str, tipo_nombre=None):
+    """
+    antes: faltantes() del borrador antes del turno; datos: datos_json ya actualizado.
+    Devuelve el texto del bot o None si el turno necesita al LLM.
+    """
+    if not extracted or not es_estructurado(residual):
+        return None
+    # "tipo: xyz" que no coincide con ningún tipo: el LLM muestra la lista
+    if extracted.get("tipo_texto") and not datos.get("tipo_denuncia_id"):
+        return None
+
+    despues = faltantes(datos)
+    if not (set(antes) - set(despues)):
+        return None
+
+    if despues:
+        return PREGUNTAS[despues[0]]
+
+    ref = datos.get("referencia") or datos.get("direccion_texto")
+    return PREGUNTA_CONFIRMAR.format(
+        tipo=tipo_nombre or datos.get("tipo_denuncia_id"),
+        descripcion=datos.get("descripcion"),
+        referencia=f"• Referencia: {ref}\n" if ref else "(Si quieres, agrega una referencia: \"referencia: ...\")\n",
+    )
+
+
+# =========================================================
+# Métricas: % de turnos atendidos sin LLM
+# =========================================================
+_turnos = {"local": 0, "llm": 0}
+_lock = threading.Lock()
+
+
+def registrar_turno(local: bool):
+    with _lock:
+        _turnos["local" if local else "llm"] += 1
+        total = _turnos["local"] + _turnos["llm"]
+    if total % 100 == 0:
+        logger.info("chatbot: %s", metricas())
+
+
+def metricas():
+    with _lock:
+        total = _turnos["local"] + _turnos["llm"]
+        return {
+            "turnos": total,
+            "locales": _turnos["local"],
+            "llm": _turnos["llm"],
+            "porcentaje_local": round(100.0 * _turnos["local"] / total, 1) if total else 0.0,
+        }
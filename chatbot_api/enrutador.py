@@ -0,0 +1,105 @@
+"""
+Elección de modelo por llamada: uno rápido/barato y uno completo.
+
+La decisión es local (sin llamar a nada): largo del mensaje, slots que faltan
+en el borrador y la confianza del clasificador de tipos.
+
+- rapido:   respuestas cortas, falta un solo dato, preguntas generales.
+- completo: mensajes largos, varios datos a la vez, tipo ambiguo.
+
+Cada ruta usa su propio sitio en llm_gateway ("chatbot.turno.rapido", ...)
+para comparar latencia/tokens por ruta; metricas() cuenta los motivos.
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+from catalogos_api.tipos import normalizar
+from denuncias_api.clasificador import MIN_PALABRAS, get_clasificador
+
+from . import cache_respuestas, dialogo, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+RAPIDO = "rapido"
+COMPLETO = "completo"
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def modelo(ruta: str):
+    if ruta == RAPIDO:
+        return _cfg("LLM_MODELO_RAPIDO", "gpt-4o-mini")
+    return _cfg("LLM_MODELO_COMPLETO", _cfg("OPENAI_MODEL", "gpt-5"))
+
+
+# =========================================================
+# Métricas: decisiones por motivo
+# =========================================================
+_decisiones = {}
+_lock = threading.Lock()
+
+
+def _decidir(ruta: str, motivo: str):
+    with _lock:
+        _decisiones[(ruta, motivo)] = _decisiones.get((ruta, motivo), 0) + 1
+    logger.debug("ruta=%s motivo=%s", ruta, motivo)
+    return ruta, motivo
+
+
+def metricas():
+    """Decisiones por ruta/motivo + métricas del gateway de cada sitio enrutado."""
+    with _lock:
+        decisiones = {f"{r}.{m}": n for (r, m), n in _decisiones.items()}
+    sitios = {s: m for s, m in llm_gateway.metricas().items() if s.rsplit(".", 1)[-1] in (RAPIDO, COMPLETO)}
+    return {"decisiones": decisiones, "sitios": sitios}
+
+
+# =========================================================
+# Heurísticas
+# =========================================================
+def _tipo_ambiguo(texto: str):
+    # sin modelo o con los dos mejores tipos muy cerca -> que decida el modelo grande
+    if len(normalizar(texto).split()) < MIN_PALABRAS:
+        return False
+    clf = get_clasificador()
+    if clf is None:
+        return True
+    top = clf.top(texto, k=2)
+    if len(top) < 2:
+        return False
+    return top[0][1] - top[1][1] < _cfg("LLM_RUTA_MARGEN_TIPO", 0.2)
+
+
+def ruta_chat(texto: str, datos_borrador):
+    """
+    (ruta, motivo) para un turno del chatbot.
+    datos_borrador: datos_json del borrador o None si todavía no hay.
+    """
+    palabras = len(normalizar(texto).split())
+    faltan = dialogo.faltantes(datos_borrador or {})
+
+    if datos_borrador is None and cache_respuestas.es_pregunta(texto):
+        return _decidir(RAPIDO, "pregunta_general")
+    if palabras >= _cfg("LLM_RUTA_PALABRAS_COMPLEJO", 40):
+        return _decidir(COMPLETO, "mensaje_largo")
+    if len(faltan) >= 2 and palabras >= _cfg("LLM_RUTA_PALABRAS_SIMPLE", 8):
+        return _decidir(COMPLETO, "varios_campos")
+    if "tipo" in faltan and _tipo_ambiguo(texto):
+        return _decidir(COMPLETO, "tipo_ambiguo")
+    if palabras < _cfg("LLM_RUTA_PALABRAS_SIMPLE", 8):
+        return _decidir(RAPIDO, "respuesta_corta")
+    if len(faltan) <= 1:
+        return _decidir(RAPIDO, "un_slot")
+    return _decidir(COMPLETO, "por_defecto")
+
+
+def ruta_caso(*textos):
+    """(ruta, motivo) para el análisis de una denuncia en el panel web."""
+    largo = sum(len(t or "") for t in textos)
+    if largo >= _cfg("LLM_RUTA_CASO_CHARS", 800):
+        return _decidir(COMPLETO, "caso_largo")
+    return _decidir(RAPIDO, "caso_corto")
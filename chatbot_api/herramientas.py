@@ -0,0 +1,121 @@
+"""
+Ejecución de las function calls que devuelve el LLM en una respuesta.
+
+- Las tools de solo lectura corren en paralelo en un pool pequeño.
+- Las que modifican el borrador (update_borrador, finalizar_denuncia) corren
+  de a una y en el orden en que llegaron; hacen de barrera: las lecturas
+  anteriores terminan antes y las posteriores ven su resultado.
+- Latencia por tool (llamadas, errores, media, máx.) en metricas().
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+SOLO_LECTURA = {"get_tipos_denuncia", "get_borrador"}
+MAX_WORKERS = 4
+
+
+# =========================================================
+# Métricas por tool
+# =========================================================
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _registrar(nombre: str, ms: float, error: bool):
+    with _stats_lock:
+        m = _stats.setdefault(nombre, {"llamadas": 0, "errores": 0, "latencia_total_ms": 0.0, "latencia_max_ms": 0.0})
+        m["llamadas"] += 1
+        m["latencia_total_ms"] += ms
+        m["latencia_max_ms"] = max(m["latencia_max_ms"], ms)
+        if error:
+            m["errores"] += 1
+    logger.info("tool nombre=%s ms=%.1f error=%s", nombre, ms, error)
+
+
+def metricas():
+    with _stats_lock:
+        out = {}
+        for nombre, m in _stats.items():
+            d = dict(m)
+            d["latencia_media_ms"] = round(m["latencia_total_ms"] / m["llamadas"], 1) if m["llamadas"] else 0.0
+            out[nombre] = d
+        return out
+
+
+# =========================================================
+# Ejecución
+# =========================================================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="chat-tools")
+        return _pool
+
+
+def _medido(fn, call):
+    try:
+        args = json.loads(call["arguments"] or "{}")
+    except Exception:
+        args = {}
+
+    t0 = time.monotonic()
+    try:
+        r = fn(call["name"], args)
+    except Exception:
+        logger.exception("Falló la tool %s", call["name"])
+        r = {"error": "error_interno"}
+    _registrar(call["name"], (time.monotonic() - t0) * 1000, error=isinstance(r, dict) and "error" in r)
+    return r
+
+
+def _en_pool(fn, call):
+    # hilo del pool: conexión propia a la BD, se cierra si quedó vieja
+    close_old_connections()
+    try:
+        return _medido(fn, call)
+    finally:
+        close_old_connections()
+
+
+async def ejecutar(calls, fn):
+    """
+    calls: [{"call_id", "name", "arguments"}]; fn(nombre, args) -> dict (sync).
+    Devuelve los resultados en el mismo orden que calls.
+    """
+    resultados = [None] * len(calls)
+    lecturas = []  # (posición, call) pendientes
+
+    async def vaciar():
+        if len(lecturas) == 1:
+            i, c = lecturas[0]
+            resultados[i] = await sync_to_async(_medido)(fn, c)
+        elif lecturas:
+            loop = asyncio.get_running_loop()
+            res = await asyncio.gather(*(loop.run_in_executor(_get_pool(), _en_pool, fn, c) for _, c in lecturas))
+            for (i, _), r in zip(lecturas, res):
+                resultados[i] = r
+        lecturas.clear()
+
+    for i, c in enumerate(calls):
+        if c["name"] in SOLO_LECTURA:
+            lecturas.append((i, c))
+            continue
+        await vaciar()
+        resultados[i] = await sync_to_async(_medido)(fn, c)
+    await vaciar()
+    return resultados
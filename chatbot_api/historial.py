@@ -0,0 +1,178 @@
+"""
+Historial de la conversación para el LLM.
+
+- Solo se leen los últimos CHAT_HISTORIAL_MENSAJES mensajes (consulta
+  inversa sobre chat_mensajes_conv_fecha_idx), no la conversación entera.
+- Lo anterior a esa ventana se resume (resumen acumulado en caché) y el
+  resumen se refresca en segundo plano, fuera del turno.
+- La ventana se recorta para no pasar de CHAT_HISTORIAL_MAX_TOKENS. El mismo
+  presupuesto acota la cadena de previous_response_id (views._preparar_llm).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from db.models import ChatMensajes
+
+from . import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+RESUMEN_TTL = 7 * 24 * 3600
+RESUMEN_MAX_MENSAJES = 60  # tope por refresco
+MAX_CHARS_MENSAJE = 1200
+
+INSTRUCCIONES_RESUMEN = (
+    "Resume en español, en máximo 120 palabras, la conversación entre un ciudadano y el "
+    "asistente de denuncias municipales. Conserva solo datos útiles para continuarla: "
+    "tipo de problema, descripción, ubicación/referencias, evidencias mencionadas y "
+    "qué quedó pendiente. No inventes datos."
+)
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def _tokens(texto: str):
+    # estimación barata (~4 caracteres por token en español)
+    return len(texto or "") // 4 + 1
+
+
+def tokens(items):
+    """Tokens estimados de una lista de mensajes / function_call_output."""
+    return sum(_tokens(i.get("content") or i.get("output")) for i in items)
+
+
+def _key(conv_id):
+    return f"chat:resumen:{conv_id}"
+
+
+def _rol(emisor: str):
+    return "user" if emisor == "usuario" else "assistant"
+
+
+# =========================================================
+# Ventana + resumen
+# =========================================================
+def mensajes_para_llm(conv_id: str):
+    """
+    Devuelve la lista de mensajes (formato input de Responses API):
+    [resumen de lo anterior] + últimos mensajes dentro del presupuesto de tokens.
+    """
+    n = _cfg("CHAT_HISTORIAL_MENSAJES", 12)
+    filas = list(
+        ChatMensajes.objects.filter(conversacion_id=conv_id)
+        .order_by("-created_at")
+        .values_list("emisor", "mensaje", "created_at")[:n]
+    )
+    filas.reverse()
+
+    # presupuesto: se descartan primero los más antiguos (el último siempre entra)
+    presupuesto = _cfg("CHAT_HISTORIAL_MAX_TOKENS", 1500)
+    ventana = []
+    usados = 0
+    for emisor, mensaje, created_at in reversed(filas):
+        texto = mensaje if len(mensaje) <= MAX_CHARS_MENSAJE else mensaje[:MAX_CHARS_MENSAJE] + "…"
+        t = _tokens(texto)
+        if ventana and usados + t > presupuesto:
+            break
+        usados += t
+        ventana.append((emisor, texto, created_at))
+    ventana.reverse()
+
+    out = []
+    resumen = cache.get(_key(conv_id))
+    if ventana and len(filas) == n:
+        # puede haber mensajes anteriores a la ventana
+        _quizas_refrescar(conv_id, ventana[0][2], resumen)
+    if resumen and resumen.get("texto"):
+        out.append({"role": "developer", "content": f"Resumen de la conversación anterior: {resumen['texto']}"})
+
+    for emisor, texto, _ in ventana:
+        out.append({"role": _rol(emisor), "content": texto})
+    return out
+
+
+def mensajes_desde(conv_id: str, desde):
+    """
+    Mensajes posteriores a `desde` (turno encadenado con previous_response_id).
+    None si son demasiados: conviene reenviar la ventana con resumen.
+    """
+    n = _cfg("CHAT_HISTORIAL_MENSAJES", 12)
+    filas = list(
+        ChatMensajes.objects.filter(conversacion_id=conv_id, created_at__gt=desde)
+        .order_by("created_at")
+        .values_list("emisor", "mensaje")[:n + 1]
+    )
+    if len(filas) > n:
+        return None
+    return [{"role": _rol(e), "content": m[:MAX_CHARS_MENSAJE]} for e, m in filas]
+
+
+def _quizas_refrescar(conv_id: str, inicio_ventana, resumen):
+    qs = ChatMensajes.objects.filter(conversacion_id=conv_id, created_at__lt=inicio_ventana)
+    if resumen and resumen.get("hasta"):
+        qs = qs.filter(created_at__gt=resumen["hasta"])
+    pendientes = qs.count()
+    if not pendientes:
+        return
+    if resumen and pendientes < _cfg("CHAT_RESUMEN_CADA", 6):
+        return
+    # un solo refresco en curso por conversación
+    if not cache.add(f"{_key(conv_id)}:lock", 1, timeout=120):
+        return
+    _get_pool().submit(_refrescar, conv_id, inicio_ventana)
+
+
+# =========================================================
+# Refresco en segundo plano
+# =========================================================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-resumen")
+        return _pool
+
+
+def _refrescar(conv_id: str, inicio_ventana):
+    close_old_connections()
+    try:
+        previo = cache.get(_key(conv_id)) or {}
+        qs = ChatMensajes.objects.filter(conversacion_id=conv_id, created_at__lt=inicio_ventana)
+        if previo.get("hasta"):
+            qs = qs.filter(created_at__gt=previo["hasta"])
+        filas = list(qs.order_by("created_at").values_list("emisor", "mensaje", "created_at")[:RESUMEN_MAX_MENSAJES])
+        if not filas:
+            return
+
+        texto = "\n".join(f"{'Ciudadano' if e == 'usuario' else 'Asistente'}: {m[:MAX_CHARS_MENSAJE]}" for e, m, _ in filas)
+        if previo.get("texto"):
+            texto = f"Resumen previo: {previo['texto']}\n\nMensajes nuevos:\n{texto}"
+
+        resp = llm_gateway.crear(
+            "chatbot.resumen",
+            model=_cfg("CHAT_RESUMEN_MODELO", "gpt-4o-mini"),
+            instructions=INSTRUCCIONES_RESUMEN,
+            input=texto,
+            max_output_tokens=300,
+        )
+        cache.set(
+            _key(conv_id),
+            {"texto": (resp.output_text or "").strip(), "hasta": filas[-1][2]},
+            RESUMEN_TTL,
+        )
+    except Exception:
+        logger.exception("No se pudo resumir la conversación %s", conv_id)
+    finally:
+        cache.delete(f"{_key(conv_id)}:lock")
+        close_old_connections()
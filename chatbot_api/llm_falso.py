@@ -0,0 +1,334 @@
+"""
+Cliente LLM local para pruebas de carga (sin llamadas a OpenAI).
+
+Se activa con LLM_CLIENTE:
+- "falso":  reproduce respuestas grabadas (LLM_FALSO_GRABACIONES) con la
+            latencia de LLM_FALSO_LATENCIA. Imita lo que usa el proyecto de
+            openai: responses.create (también stream=True) y
+            chat.completions.create, en versión sync y async.
+- "grabar": cliente real que además agrega cada respuesta (solo llamadas sin
+            stream) a LLM_GRABAR_ARCHIVO, fuera del código versionado: trae
+            texto de ciudadanos. Para reproducirlas, revisarlas y copiarlas a
+            LLM_FALSO_GRABACIONES.
+
+Grabaciones (JSON, lista):
+  {"api": "responses" | "chat",
+   "clave": último mensaje del usuario (coincidencia exacta) o null,
+   "contiene": alternativa a clave: texto que debe aparecer en ese mensaje,
+   "tras_tool": true si responde a function_call_output,
+   "texto": "...",
+   "llamadas": [{"name": ..., "arguments": {...}}],
+   "uso": {"entrada": n, "salida": n}}
+En "arguments", "{borrador_id}" se reemplaza por el borrador del contexto.
+
+Latencia: "fija:MS", "uniforme:MIN:MAX" o "lognormal:P50:P95" (ms).
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+from catalogos_api.tipos import normalizar
+
+TEXTO_DEFECTO = "Entiendo 🙂. ¿Me das un poco más de detalle para tu denuncia?"
+_re_borrador = re.compile(r"borrador_id=([0-9a-fA-F-]{36})")
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def _path():
+    return str(_cfg("LLM_FALSO_GRABACIONES", os.path.join(settings.BASE_DIR, "chatbot_api", "grabaciones", "llm.json")))
+
+
+def _path_grabar():
+    return str(_cfg("LLM_GRABAR_ARCHIVO", os.path.join(settings.BASE_DIR, "grabaciones", "llm.json")))
+
+
+# =========================================================
+# Latencia
+# =========================================================
+def latencia_seg(spec: str = None):
+    spec = spec or _cfg("LLM_FALSO_LATENCIA", "lognormal:800:2500")
+    tipo, *nums = spec.split(":")
+    nums = [float(n) for n in nums]
+    if tipo == "fija":
+        ms = nums[0]
+    elif tipo == "uniforme":
+        ms = random.uniform(nums[0], nums[1])
+    elif tipo == "lognormal":
+        # mediana = p50; p95 = p50 * e^(1.645 sigma)
+        p50, p95 = nums
+        sigma = math.log(max(p95, p50 + 1) / p50) / 1.645
+        ms = random.lognormvariate(math.log(p50), sigma)
+    else:
+        raise ValueError(f"LLM_FALSO_LATENCIA inválida: {spec}")
+    return ms / 1000
+
+
+# =========================================================
+# Grabaciones
+# =========================================================
+_grab = {"path": None, "mtime": None, "entradas": []}
+_grab_lock = threading.Lock()
+
+
+def _entradas():
+    path = _path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+    with _grab_lock:
+        if _grab["path"] != path or _grab["mtime"] != mtime:
+            with open(path, encoding="utf-8") as f:
+                _grab["entradas"] = json.load(f)
+            _grab["path"], _grab["mtime"] = path, mtime
+        return _grab["entradas"]
+
+
+def _items(entrada):
+    if isinstance(entrada, str):
+        return [{"role": "user", "content": entrada}]
+    return list(entrada or [])
+
+
+def _ultimo_usuario(items):
+    for it in reversed(items):
+        if isinstance(it, dict) and it.get("role") == "user" and not str(it.get("content", "")).startswith("(contexto"):
+            return str(it.get("content", ""))
+    return ""
+
+
+def _borrador_id(items):
+    for it in reversed(items):
+        m = _re_borrador.search(str(it.get("content", ""))) if isinstance(it, dict) else None
+        if m:
+            return m.group(1)
+    return None
+
+
+def _tras_tool(items):
+    return any(isinstance(it, dict) and it.get("type") == "function_call_output" for it in items)
+
+
+def elegir(api: str, items, tools):
+    """Entrada grabada para la petición (o una genérica)."""
+    entradas = [e for e in _entradas() if e.get("api", "responses") == api]
+    tras_tool = _tras_tool(items)
+    clave = normalizar(_ultimo_usuario(items))
+    nombres = {t.get("name") for t in (tools or [])}
+
+    def sirve(e):
+        return all(ll["name"] in nombres for ll in e.get("llamadas", []))
+
+    candidatas = [e for e in entradas if bool(e.get("tras_tool")) == tras_tool and sirve(e)]
+    exactas = [e for e in candidatas if e.get("clave") and normalizar(e["clave"]) == clave]
+    if exactas:
+        return random.choice(exactas)
+    parciales = [e for e in candidatas if e.get("contiene") and normalizar(e["contiene"]) in clave]
+    if parciales:
+        return random.choice(parciales)
+    genericas = [e for e in candidatas if not e.get("clave") and not e.get("contiene")]
+    if genericas:
+        return random.choice(genericas)
+    return {"api": api, "texto": TEXTO_DEFECTO}
+
+
+def _grabar(entrada: dict):
+    path = _path_grabar()
+    with _grab_lock:
+        datos = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                datos = json.load(f)
+        datos.append(entrada)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        _grab["mtime"] = None
+
+
+# =========================================================
+# Respuestas con la forma del SDK
+# =========================================================
+def _uso_responses(e, items):
+    uso = e.get("uso") or {}
+    ent = uso.get("entrada") or sum(len(str(it.get("content", it.get("output", "")))) for it in items if isinstance(it, dict)) // 4
+    return SimpleNamespace(input_tokens=int(ent), output_tokens=int(uso.get("salida") or len(e.get("texto", "")) // 4 + 1))
+
+
+def _respuesta(e, items):
+    bid = _borrador_id(items) or ""
+    output = []
+    for ll in e.get("llamadas", []):
+        args = json.dumps(ll.get("arguments") or {}, ensure_ascii=False).replace("{borrador_id}", bid)
+        output.append({"type": "function_call", "call_id": f"call_{uuid.uuid4().hex[:12]}", "name": ll["name"], "arguments": args})
+    return SimpleNamespace(
+        id=f"resp_falso_{uuid.uuid4().hex}",
+        output=output,
+        output_text="" if output else e.get("texto", ""),
+        usage=_uso_responses(e, items),
+    )
+
+
+def _respuesta_chat(e, messages):
+    texto = e.get("texto", "")
+    uso = e.get("uso") or {}
+    return SimpleNamespace(
+        id=f"chatcmpl_falso_{uuid.uuid4().hex}",
+        choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=texto), finish_reason="stop")],
+        usage=SimpleNamespace(
+            prompt_tokens=int(uso.get("entrada") or sum(len(m.get("content", "")) for m in messages) // 4),
+            completion_tokens=int(uso.get("salida") or len(texto) // 4 + 1),
+        ),
+    )
+
+
+def _eventos(resp):
+    for it in resp.output:
+        yield SimpleNamespace(type="response.output_item.added", item=SimpleNamespace(type="function_call", name=it["name"]))
+    for palabra in re.findall(r"\S+\s*", resp.output_text):
+        yield SimpleNamespace(type="response.output_text.delta", delta=palabra)
+    yield SimpleNamespace(type="response.completed", response=resp)
+
+
+async def _stream(resp, seg):
+    # primer evento al ~30% de la latencia, el resto repartido
+    eventos = list(_eventos(resp))
+    await asyncio.sleep(seg * 0.3)
+    paso = seg * 0.7 / max(1, len(eventos))
+    for ev in eventos:
+        yield ev
+        await asyncio.sleep(paso)
+
+
+def _stream_sync(resp, seg):
+    eventos = list(_eventos(resp))
+    time.sleep(seg * 0.3)
+    paso = seg * 0.7 / max(1, len(eventos))
+    for ev in eventos:
+        yield ev
+        time.sleep(paso)
+
+
+# =========================================================
+# Clientes
+# =========================================================
+class _Responses:
+    def create(self, *, input=None, tools=None, stream=False, timeout=None, **kwargs):
+        items = _items(input)
+        resp = _respuesta(elegir("responses", items, tools), items)
+        seg = latencia_seg()
+        if stream:
+            return _stream_sync(resp, seg)
+        time.sleep(seg)
+        return resp
+
+
+class _AsyncResponses:
+    async def create(self, *, input=None, tools=None, stream=False, timeout=None, **kwargs):
+        items = _items(input)
+        resp = _respuesta(elegir("responses", items, tools), items)
+        seg = latencia_seg()
+        if stream:
+            return _stream(resp, seg)
+        await asyncio.sleep(seg)
+        return resp
+
+
+class _Completions:
+    def create(self, *, messages=None, timeout=None, **kwargs):
+        r = _respuesta_chat(elegir("chat", messages or [], None), messages or [])
+        time.sleep(latencia_seg())
+        return r
+
+
+class _AsyncCompletions:
+    async def create(self, *, messages=None, timeout=None, **kwargs):
+        r = _respuesta_chat(elegir("chat", messages or [], None), messages or [])
+        await asyncio.sleep(latencia_seg())
+        return r
+
+
+class ClienteFalso:
+    def __init__(self):
+        self.responses = _Responses()
+        self.chat = SimpleNamespace(completions=_Completions())
+
+
+class ClienteFalsoAsync:
+    def __init__(self):
+        self.responses = _AsyncResponses()
+        self.chat = SimpleNamespace(completions=_AsyncCompletions())
+
+
+# =========================================================
+# Grabación desde el cliente real
+# =========================================================
+def _entrada_grabada(api: str, kwargs: dict, resp):
+    if api == "chat":
+        msgs = kwargs.get("messages") or []
+        ultimo = next((m.get("content", "") for m in reversed(msgs) if m.get("role") == "user"), "")
+        u = getattr(resp, "usage", None)
+        return {
+            "api": "chat", "clave": ultimo, "texto": resp.choices[0].message.content or "",
+            "uso": {"entrada": getattr(u, "prompt_tokens", 0), "salida": getattr(u, "completion_tokens", 0)},
+        }
+    items = _items(kwargs.get("input"))
+    bid = _borrador_id(items)
+    llamadas = []
+    for it in resp.output or []:
+        if getattr(it, "type", None) == "function_call":
+            args = it.arguments.replace(bid, "{borrador_id}") if bid else it.arguments
+            llamadas.append({"name": it.name, "arguments": json.loads(args or "{}")})
+    u = getattr(resp, "usage", None)
+    return {
+        "api": "responses",
+        "clave": None if _tras_tool(items) else _ultimo_usuario(items),
+        "tras_tool": _tras_tool(items),
+        "texto": resp.output_text or "",
+        "llamadas": llamadas,
+        "uso": {"entrada": getattr(u, "input_tokens", 0), "salida": getattr(u, "output_tokens", 0)},
+    }
+
+
+class _Grabador:
+    def __init__(self, api, fn):
+        self.api, self.fn = api, fn
+
+    def create(self, **kwargs):
+        resp = self.fn(**kwargs)
+        if not kwargs.get("stream"):
+            _grabar(_entrada_grabada(self.api, kwargs, resp))
+        return resp
+
+
+class _GrabadorAsync(_Grabador):
+    async def create(self, **kwargs):
+        resp = await self.fn(**kwargs)
+        if not kwargs.get("stream"):
+            # lectura + escritura del archivo fuera del event loop
+            await sync_to_async(_grabar, thread_sensitive=False)(_entrada_grabada(self.api, kwargs, resp))
+        return resp
+
+
+def grabador(cliente, asincrono=False):
+    cls = _GrabadorAsync if asincrono else _Grabador
+    return SimpleNamespace(
+        responses=cls("responses", cliente.responses.create),
+        chat=SimpleNamespace(completions=cls("chat", cliente.chat.completions.create)),
+    )
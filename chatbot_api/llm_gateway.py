@@ -0,0 +1,487 @@
+"""
+Gateway único para llamadas al LLM (chatbot y panel web).
+
+- Un cliente OpenAI por proceso (y uno AsyncOpenAI por event loop) con pool
+  de conexiones keep-alive, en vez de crear uno por request.
+- Timeout por intento y deadline total por llamada.
+- Reintentos con backoff exponencial + jitter en 429 / 5xx / timeouts.
+- Circuit breaker: tras LLM_CB_FALLOS fallos transitorios seguidos deja de
+  llamar durante LLM_CB_ENFRIAMIENTO_SEG y lanza LLMNoDisponible; cada
+  sitio responde con su texto de respaldo. Después deja pasar una sola
+  llamada de prueba: si responde se cierra, si falla vuelve a abrirse.
+- Límite global de llamadas en curso (LLM_MAX_CONCURRENTES) con advisory
+  locks de Postgres compartidos por todos los workers: si no hay cupo en
+  LLM_COLA_ESPERA_SEG se lanza LLMSaturado en vez de dejar el worker
+  bloqueado esperando al proveedor.
+- deadline= (time.monotonic() absoluto) para que varias llamadas de un mismo
+  request compartan el plazo; acota reintentos, timeouts y la espera de cupo.
+- Métricas por sitio de llamada (latencia, tokens, errores) en memoria + log,
+  y una fila por llamada en llm_uso (uso_llm.py, escrita en lotes).
+- LLM_CLIENTE="falso" | "grabar": cliente local de llm_falso.py para pruebas
+  de carga sin OpenAI (el resto del gateway funciona igual).
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+import weakref
+
+import httpx
+import openai
+from asgiref.sync import sync_to_async
+from openai import AsyncOpenAI, OpenAI
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import bloqueos, llm_falso, uso_llm
+
+logger = logging.getLogger(__name__)
+
+
+class LLMNoDisponible(Exception):
+    """Circuito abierto o reintentos agotados: usar la respuesta de respaldo."""
+
+
+class LLMSaturado(LLMNoDisponible):
+    """Sin cupo en el límite global de concurrencia: pedir que reintente."""
+
+
+# =========================================================
+# Configuración
+# =========================================================
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def _timeout(total=None):
+    return httpx.Timeout(
+        total or _cfg("LLM_TIMEOUT_SEG", 30),
+        connect=_cfg("LLM_CONNECT_TIMEOUT_SEG", 5),
+    )
+
+
+def _limits():
+    n = _cfg("LLM_MAX_CONEXIONES", 20)
+    return httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=60)
+
+
+# =========================================================
+# Clientes compartidos
+# =========================================================
+_client = None
+_client_lock = threading.Lock()
+# httpx.AsyncClient queda atado al loop donde se creó (runserver crea uno por request)
+_aclients = weakref.WeakKeyDictionary()
+
+
+def _modo():
+    return _cfg("LLM_CLIENTE", "openai")
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            if _modo() == "falso":
+                _client = llm_falso.ClienteFalso()
+            else:
+                _client = OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    max_retries=0,  # los reintentos los hace el gateway
+                    timeout=_timeout(),
+                    http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                )
+                if _modo() == "grabar":
+                    _client = llm_falso.grabador(_client)
+        return _client
+
+
+def get_aclient():
+    loop = asyncio.get_running_loop()
+    c = _aclients.get(loop)
+    if c is None:
+        if _modo() == "falso":
+            c = llm_falso.ClienteFalsoAsync()
+        else:
+            c = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                max_retries=0,
+                timeout=_timeout(),
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+            if _modo() == "grabar":
+                c = llm_falso.grabador(c, asincrono=True)
+        _aclients[loop] = c
+    return c
+
+
+def _metodo(client, api: str):
+    if api == "chat":
+        return client.chat.completions.create
+    return client.responses.create
+
+
+# =========================================================
+# Circuit breaker
+# =========================================================
+class _Circuito:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.sonda_hasta = 0.0
+
+    def abierto(self):
+        """Consulta sin efectos: True mientras dure el enfriamiento o haya una sonda en curso."""
+        with self.lock:
+            ahora = time.monotonic()
+            return ahora < self.abierto_hasta or ahora < self.sonda_hasta
+
+    def permitir(self):
+        with self.lock:
+            ahora = time.monotonic()
+            if not self.abierto_hasta:
+                return True
+            # abierto -> rechaza; vencido el enfriamiento deja pasar una sola
+            # llamada de prueba (half-open) hasta que informe exito() o fallo().
+            # Si la sonda no informa (error no transitorio, sin cupo) se libera
+            # sola pasado LLM_TIMEOUT_SEG.
+            if ahora < self.abierto_hasta or ahora < self.sonda_hasta:
+                return False
+            self.sonda_hasta = ahora + _cfg("LLM_TIMEOUT_SEG", 30)
+            return True
+
+    def exito(self):
+        with self.lock:
+            self.fallos = 0
+            self.abierto_hasta = 0.0
+            self.sonda_hasta = 0.0
+
+    def fallo(self):
+        with self.lock:
+            self.fallos += 1
+            self.sonda_hasta = 0.0
+            if self.fallos >= _cfg("LLM_CB_FALLOS", 5):
+                self.abierto_hasta = time.monotonic() + _cfg("LLM_CB_ENFRIAMIENTO_SEG", 30)
+                logger.warning("LLM: circuito abierto tras %s fallos", self.fallos)
+
+
+_circuito = _Circuito()
+
+
+def circuito_abierto():
+    return _circuito.abierto()
+
+
+# =========================================================
+# Límite global de concurrencia
+# =========================================================
+# LLM_MAX_CONCURRENTES cupos compartidos por todos los workers: con Postgres
+# cada cupo es un advisory lock (bloqueos.py); si no, una clave de la caché
+# tomada con cache.add (con LocMemCache el límite queda por proceso). Los dos
+# vencen con el deadline, así un worker colgado no deja el cupo tomado.
+SLOT_KEY = "llm:slot:{}"
+SLOT_CLASE = 0x4C4C4D  # "LLM": primer argumento de pg_try_advisory_lock(int, int)
+SLOT_POLL_SEG = 0.1
+
+
+def _slot_keys():
+    orden = list(range(_cfg("LLM_MAX_CONCURRENTES", 16)))
+    random.shuffle(orden)
+    return [SLOT_KEY.format(i) for i in orden]
+
+
+def _slot_ttl(deadline):
+    return max(1, int(deadline - time.monotonic()) + 5)
+
+
+def _slot_limite(deadline):
+    return min(time.monotonic() + _cfg("LLM_COLA_ESPERA_SEG", 2), deadline)
+
+
+def _intentar_slot(deadline):
+    if bloqueos.disponible():
+        return bloqueos.tomar_alguno(SLOT_CLASE, _cfg("LLM_MAX_CONCURRENTES", 16), _slot_ttl(deadline))
+    token = uuid.uuid4().hex
+    for key in _slot_keys():
+        if cache.add(key, token, _slot_ttl(deadline)):
+            return key, token
+    return None
+
+
+def _tomar_slot(deadline):
+    limite = _slot_limite(deadline)
+    while True:
+        slot = _intentar_slot(deadline)
+        if slot is not None:
+            return slot
+        if time.monotonic() >= limite:
+            raise LLMSaturado("sin cupo")
+        time.sleep(SLOT_POLL_SEG * random.uniform(0.5, 1.5))
+
+
+def _soltar_slot(slot):
+    if isinstance(slot, bloqueos.Bloqueo):
+        slot.soltar()
+        return
+    key, token = slot
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+async def _intentar_slot_async(deadline):
+    if bloqueos.disponible():
+        return await sync_to_async(bloqueos.tomar_alguno, thread_sensitive=False)(
+            SLOT_CLASE, _cfg("LLM_MAX_CONCURRENTES", 16), _slot_ttl(deadline)
+        )
+    token = uuid.uuid4().hex
+    for key in _slot_keys():
+        if await cache.aadd(key, token, _slot_ttl(deadline)):
+            return key, token
+    return None
+
+
+async def _tomar_slot_async(deadline):
+    limite = _slot_limite(deadline)
+    while True:
+        slot = await _intentar_slot_async(deadline)
+        if slot is not None:
+            return slot
+        if time.monotonic() >= limite:
+            raise LLMSaturado("sin cupo")
+        await asyncio.sleep(SLOT_POLL_SEG * random.uniform(0.5, 1.5))
+
+
+async def _soltar_slot_async(slot):
+    if isinstance(slot, bloqueos.Bloqueo):
+        await sync_to_async(slot.soltar, thread_sensitive=False)()
+        return
+    key, token = slot
+    if await cache.aget(key) == token:
+        await cache.adelete(key)
+
+
+async def _stream_con_slot(stream, slot, sitio, modelo, t0, reintentos):
+    # el cupo se ocupa mientras se consumen los eventos, no solo al abrir el stream;
+    # latencia, uso y fila de llm_uso se registran al terminar, con la respuesta final
+    final = None
+    try:
+        async for ev in stream:
+            if getattr(ev, "type", "") == "response.completed":
+                final = ev.response
+            yield ev
+    finally:
+        await _soltar_slot_async(slot)
+        error = None if final is not None else LLMNoDisponible("stream sin response.completed")
+        _registrar(sitio, (time.monotonic() - t0) * 1000, resp=final, error=error, reintentos=reintentos, modelo=modelo)
+
+
+# =========================================================
+# Métricas por sitio
+# =========================================================
+_metricas = {}
+_metricas_lock = threading.Lock()
+
+
+def _m(sitio: str):
+    return _metricas.setdefault(sitio, {
+        "llamadas": 0,
+        "errores": 0,
+        "reintentos": 0,
+        "fallbacks": 0,
+        "saturado": 0,
+        "latencia_total_ms": 0.0,
+        "latencia_max_ms": 0.0,
+        "tokens_entrada": 0,
+        "tokens_salida": 0,
+    })
+
+
+def _tokens(usage):
+    """(entrada, cacheados, salida)."""
+    if usage is None:
+        return 0, 0, 0
+    # Responses API: input/output_tokens; Chat Completions: prompt/completion_tokens
+    ent = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", None) or 0
+    sal = getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", None) or 0
+    det = getattr(usage, "input_tokens_details", None) or getattr(usage, "prompt_tokens_details", None)
+    cache_ = getattr(det, "cached_tokens", None) or 0
+    return int(ent), int(cache_), int(sal)
+
+
+def _resultado(error, fallback):
+    if error is None:
+        return uso_llm.OK
+    if isinstance(error, LLMSaturado):
+        return uso_llm.SATURADO
+    return uso_llm.FALLBACK if fallback else uso_llm.ERROR
+
+
+def _registrar(sitio: str, ms: float, resp=None, error=None, reintentos=0, fallback=False, modelo=None):
+    ent, cache_, sal = _tokens(getattr(resp, "usage", None))
+    with _metricas_lock:
+        m = _m(sitio)
+        m["llamadas"] += 1
+        m["reintentos"] += reintentos
+        m["latencia_total_ms"] += ms
+        m["latencia_max_ms"] = max(m["latencia_max_ms"], ms)
+        m["tokens_entrada"] += ent
+        m["tokens_salida"] += sal
+        if error is not None:
+            m["errores"] += 1
+        if fallback:
+            m["fallbacks"] += 1
+        if isinstance(error, LLMSaturado):
+            m["saturado"] += 1
+    logger.info(
+        "llm sitio=%s ms=%.0f tokens_in=%s tokens_out=%s reintentos=%s error=%s",
+        sitio, ms, ent, sal, reintentos, type(error).__name__ if error else "-",
+    )
+    uso_llm.anotar(sitio, modelo, ms, ent, cache_, sal, resultado=_resultado(error, fallback), reintentos=reintentos)
+
+
+def metricas():
+    """Snapshot de las métricas de este proceso."""
+    with _metricas_lock:
+        out = {}
+        for sitio, m in _metricas.items():
+            d = dict(m)
+            d["latencia_media_ms"] = round(m["latencia_total_ms"] / m["llamadas"], 1) if m["llamadas"] else 0.0
+            out[sitio] = d
+        return out
+
+
+# =========================================================
+# Reintentos
+# =========================================================
+def _es_transitorio(e: Exception):
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _espera(intento: int, e: Exception, restante: float):
+    base = _cfg("LLM_BACKOFF_BASE_SEG", 0.5)
+    tope = _cfg("LLM_BACKOFF_MAX_SEG", 8)
+    seg = random.uniform(0, min(tope, base * (2 ** intento)))  # full jitter
+    resp = getattr(e, "response", None)
+    ra = resp.headers.get("retry-after") if resp is not None else None
+    if ra:
+        try:
+            seg = max(seg, float(ra))
+        except ValueError:
+            pass
+    return min(seg, max(0.0, restante))
+
+
+def _plan(timeout, deadline=None):
+    por_intento = timeout or _cfg("LLM_TIMEOUT_SEG", 30)
+    propio = time.monotonic() + _cfg("LLM_DEADLINE_SEG", por_intento * 2)
+    return por_intento, min(propio, deadline) if deadline else propio
+
+
+def _admitir(sitio: str, deadline, modelo):
+    if not _circuito.permitir():
+        e = LLMNoDisponible("circuito abierto")
+    elif deadline <= time.monotonic():
+        e = LLMNoDisponible("deadline vencido")
+    else:
+        return
+    _registrar(sitio, 0, error=e, fallback=True, modelo=modelo)
+    raise e
+
+
+def crear(sitio: str, api: str = "responses", timeout=None, deadline=None, **kwargs):
+    """
+    client.responses.create / chat.completions.create con timeout, reintentos,
+    circuit breaker, límite de concurrencia y métricas. api: "responses" | "chat".
+    deadline: time.monotonic() límite compartido con otras llamadas del request.
+    Sin stream=True: el cupo y las métricas de un stream solo se manejan en acrear().
+    """
+    if kwargs.get("stream"):
+        raise ValueError("crear() no admite stream=True; usar acrear()")
+    por_intento, deadline = _plan(timeout, deadline)
+    modelo = kwargs.get("model")
+    _admitir(sitio, deadline, modelo)
+    try:
+        slot = _tomar_slot(deadline)
+    except LLMSaturado as e:
+        _registrar(sitio, 0, error=e, fallback=True, modelo=modelo)
+        raise
+
+    try:
+        fn = _metodo(get_client(), api)
+        t0 = time.monotonic()
+        intento = 0
+        while True:
+            restante = deadline - time.monotonic()
+            try:
+                resp = fn(timeout=_timeout(min(por_intento, max(restante, 1))), **kwargs)
+            except Exception as e:
+                if not _es_transitorio(e):
+                    _registrar(sitio, (time.monotonic() - t0) * 1000, error=e, reintentos=intento, modelo=modelo)
+                    raise
+                _circuito.fallo()
+                restante = deadline - time.monotonic()
+                if intento >= _cfg("LLM_REINTENTOS", 2) or restante <= 0 or _circuito.abierto():
+                    _registrar(
+                        sitio, (time.monotonic() - t0) * 1000, error=e, reintentos=intento, fallback=True, modelo=modelo
+                    )
+                    raise LLMNoDisponible(str(e)) from e
+                time.sleep(_espera(intento, e, restante))
+                intento += 1
+                continue
+            _circuito.exito()
+            _registrar(sitio, (time.monotonic() - t0) * 1000, resp=resp, reintentos=intento, modelo=modelo)
+            return resp
+    finally:
+        _soltar_slot(slot)
+
+
+async def acrear(sitio: str, api: str = "responses", timeout=None, deadline=None, **kwargs):
+    """Versión async de crear() para las vistas ASGI del chatbot (también stream=True)."""
+    por_intento, deadline = _plan(timeout, deadline)
+    modelo = kwargs.get("model")
+    _admitir(sitio, deadline, modelo)
+    try:
+        slot = await _tomar_slot_async(deadline)
+    except LLMSaturado as e:
+        _registrar(sitio, 0, error=e, fallback=True, modelo=modelo)
+        raise
+
+    soltar = True
+    try:
+        fn = _metodo(get_aclient(), api)
+        t0 = time.monotonic()
+        intento = 0
+        while True:
+            restante = deadline - time.monotonic()
+            try:
+                resp = await fn(timeout=_timeout(min(por_intento, max(restante, 1))), **kwargs)
+            except Exception as e:
+                if not _es_transitorio(e):
+                    _registrar(sitio, (time.monotonic() - t0) * 1000, error=e, reintentos=intento, modelo=modelo)
+                    raise
+                _circuito.fallo()
+                restante = deadline - time.monotonic()
+                if intento >= _cfg("LLM_REINTENTOS", 2) or restante <= 0 or _circuito.abierto():
+                    _registrar(
+                        sitio, (time.monotonic() - t0) * 1000, error=e, reintentos=intento, fallback=True, modelo=modelo
+                    )
+                    raise LLMNoDisponible(str(e)) from e
+                await asyncio.sleep(_espera(intento, e, restante))
+                intento += 1
+                continue
+            _circuito.exito()
+            if kwargs.get("stream"):
+                # se registra al terminar el stream (_stream_con_slot), no al abrirlo
+                soltar = False
+                return _stream_con_slot(resp, slot, sitio, modelo, t0, intento)
+            _registrar(sitio, (time.monotonic() - t0) * 1000, resp=resp, reintentos=intento, modelo=modelo)
+            return resp
+    finally:
+        if soltar:
+            await _soltar_slot_async(slot)
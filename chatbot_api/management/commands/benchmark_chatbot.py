@@ -0,0 +1,192 @@
+import asyncio
+import contextvars
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chatbot_api import dialogo, llm_gateway
+from db.models import (
+    ChatConversaciones,
+    ChatMensajes,
+    Ciudadanos,
+    DenunciaBorradores,
+    Usuarios,
+)
+
+# conversación típica: pregunta, datos estructurados, texto libre, ubicación y "no"
+GUION = [
+    "Hola, quiero hacer una denuncia",
+    "¿Qué tipos de denuncia hay?",
+    "tipo: basura",
+    "descripcion: hay basura acumulada en la esquina desde hace una semana",
+    "Es cerca del parque central, al frente de la tienda de la esquina",
+    "lat: -1.0453 lng: -78.5910",
+    "no",
+]
+
+_consultas = contextvars.ContextVar("consultas", default=None)
+
+
+def _contar_consultas(execute, sql, params, many, context):
+    # cada turno lleva su contador en un contextvar (asgiref lo propaga a sync_to_async)
+    c = _consultas.get()
+    if c is not None:
+        c[0] += 1
+    return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula ciudadanos concurrentes conversando con el chatbot (LLM falso por defecto) y "
+        "reporta latencia p50/p95 por turno, consultas por turno y throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ciudadanos", type=int, default=20)
+        parser.add_argument("--conversaciones", type=int, default=1, help="Conversaciones por ciudadano")
+        parser.add_argument("--latencia", default="lognormal:800:2500", help="Latencia del LLM falso (ver llm_falso.py)")
+        parser.add_argument("--pausa-ms", type=int, default=0, help="Pausa máxima del ciudadano entre mensajes")
+        parser.add_argument("--stream", action="store_true", help="Usa /message/stream/ (mide también el primer byte)")
+        parser.add_argument("--real", action="store_true", help="Usa el cliente configurado (OpenAI real)")
+        parser.add_argument("--conservar", action="store_true", help="No borra usuarios/conversaciones creados")
+
+    def handle(self, *args, **opts):
+        if not opts["real"]:
+            settings.LLM_CLIENTE = "falso"
+            settings.LLM_FALSO_LATENCIA = opts["latencia"]
+            # las llamadas simuladas no cuentan en el panel de uso (llm_uso)
+            settings.LLM_USO_REGISTRAR = False
+        # host del AsyncClient (como hace el runner de tests)
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        corrida = uuid.uuid4().hex[:6]
+        uids = self._crear_ciudadanos(corrida, opts["ciudadanos"])
+        try:
+            with connection.execute_wrapper(_contar_consultas):
+                t0 = time.monotonic()
+                turnos = async_to_sync(self._simular)(uids, opts)
+                duracion = time.monotonic() - t0
+            self._reportar(turnos, duracion, opts)
+        finally:
+            if not opts["conservar"]:
+                self._limpiar(uids)
+
+    # =========================================================
+    # Datos de prueba
+    # =========================================================
+    def _crear_ciudadanos(self, corrida: str, n: int):
+        now = timezone.now()
+        uids = []
+        for i in range(n):
+            u = Usuarios.objects.create(
+                id=uuid.uuid4(), tipo="ciudadano", correo=f"bench-{corrida}-{i}@bench.local",
+                password_hash="!", activo=True, correo_verificado=True, created_at=now, updated_at=now,
+            )
+            Ciudadanos.objects.create(
+                usuario=u, cedula=f"B{corrida}{i:06d}", nombres="Bench", apellidos=f"{corrida}-{i}",
+                created_at=now, updated_at=now,
+            )
+            uids.append(u.id)
+        return uids
+
+    def _limpiar(self, uids):
+        convs = ChatConversaciones.objects.filter(ciudadano_id__in=uids)
+        ChatMensajes.objects.filter(conversacion__in=convs).delete()
+        DenunciaBorradores.objects.filter(ciudadano_id__in=uids).delete()
+        convs.delete()
+        Ciudadanos.objects.filter(usuario_id__in=uids).delete()
+        Usuarios.objects.filter(id__in=uids).delete()
+
+    # =========================================================
+    # Simulación
+    # =========================================================
+    async def _simular(self, uids, opts):
+        turnos = []
+        await asyncio.gather(*(self._ciudadano(uid, opts, turnos) for uid in uids))
+        return turnos
+
+    async def _ciudadano(self, uid, opts, turnos):
+        token = AccessToken()
+        token["uid"] = str(uid)
+        token["tipo"] = "ciudadano"
+        client = AsyncClient()
+        auth = {"Authorization": f"Bearer {token}"}
+        url = reverse("chatbot_message_stream" if opts["stream"] else "chatbot_message")
+
+        for _ in range(opts["conversaciones"]):
+            r = await client.post(reverse("chatbot_start"), data={}, content_type="application/json", headers=auth)
+            if r.status_code != 201:
+                turnos.append({"status": r.status_code, "ms": 0.0, "consultas": 0, "primer_byte_ms": None})
+                continue
+            conv_id = r.json()["conversacion_id"]
+
+            for mensaje in GUION:
+                if opts["pausa_ms"]:
+                    await asyncio.sleep(random.uniform(0, opts["pausa_ms"]) / 1000)
+                turnos.append(await self._turno(client, auth, url, conv_id, mensaje, opts["stream"]))
+
+    async def _turno(self, client, auth, url, conv_id, mensaje, stream: bool):
+        contador = [0]
+        _consultas.set(contador)
+        body = json.dumps({"conversacion_id": conv_id, "mensaje": mensaje})
+        primer_byte = None
+
+        t0 = time.monotonic()
+        r = await client.post(url, data=body, content_type="application/json", headers=auth)
+        if stream and r.status_code == 200:
+            async for _ in r.streaming_content:
+                if primer_byte is None:
+                    primer_byte = (time.monotonic() - t0) * 1000
+        ms = (time.monotonic() - t0) * 1000
+        return {"status": r.status_code, "ms": ms, "consultas": contador[0], "primer_byte_ms": primer_byte}
+
+    # =========================================================
+    # Reporte
+    # =========================================================
+    def _reportar(self, turnos, duracion, opts):
+        ok = [t for t in turnos if t["status"] == 200]
+        codigos = {}
+        for t in turnos:
+            codigos[t["status"]] = codigos.get(t["status"], 0) + 1
+
+        self.stdout.write(
+            f"Ciudadanos: {opts['ciudadanos']}  turnos: {len(turnos)}  ok: {len(ok)}  códigos: {codigos}"
+        )
+        self.stdout.write(f"Duración: {duracion:.1f}s  throughput: {len(ok) / duracion:.1f} turnos/s")
+        if not ok:
+            return
+
+        ms = np.array([t["ms"] for t in ok])
+        q = np.array([t["consultas"] for t in ok])
+        self.stdout.write(
+            f"Latencia turno ms  p50: {np.percentile(ms, 50):.0f}  p95: {np.percentile(ms, 95):.0f}  "
+            f"p99: {np.percentile(ms, 99):.0f}  max: {ms.max():.0f}"
+        )
+        pb = np.array([t["primer_byte_ms"] for t in ok if t["primer_byte_ms"] is not None])
+        if len(pb):
+            self.stdout.write(
+                f"Primer byte ms     p50: {np.percentile(pb, 50):.0f}  p95: {np.percentile(pb, 95):.0f}"
+            )
+        self.stdout.write(
+            f"Consultas/turno    media: {q.mean():.1f}  p50: {np.percentile(q, 50):.0f}  "
+            f"p95: {np.percentile(q, 95):.0f}  max: {q.max()}"
+        )
+        self.stdout.write(f"Turnos sin LLM: {dialogo.metricas()}")
+        for sitio, m in sorted(llm_gateway.metricas().items()):
+            self.stdout.write(
+                f"LLM {sitio}: llamadas {m['llamadas']}  media {m['latencia_media_ms']:.0f}ms  "
+                f"máx {m['latencia_max_ms']:.0f}ms  saturado {m['saturado']}  errores {m['errores']}"
+            )
@@ -0,0 +1,122 @@
+"""
+Filtro local de temas ajenos a denuncias municipales (antes del LLM).
+
+- "fuera":   el mensaje solo trae vocabulario claramente ajeno (recetas,
+             fútbol, tareas...): al menos CHAT_TEMA_MIN_FUERA palabras o una
+             proporción CHAT_TEMA_PROPORCION_FUERA del mensaje -> respuesta
+             fija, sin llamar al modelo.
+- "dentro":  menciona algo municipal / de la app / un tipo del catálogo
+             (aunque también traiga palabras ajenas).
+- "ambiguo": ni lo uno ni lo otro -> decide el modelo.
+
+Cada decisión se registra (conteos + log con los aciertos) para ajustar
+CHAT_TEMA_MIN_FUERA / CHAT_TEMA_PROPORCION_FUERA y las listas de palabras.
+Las palabras ambiguas (música, partido, código...) no van en PALABRAS_FUERA:
+aparecen en denuncias reales de ruido, daños o acceso a la app.
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+from catalogos_api.tipos import normalizar, tipos_activos
+
+logger = logging.getLogger(__name__)
+
+FUERA = "fuera"
+DENTRO = "dentro"
+AMBIGUO = "ambiguo"
+
+# misma frase que pide INSTRUCTIONS al modelo
+RESPUESTA_FUERA_DE_TEMA = (
+    "Solo puedo ayudarte con denuncias municipales y uso de la app 🙂. En este momento no puedo "
+    "ayudarte con ese tema, pero con gusto te ayudo a registrar tu denuncia."
+)
+
+PALABRAS_DENTRO = {
+    # municipio / trámite
+    "denuncia", "denunciar", "reclamo", "queja", "reportar", "reporte", "municipio", "municipal",
+    "municipalidad", "gad", "alcaldia", "salcedo", "funcionario", "departamento", "tramite", "estado",
+    # problemas frecuentes
+    "basura", "aseo", "recoleccion", "residuo", "desecho", "calle", "via", "vereda", "acera", "bache",
+    "hueco", "alumbrado", "luminaria", "poste", "luz", "foco", "agua", "alcantarilla", "alcantarillado",
+    "desague", "fuga", "tubo", "tuberia", "ruido", "bulla", "volumen", "fiesta", "parque", "arbol",
+    "perro", "animal", "escombro", "construccion", "transito", "semaforo", "senal", "trafico",
+    "contaminacion", "inundacion", "vecino", "barrio",
+    # uso de la app
+    "app", "aplicacion", "borrador", "ubicacion", "direccion", "referencia", "foto", "video", "evidencia",
+    "firma", "adjuntar", "enviar", "cuenta", "contrasena", "registro", "perfil", "verificacion", "correo",
+}
+
+PALABRAS_FUERA = {
+    "receta", "cocinar", "comida", "futbol", "gol", "mundial", "pelicula", "cancion",
+    "chiste", "poema", "cuento", "horoscopo", "signo", "tarea", "ensayo", "matematica",
+    "ecuacion", "derivada", "programacion", "programar", "python", "javascript", "bitcoin",
+    "cripto", "criptomoneda", "inversion", "apuesta", "loteria", "novia", "novio", "amor", "coqueteo",
+    "traduce", "traducir", "ingles", "videojuego", "netflix", "tiktok", "chatgpt",
+}
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def _base(p: str):
+    # plural simple, igual para el mensaje y las listas
+    if len(p) > 4 and p.endswith("es"):
+        return p[:-2]
+    if len(p) > 3 and p.endswith("s"):
+        return p[:-1]
+    return p
+
+
+_DENTRO = {_base(p) for p in PALABRAS_DENTRO}
+_FUERA = {_base(p) for p in PALABRAS_FUERA}
+
+
+def _palabras_tipos():
+    out = set()
+    for t in tipos_activos():
+        out.update(_base(p) for p in normalizar(t["nombre"]).split() if len(p) > 3)
+    return out
+
+
+# =========================================================
+# Métricas
+# =========================================================
+_stats = {FUERA: 0, DENTRO: 0, AMBIGUO: 0}
+_stats_lock = threading.Lock()
+
+
+def metricas():
+    with _stats_lock:
+        d = dict(_stats)
+    total = sum(d.values())
+    d["tasa_fuera"] = round(d[FUERA] / total, 3) if total else 0.0
+    return d
+
+
+# =========================================================
+# API
+# =========================================================
+def clasificar(texto: str):
+    """FUERA / DENTRO / AMBIGUO para un mensaje libre (sin campos extraídos)."""
+    palabras = {_base(p) for p in normalizar(texto).split()}
+    dentro = len(palabras & (_DENTRO | _palabras_tipos()))
+    fuera = len(palabras & _FUERA)
+
+    # una sola palabra ajena en una frase larga no basta
+    proporcion = fuera / len(palabras) if palabras else 0.0
+    if dentro:
+        decision = DENTRO
+    elif fuera and (
+        fuera >= _cfg("CHAT_TEMA_MIN_FUERA", 2) or proporcion >= _cfg("CHAT_TEMA_PROPORCION_FUERA", 0.3)
+    ):
+        decision = FUERA
+    else:
+        decision = AMBIGUO
+
+    with _stats_lock:
+        _stats[decision] += 1
+    logger.info("tema decision=%s dentro=%s fuera=%s palabras=%s", decision, dentro, fuera, len(palabras))
+    return decision
@@ -1,3 +1,513 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from catalogos_api import tipos
+from db.models import (
+    Ciudadanos,
+    ChatConversaciones,
+    ChatMensajes,
+    DenunciaBorradores,
+    TiposDenuncia,
+    Usuarios,
+)
+
+from . import bloqueos, cache_respuestas, llm_falso, llm_gateway, tema, turnos
+
+# Presupuesto de consultas por turno (incluye la del JWT y el SAVEPOINT/RELEASE
+# que TestCase agrega alrededor de transaction.atomic).
+PRESUPUESTO_TURNO_LOCAL = 7
+PRESUPUESTO_TURNO_LLM = 9
+
+
+def _respuesta(n, texto="", llamadas=()):
+    return SimpleNamespace(id=f"resp_{n}", output=list(llamadas), output_text=texto, usage=None)
+
+
+class TurnoConsultasTests(TestCase):
+    """Un turno lee el estado una vez y lo guarda en una sola transacción."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.usuario = Usuarios.objects.create(
+            id=uuid.uuid4(), tipo="ciudadano", correo="ciudadano@test.ec", password_hash="x",
+            activo=True, correo_verificado=True, created_at=now, updated_at=now,
+        )
+        Ciudadanos.objects.create(
+            usuario=cls.usuario, cedula="0500000001", nombres="Ana", apellidos="Pérez",
+            created_at=now, updated_at=now,
+        )
+        cls.tipo = TiposDenuncia.objects.create(
+            nombre="Acumulación de basura", activo=True, created_at=now, updated_at=now,
+        )
+        cls.conv = ChatConversaciones.objects.create(
+            id=uuid.uuid4(), ciudadano_id=cls.usuario.id, created_at=now, updated_at=now,
+        )
+        cls.borr = DenunciaBorradores.objects.create(
+            id=uuid.uuid4(), ciudadano_id=cls.usuario.id, conversacion_id=cls.conv.id,
+            datos_json={"origen": "chat", "tipo_denuncia_id": cls.tipo.id},
+            listo_para_enviar=False, created_at=now, updated_at=now,
+        )
+
+    def setUp(self):
+        cache.clear()
+        tipos.invalidar()
+        tipos.tipos_activos()  # el índice de tipos se carga una vez por proceso
+
+        token = AccessToken()
+        token["uid"] = str(self.usuario.id)
+        token["tipo"] = "ciudadano"
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def _enviar(self, mensaje, conv=None, **extra):
+        return self.client.post(
+            reverse("chatbot_message"),
+            data=json.dumps({"conversacion_id": str((conv or self.conv).id), "mensaje": mensaje, **extra}),
+            content_type="application/json",
+            **self.auth,
+        )
+
+    def _inserts_mensajes(self, ctx):
+        return [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "chat_mensajes"')]
+
+    def test_turno_local(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self._enviar("descripcion: hay basura acumulada en la esquina")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertLessEqual(len(ctx), PRESUPUESTO_TURNO_LOCAL, [q["sql"] for q in ctx.captured_queries])
+        self.assertEqual(len(self._inserts_mensajes(ctx)), 1)
+        self.assertEqual(ChatMensajes.objects.filter(conversacion_id=self.conv.id).count(), 2)
+        self.assertEqual(
+            r.json()["borrador"]["datos"]["descripcion"], "hay basura acumulada en la esquina"
+        )
+
+    def test_turno_llm_con_tool(self):
+        llamadas = []
+
+        async def falso(sitio, **kwargs):
+            llamadas.append(kwargs)
+            if len(llamadas) == 1:
+                call = {
+                    "type": "function_call", "call_id": "c1", "name": "update_borrador",
+                    "arguments": json.dumps({"borrador_id": str(self.borr.id), "referencia": "junto al parque"}),
+                }
+                return _respuesta(1, llamadas=[call])
+            return _respuesta(2, "¿Me envías tu ubicación?")
+
+        with mock.patch.object(llm_gateway, "acrear", new=falso):
+            with CaptureQueriesContext(connection) as ctx:
+                r = self._enviar("es cerca del parque central, ¿qué más necesitas?")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(llamadas), 2)
+        self.assertLessEqual(len(ctx), PRESUPUESTO_TURNO_LLM, [q["sql"] for q in ctx.captured_queries])
+        self.assertEqual(len(self._inserts_mensajes(ctx)), 1)
+
+        self.borr.refresh_from_db()
+        self.assertEqual(self.borr.datos_json["referencia"], "junto al parque")
+        self.assertEqual(r.json()["borrador"]["datos"]["referencia"], "junto al parque")
+
+        conv = ChatConversaciones.objects.get(id=self.conv.id)
+        self.assertEqual(conv.ultimo_response_id, "resp_2")
+        emisores = list(
+            ChatMensajes.objects.filter(conversacion_id=self.conv.id).order_by("created_at").values_list("emisor", flat=True)
+        )
+        self.assertEqual(emisores, ["usuario", "bot"])
+
+
+    def _turno_encadenado(self, **conv):
+        ChatConversaciones.objects.filter(id=self.conv.id).update(
+            ultimo_response_id="resp_prev", ultimo_response_at=timezone.now(), **conv
+        )
+        llamadas = []
+
+        async def falso(sitio, **kwargs):
+            llamadas.append(kwargs)
+            return _respuesta(len(llamadas), "¿Me envías tu ubicación?")
+
+        with mock.patch.object(llm_gateway, "acrear", new=falso):
+            self.assertEqual(self._enviar("es cerca del parque central, ¿qué más necesitas?").status_code, 200)
+        return llamadas[0], ChatConversaciones.objects.get(id=self.conv.id)
+
+    def test_cadena_continua_y_acumula(self):
+        kwargs, conv = self._turno_encadenado(cadena_turnos=2, cadena_tokens=100)
+
+        self.assertEqual(kwargs["previous_response_id"], "resp_prev")
+        self.assertEqual(conv.cadena_turnos, 3)
+        self.assertGreater(conv.cadena_tokens, 100)
+
+    @override_settings(CHAT_CADENA_MAX_TURNOS=8)
+    def test_cadena_se_reinicia_tras_max_turnos(self):
+        kwargs, conv = self._turno_encadenado(cadena_turnos=8, cadena_tokens=100)
+
+        self.assertNotIn("previous_response_id", kwargs)
+        self.assertEqual(kwargs["input"][0]["role"], "developer")
+        self.assertEqual(conv.cadena_turnos, 1)
+
+    @override_settings(CHAT_HISTORIAL_MAX_TOKENS=1500)
+    def test_cadena_se_reinicia_al_pasar_el_presupuesto(self):
+        kwargs, conv = self._turno_encadenado(cadena_turnos=1, cadena_tokens=1495)
+
+        self.assertNotIn("previous_response_id", kwargs)
+        self.assertEqual((conv.cadena_turnos, conv.ultimo_response_id), (1, "resp_1"))
+        self.assertLess(conv.cadena_tokens, 1495)
+
+    def _conversacion_sin_borrador(self, *mensajes):
+        now = timezone.now()
+        conv = ChatConversaciones.objects.create(
+            id=uuid.uuid4(), ciudadano_id=self.usuario.id, created_at=now, updated_at=now,
+        )
+        ChatMensajes.objects.bulk_create([
+            ChatMensajes(id=uuid.uuid4(), conversacion_id=conv.id, emisor=emisor, mensaje=texto,
+                         created_at=now + timedelta(seconds=i))
+            for i, (emisor, texto) in enumerate(mensajes)
+        ])
+        return conv
+
+    def _pregunta_al_llm(self, conv, pregunta, texto):
+        async def falso(sitio, **kwargs):
+            return _respuesta(1, texto)
+
+        with mock.patch.object(llm_gateway, "acrear", new=falso):
+            self.assertEqual(self._enviar(pregunta, conv).json()["respuesta"], texto)
+
+    def test_cache_guarda_primera_pregunta_tras_el_saludo(self):
+        conv = self._conversacion_sin_borrador(("bot", "Hola 👋 ¿Qué deseas denunciar hoy?"))
+
+        self._pregunta_al_llm(conv, "¿cuál es el horario de atención?", "De 8:00 a 17:00.")
+
+        self.assertEqual(cache_respuestas.buscar("¿cuál es el horario de atención?"), "De 8:00 a 17:00.")
+
+    def test_cache_no_guarda_respuestas_con_historial(self):
+        conv = self._conversacion_sin_borrador(
+            ("bot", "Hola 👋 ¿Qué deseas denunciar hoy?"),
+            ("usuario", "ayer reporté un bache en la calle Quito"),
+            ("bot", "Entiendo, ¿quieres hacer una nueva denuncia?"),
+        )
+
+        self._pregunta_al_llm(conv, "¿cuándo lo arreglan?", "El bache de la calle Quito se revisa esta semana.")
+
+        self.assertIsNone(cache_respuestas.buscar("¿cuándo lo arreglan?"))
+
+    def _mensajes(self):
+        return ChatMensajes.objects.filter(conversacion_id=self.conv.id).count()
+
+    def test_mismo_texto_tras_la_respuesta_es_otro_turno(self):
+        self.assertEqual(self._enviar("no").status_code, 200)
+        self.assertEqual(self._enviar("no").status_code, 200)
+
+        self.assertEqual(self._mensajes(), 4)
+
+    def test_mismo_mensaje_id_es_un_doble_envio(self):
+        primero = self._enviar("no", mensaje_id="m-1").json()
+        segundo = self._enviar("no", mensaje_id="m-1").json()
+
+        self.assertEqual(primero, segundo)
+        self.assertEqual(self._mensajes(), 2)
+        self._enviar("no", mensaje_id="m-2")
+        self.assertEqual(self._mensajes(), 4)
+
+    def _en_otro_proceso(self, mensaje, **extra):
+        # otro worker: el lock es compartido (BD) pero la caché de resultados no
+        propia = LocMemCache(f"otro-{uuid.uuid4()}", {})
+        with mock.patch.object(turnos, "cache", propia):
+            return self._enviar(mensaje, **extra)
+
+    def _pregunta_en_dos_procesos(self, texto_llm, **extra):
+        llamadas = []
+
+        async def falso(sitio, **kwargs):
+            llamadas.append(kwargs)
+            if texto_llm is None:
+                raise llm_gateway.LLMNoDisponible("caído")
+            return _respuesta(len(llamadas), texto_llm)
+
+        pregunta = "quisiera saber si pueden ayudarme con lo del parque central"
+        with mock.patch.object(llm_gateway, "acrear", new=falso):
+            primero = self._en_otro_proceso(pregunta, **extra).json()
+            segundo = self._en_otro_proceso(pregunta, **extra).json()
+        return primero, segundo, llamadas
+
+    def test_doble_envio_en_otro_proceso_usa_la_respuesta_guardada(self):
+        primero, segundo, llamadas = self._pregunta_en_dos_procesos("¿Me envías tu ubicación?", mensaje_id="m-1")
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(segundo["respuesta"], primero["respuesta"])
+        self.assertEqual(self._mensajes(), 2)
+
+    def test_doble_envio_sin_mensaje_id_en_otro_proceso(self):
+        # el segundo request leyó el último mensaje antes de que el primero guardara
+        clave, vistos = turnos.clave, []
+
+        def clave_concurrente(texto, mensaje_id=None, ultimo_id=None):
+            vistos.append(ultimo_id)
+            return clave(texto, mensaje_id, vistos[0])
+
+        with mock.patch.object(turnos, "clave", clave_concurrente):
+            primero, segundo, llamadas = self._pregunta_en_dos_procesos("¿Me envías tu ubicación?")
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(segundo["respuesta"], primero["respuesta"])
+        self.assertEqual(self._mensajes(), 2)
+
+    def test_respuesta_de_respaldo_no_se_reutiliza_en_otro_proceso(self):
+        _, _, llamadas = self._pregunta_en_dos_procesos(None, mensaje_id="m-1")
+
+        self.assertGreaterEqual(len(llamadas), 2)
+        self.assertEqual(self._mensajes(), 4)
+
+
+class TemaTests(TestCase):
+    """Filtro de temas: una palabra ajena suelta no saca de tema una denuncia."""
+
+    def setUp(self):
+        tipos.invalidar()
+
+    def test_denuncias_con_palabras_ambiguas_quedan_dentro(self):
+        for texto in (
+            "hay música a todo volumen toda la noche",
+            "se rompió un tubo y está partido",
+            "no me llega el código de verificación",
+            "hay una fiesta con música hasta las 4am",
+        ):
+            with self.subTest(texto=texto):
+                self.assertEqual(tema.clasificar(texto), tema.DENTRO)
+
+    def test_una_palabra_ajena_en_frase_larga_no_basta(self):
+        self.assertEqual(tema.clasificar("ayer vi una película con mi familia en casa"), tema.AMBIGUO)
+
+    def test_fuera_de_tema(self):
+        self.assertEqual(tema.clasificar("cuéntame un chiste"), tema.FUERA)
+        self.assertEqual(tema.clasificar("dame una receta de comida típica"), tema.FUERA)
+
+@override_settings(LLM_CB_FALLOS=2, LLM_CB_ENFRIAMIENTO_SEG=30, LLM_TIMEOUT_SEG=30)
+class CircuitoTests(SimpleTestCase):
+    """Tras el enfriamiento pasa una sola llamada de prueba."""
+
+    def setUp(self):
+        self.circuito = llm_gateway._Circuito()
+        self.circuito.fallo()
+        self.circuito.fallo()
+
+    def _vencer_enfriamiento(self):
+        self.circuito.abierto_hasta = time.monotonic() - 1
+
+    def test_abierto_rechaza(self):
+        self.assertFalse(self.circuito.permitir())
+        self.assertTrue(self.circuito.abierto())
+
+    def test_half_open_deja_pasar_una_sonda(self):
+        self._vencer_enfriamiento()
+        self.assertTrue(self.circuito.permitir())
+        self.assertFalse(self.circuito.permitir())
+
+        self.circuito.exito()
+        self.assertTrue(self.circuito.permitir())
+        self.assertTrue(self.circuito.permitir())
+
+    def test_sonda_fallida_reabre(self):
+        self._vencer_enfriamiento()
+        self.assertTrue(self.circuito.permitir())
+
+        self.circuito.fallo()
+        self.assertFalse(self.circuito.permitir())
+        self.assertGreater(self.circuito.abierto_hasta, time.monotonic())
+
+    def test_sonda_sin_respuesta_se_libera(self):
+        self._vencer_enfriamiento()
+        self.assertTrue(self.circuito.permitir())
+        self.circuito.sonda_hasta = time.monotonic() - 1
+
+        self.assertTrue(self.circuito.permitir())
+
+
+class StreamLatenciaTests(SimpleTestCase):
+    """La latencia de un stream se mide hasta response.completed, no hasta abrirlo."""
+
+    def setUp(self):
+        llm_gateway._metricas.clear()
+
+    def _consumir(self, eventos):
+        async def stream():
+            for ev in eventos:
+                yield ev
+
+        async def correr():
+            t0 = time.monotonic() - 2  # el stream lleva 2 s abierto
+            with mock.patch.object(llm_gateway, "_soltar_slot_async", new=mock.AsyncMock()):
+                async for _ in llm_gateway._stream_con_slot(stream(), ("k", "t"), "test.stream", "m", t0, 0):
+                    pass
+
+        with mock.patch.object(llm_gateway.uso_llm, "anotar") as anotar:
+            async_to_sync(correr)()
+        return anotar, llm_gateway.metricas()["test.stream"]
+
+    def test_stream_completo(self):
+        usage = SimpleNamespace(input_tokens=10, output_tokens=4)
+        final = SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage))
+
+        anotar, m = self._consumir([SimpleNamespace(type="response.output_text.delta"), final])
+
+        self.assertEqual((m["llamadas"], m["errores"], m["tokens_salida"]), (1, 0, 4))
+        self.assertGreaterEqual(m["latencia_max_ms"], 2000)
+        self.assertEqual(anotar.call_args.kwargs["resultado"], llm_gateway.uso_llm.OK)
+
+    def test_stream_cortado_cuenta_como_error(self):
+        anotar, m = self._consumir([SimpleNamespace(type="response.output_text.delta")])
+
+        self.assertEqual(m["errores"], 1)
+        self.assertEqual(anotar.call_args.kwargs["resultado"], llm_gateway.uso_llm.ERROR)
+
+
+class _CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.conn.sql.append((sql, params))
+
+    def fetchone(self):
+        return self.conn.fila
+
+
+class _ConexionFalsa:
+    def __init__(self, fila=(True,)):
+        self.fila = fila
+        self.sql = []
+        self.cerrada = False
+
+    def cursor(self):
+        return _CursorFalso(self)
+
+    def is_usable(self):
+        return not self.cerrada
+
+    def close(self):
+        self.cerrada = True
+
+
+class AdvisoryLockTests(SimpleTestCase):
+    """Con Postgres turnos y cupos del LLM son advisory locks en conexiones dedicadas."""
+
+    def setUp(self):
+        bloqueos._libres.clear()
+        self.addCleanup(bloqueos._libres.clear)
+
+    def _tomar(self, conn, fn=bloqueos.tomar, *args):
+        with mock.patch.object(bloqueos, "_conexion", return_value=conn):
+            return fn(*(args or (1, 2)), 60)
+
+    def test_toma_y_suelta(self):
+        conn = _ConexionFalsa()
+        lock = self._tomar(conn)
+
+        self.assertIsNotNone(lock)
+        self.assertIn("pg_try_advisory_lock", conn.sql[0][0])
+        lock.soltar()
+        self.assertEqual(conn.sql[-1], ("SELECT pg_advisory_unlock(%s, %s)", (1, 2)))
+        lock.vence.join(1)
+        self.assertFalse(lock.vence.is_alive())
+        self.assertEqual(bloqueos._libres, [conn])
+
+    def test_ocupado_devuelve_la_conexion(self):
+        conn = _ConexionFalsa(fila=(False,))
+        self.assertIsNone(self._tomar(conn))
+        self.assertEqual(bloqueos._libres, [conn])
+
+    def test_vencido_cierra_la_conexion(self):
+        conn = _ConexionFalsa()
+        lock = self._tomar(conn)
+
+        lock._vencer()
+        lock.soltar()
+
+        self.assertTrue(conn.cerrada)
+        self.assertEqual(len(conn.sql), 1)  # no intenta el unlock sobre la conexión cerrada
+        self.assertEqual(bloqueos._libres, [])
+
+    def test_tomar_alguno_suelta_el_cupo_elegido(self):
+        conn = _ConexionFalsa(fila=(3,))
+        lock = self._tomar(conn, bloqueos.tomar_alguno, llm_gateway.SLOT_CLASE, 16)
+
+        lock.soltar()
+        self.assertEqual(conn.sql[-1][1], (llm_gateway.SLOT_CLASE, 3))
+
+        todos = _ConexionFalsa(fila=None)
+        self.assertIsNone(self._tomar(todos, bloqueos.tomar_alguno, llm_gateway.SLOT_CLASE, 16))
+
+    @override_settings(LLM_COLA_ESPERA_SEG=0)
+    def test_gateway_usa_advisory_locks_con_postgres(self):
+        lock = mock.Mock(spec=bloqueos.Bloqueo)
+        with mock.patch.object(bloqueos, "disponible", return_value=True), \
+                mock.patch.object(bloqueos, "tomar_alguno", return_value=lock) as tomar:
+            slot = llm_gateway._tomar_slot(time.monotonic() + 30)
+            llm_gateway._soltar_slot(slot)
+
+        self.assertIs(slot, lock)
+        self.assertEqual(tomar.call_args.args[:2], (llm_gateway.SLOT_CLASE, 16))
+        lock.soltar.assert_called_once()
+
+        with mock.patch.object(bloqueos, "disponible", return_value=True), \
+                mock.patch.object(bloqueos, "tomar_alguno", return_value=None):
+            with self.assertRaises(llm_gateway.LLMSaturado):
+                llm_gateway._tomar_slot(time.monotonic() + 30)
+
+
+@override_settings(LLM_FALSO_LATENCIA="fija:0")
+class LlmFalsoTests(SimpleTestCase):
+    """Cliente local de pruebas de carga y modo grabar."""
+
+    def test_stream_sync(self):
+        eventos = list(llm_falso.ClienteFalso().responses.create(input="hola", stream=True))
+
+        self.assertEqual(eventos[-1].type, "response.completed")
+        self.assertEqual("".join(e.delta for e in eventos if e.type == "response.output_text.delta"),
+                         eventos[-1].response.output_text)
+
+    def test_gateway_sync_rechaza_stream(self):
+        with self.assertRaises(ValueError):
+            llm_gateway.crear("test", input="hola", stream=True)
+
+    def test_grabar_escribe_fuera_del_repo(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, True)
+        destino = os.path.join(carpeta, "sub", "llm.json")
+        resp = SimpleNamespace(id="r", output=[], output_text="Hola 🙂", usage=None)
+
+        async def real(**kwargs):
+            return resp
+
+        cliente = llm_falso.grabador(SimpleNamespace(responses=SimpleNamespace(create=real),
+                                                     chat=SimpleNamespace(completions=SimpleNamespace(create=real))),
+                                     asincrono=True)
+        with override_settings(LLM_GRABAR_ARCHIVO=destino):
+            self.assertIs(async_to_sync(cliente.responses.create)(input="hay basura en mi calle"), resp)
+
+        with open(destino, encoding="utf-8") as f:
+            self.assertEqual([e["clave"] for e in json.load(f)], ["hay basura en mi calle"])
@@ -0,0 +1,118 @@
+"""
+Un turno a la vez por conversación.
+
+- El primer request toma el lock de la conversación y ejecuta el turno.
+- Si llega el MISMO mensaje mientras tanto (doble envío / doble tap) espera
+  y devuelve el resultado del turno en curso, sin otra llamada al LLM.
+- Si llega un mensaje distinto, espera a que se libere el lock y corre después.
+- El resultado queda CHAT_DEDUP_SEG segundos en la caché para reenvíos tardíos.
+- La caché es solo el camino rápido (LocMemCache es por proceso): el
+  mensaje del bot se guarda con la huella del mensaje que responde y, ya con
+  el lock, el turno la busca en la BD (views._Turno.cargar). Un doble envío
+  que cae en otro worker devuelve esa respuesta sin volver a llamar al LLM.
+
+"El mismo mensaje" es el mismo mensaje_id enviado por la app o, si no lo
+manda, el mismo texto sobre el mismo último mensaje de la conversación: un
+"sí" nuevo después de que el bot respondió no reutiliza la respuesta anterior.
+
+El lock es un advisory lock de Postgres (bloqueos.py: aplica entre todos los
+workers y se suelta solo si el proceso muere); dura como máximo
+CHAT_TURNO_LEASE_SEG. Con otra base de datos (SQLite en desarrollo) se usa un
+lease en la caché, que con LocMemCache es por proceso.
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+import zlib
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+
+from catalogos_api.tipos import normalizar
+
+from . import bloqueos
+
+POLL_SEG = 0.15
+LOCK_CLASE = 0x43484154  # "CHAT": primer argumento de pg_try_advisory_lock(int, int)
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def clave(texto: str, mensaje_id=None, ultimo_id=None):
+    """Identidad del mensaje para detectar dobles envíos."""
+    if mensaje_id:
+        return f"id:{mensaje_id}"
+    return f"{ultimo_id or '-'}:{normalizar(texto)}"
+
+
+def _lease_key(conv_id):
+    return f"chat:turno:{conv_id}"
+
+
+def huella(clave_: str):
+    """Versión corta de la clave, la que se guarda en ChatMensajes.clave_turno."""
+    return hashlib.sha1(clave_.encode()).hexdigest()
+
+
+def _res_key(conv_id, clave_: str):
+    return f"chat:turno:{conv_id}:res:{huella(clave_)}"
+
+
+def _clave_lock(conv_id):
+    return zlib.crc32(str(conv_id).encode()) - 2 ** 31
+
+
+async def _tomar(conv_id):
+    lease = _cfg("CHAT_TURNO_LEASE_SEG", 90)
+    if bloqueos.disponible():
+        return await sync_to_async(bloqueos.tomar, thread_sensitive=False)(LOCK_CLASE, _clave_lock(conv_id), lease)
+    token = uuid.uuid4().hex
+    if await cache.aadd(_lease_key(conv_id), token, lease):
+        return token
+    return None
+
+
+# =========================================================
+# API
+# =========================================================
+async def esperar(conv_id, clave_: str):
+    """
+    Devuelve:
+      ("propio", token)      -> este request ejecuta el turno (llamar terminar/liberar);
+                                antes de llamar al LLM debe buscar la respuesta en la BD
+      ("coalescido", payload) -> el mismo mensaje ya se respondió / está respondiéndose
+      ("ocupado", None)       -> se agotó la espera
+    """
+    res_key = _res_key(conv_id, clave_)
+    limite = time.monotonic() + _cfg("CHAT_TURNO_ESPERA_SEG", 60)
+    while True:
+        previo = await cache.aget(res_key)
+        if previo is not None:
+            return "coalescido", previo
+
+        token = await _tomar(conv_id)
+        if token is not None:
+            return "propio", token
+
+        if time.monotonic() >= limite:
+            return "ocupado", None
+        await asyncio.sleep(POLL_SEG)
+
+
+async def terminar(conv_id, clave_: str, token, payload: dict):
+    await cache.aset(_res_key(conv_id, clave_), payload, _cfg("CHAT_DEDUP_SEG", 10))
+    await liberar(conv_id, token)
+
+
+async def liberar(conv_id, token):
+    if isinstance(token, bloqueos.Bloqueo):
+        await sync_to_async(token.soltar, thread_sensitive=False)()
+        return
+    # solo borramos el lease si sigue siendo nuestro (pudo expirar y tomarlo otro)
+    if await cache.aget(_lease_key(conv_id)) == token:
+        await cache.adelete(_lease_key(conv_id))
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import ChatbotMessageView, ChatbotStartView
+from .views import ChatbotMessageView, ChatbotMessageStreamView, ChatbotStartView
 
 urlpatterns = [
     path("start/", ChatbotStartView.as_view(), name="chatbot_start"),
     path("message/", ChatbotMessageView.as_view(), name="chatbot_message"),
+    path("message/stream/", ChatbotMessageStreamView.as_view(), name="chatbot_message_stream"),
 ]
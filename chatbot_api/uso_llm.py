@@ -0,0 +1,161 @@
+"""
+Registro persistente del uso del LLM por llamada (tabla llm_uso).
+
+llm_gateway anota cada llamada (sitio, modelo, tokens de entrada / cacheados /
+salida, latencia, resultado). anotar() solo agrega la fila a un buffer en
+memoria; un hilo de fondo la escribe con bulk_create cada LLM_USO_FLUSH_SEG
+o al juntar LLM_USO_LOTE filas, así el request nunca espera a la BD.
+
+Si la BD falla las filas se reintentan en la siguiente pasada; por encima de
+LLM_USO_MAX_PENDIENTES se descartan las más viejas (se cuentan en metricas()).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from db.models import LlmUso
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+FALLBACK = "fallback"
+SATURADO = "saturado"
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+# =========================================================
+# Buffer
+# =========================================================
+_pendientes = []
+_lock = threading.Lock()
+_hay_lote = threading.Event()
+_hilo = None
+_stats = {"anotadas": 0, "escritas": 0, "descartadas": 0, "fallos_escritura": 0}
+
+
+def metricas():
+    with _lock:
+        d = dict(_stats)
+        d["pendientes"] = len(_pendientes)
+    return d
+
+
+def anotar(sitio: str, modelo, ms: float, entrada=0, cacheados=0, salida=0, resultado=OK, reintentos=0):
+    """Encola una fila de uso (no toca la BD)."""
+    if not _cfg("LLM_USO_REGISTRAR", True):
+        return
+    fila = LlmUso(
+        sitio=sitio[:100],
+        modelo=(modelo or None) and str(modelo)[:100],
+        tokens_entrada=int(entrada or 0),
+        tokens_cacheados=int(cacheados or 0),
+        tokens_salida=int(salida or 0),
+        latencia_ms=int(ms),
+        resultado=resultado,
+        reintentos=int(reintentos or 0),
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _pendientes.append(fila)
+        _stats["anotadas"] += 1
+        exceso = len(_pendientes) - _cfg("LLM_USO_MAX_PENDIENTES", 5000)
+        if exceso > 0:
+            del _pendientes[:exceso]
+            _stats["descartadas"] += exceso
+        lleno = len(_pendientes) >= _cfg("LLM_USO_LOTE", 100)
+    _arrancar()
+    if lleno:
+        _hay_lote.set()
+
+
+# =========================================================
+# Escritura
+# =========================================================
+def vaciar():
+    """Escribe lo pendiente en un solo INSERT por lote. Devuelve filas escritas."""
+    with _lock:
+        filas = _pendientes[:]
+        _pendientes.clear()
+    if not filas:
+        return 0
+    try:
+        LlmUso.objects.bulk_create(filas, batch_size=_cfg("LLM_USO_LOTE", 100))
+    except Exception:
+        logger.exception("No se pudo guardar el uso del LLM (%s filas)", len(filas))
+        with _lock:
+            # vuelven al frente para el próximo intento (el tope se aplica en anotar)
+            _pendientes[:0] = filas
+            _stats["fallos_escritura"] += 1
+        return 0
+    with _lock:
+        _stats["escritas"] += len(filas)
+    return len(filas)
+
+
+def _bucle():
+    while True:
+        _hay_lote.wait(_cfg("LLM_USO_FLUSH_SEG", 5))
+        _hay_lote.clear()
+        # hilo propio: conexión propia a la BD, se cierra si quedó vieja
+        close_old_connections()
+        try:
+            vaciar()
+        finally:
+            close_old_connections()
+
+
+def _arrancar():
+    global _hilo
+    if _hilo is not None:
+        return
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle, name="llm-uso", daemon=True)
+            _hilo.start()
+
+
+@atexit.register
+def _al_salir():
+    try:
+        vaciar()
+    except Exception:
+        pass
+
+
+# =========================================================
+# Costos (panel de uso)
+# =========================================================
+# USD por millón de tokens; LLM_PRECIOS en settings los reemplaza por modelo
+PRECIOS_DEFECTO = {
+    "gpt-4o-mini": {"entrada": 0.15, "cacheado": 0.075, "salida": 0.60},
+    "gpt-5": {"entrada": 1.25, "cacheado": 0.125, "salida": 10.0},
+}
+RUTAS = ("rapido", "completo")
+
+
+def familia(sitio: str):
+    """Sitio sin el sufijo de ruta: "chatbot.turno.rapido" -> "chatbot.turno"."""
+    base, _, ultimo = sitio.rpartition(".")
+    return base if base and ultimo in RUTAS else sitio
+
+
+def costo(modelo, entrada=0, cacheados=0, salida=0):
+    """Costo estimado en USD (None si el modelo no tiene precio)."""
+    precios = {**PRECIOS_DEFECTO, **_cfg("LLM_PRECIOS", {})}.get(modelo or "")
+    if not precios:
+        return None
+    # input_tokens ya incluye los cacheados
+    sin_cache = max(0, (entrada or 0) - (cacheados or 0))
+    return (
+        sin_cache * precios["entrada"]
+        + (cacheados or 0) * precios.get("cacheado", precios["entrada"])
+        + (salida or 0) * precios["salida"]
+    ) / 1_000_000
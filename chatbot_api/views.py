@@ -1,44 +1,56 @@
 import json
 import re
+import time
 import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework.exceptions import AuthenticationFailed
 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+import openai
 
-from openai import OpenAI
 
 from db.models import (
     Ciudadanos,
-    TiposDenuncia,
     ChatConversaciones,
     ChatMensajes,
     DenunciaBorradores,
     Denuncias,
 )
+from catalogos_api.tipos import match_tipo, tipos_activos
+from denuncias_api.clasificador import sugerir_tipo
+from denuncias_api.media_storage import liberar_evidencias
+from usuarios_api.authentication import UsuariosJWTAuthentication
+
+from . import cache_respuestas, dialogo, enrutador, herramientas, historial, llm_gateway, tema, turnos
+from .llm_gateway import LLMNoDisponible, LLMSaturado
 
 # =========================================================
-# Helpers JWT
+# LLM (ver llm_gateway.py)
 # =========================================================
-def get_claim(request, key: str, default=None):
-    token = getattr(request, "auth", None)
-    if token is None:
-        return default
-    try:
-        return token.get(key, default)
-    except Exception:
-        return default
+FALLBACK_CHAT = (
+    "Ahora mismo no puedo procesar tu mensaje 🙏. Lo que ya me contaste quedó guardado; "
+    "intenta de nuevo en unos minutos."
+)
+FALLBACK_SATURADO = (
+    "Estoy atendiendo muchos mensajes en este momento 🙏. Lo que ya me contaste quedó guardado; "
+    "intenta de nuevo en unos segundos."
+)
 
 
-# =========================================================
-# OpenAI client
-# =========================================================
-def _client():
-    return OpenAI(api_key=settings.OPENAI_API_KEY)
+def _fallback(e: LLMNoDisponible):
+    return FALLBACK_SATURADO if isinstance(e, LLMSaturado) else FALLBACK_CHAT
 
 
 # =========================================================
@@ -157,21 +169,10 @@ CANCEL_WORDS = {"no", "no.", "cancelar", "anular", "aun no", "aún no"}
 
 
 def _match_tipo_to_id(nombre: str):
+    # índice en memoria con tildes/sinónimos/trigramas (catalogos_api/tipos.py)
     if not nombre:
         return None
-    n = nombre.strip().lower()
-
-    qs = TiposDenuncia.objects.filter(activo=True)
-    for t in qs:
-        if t.nombre and (t.nombre.strip().lower() in n or n in t.nombre.strip().lower()):
-            return int(t.id)
-
-    if "basura" in n or "aseo" in n:
-        t = TiposDenuncia.objects.filter(activo=True, nombre__icontains="basura").first()
-        if t:
-            return int(t.id)
-
-    return None
+    return match_tipo(nombre)
 
 
 def _extract_fields_from_text(text: str):
@@ -201,13 +202,19 @@ def _extract_fields_from_text(text: str):
     return out
 
 
+def _texto_residual(text: str):
+    # lo que no capturó ningún extractor (para saber si el mensaje es solo datos)
+    for rx in (_re_latlng, _re_tipo, _re_desc, _re_ref, _re_dir):
+        text = rx.sub(" ", text)
+    return text
+
+
 # =========================================================
 # Tools backend
 # =========================================================
 def _execute_tool(uid: str, tool_name: str, args: dict):
     if tool_name == "get_tipos_denuncia":
-        qs = TiposDenuncia.objects.filter(activo=True).order_by("nombre")
-        return {"tipos": [{"id": int(x.id), "nombre": x.nombre} for x in qs]}
+        return {"tipos": tipos_activos()}
 
     if tool_name == "get_borrador":
         borrador_id = args["borrador_id"]
@@ -222,27 +229,10 @@ def _execute_tool(uid: str, tool_name: str, args: dict):
         if not b:
             return {"error": "borrador_no_existe"}
 
-        data = b.datos_json or {}
-
-        for k in ["tipo_denuncia_id", "descripcion", "referencia", "latitud", "longitud", "direccion_texto"]:
-            if k in args and args[k] is not None:
-                data[k] = args[k]
-
-        data["origen"] = "chat"
-
-        ok = (
-            bool(data.get("tipo_denuncia_id"))
-            and bool(data.get("descripcion"))
-            and data.get("latitud") is not None
-            and data.get("longitud") is not None
-        )
-
-        b.datos_json = data
-        b.listo_para_enviar = bool(ok)
-        b.updated_at = timezone.now()
+        data = _aplicar_cambios(b, args)
         b.save(update_fields=["datos_json", "listo_para_enviar", "updated_at"])
 
-        return {"updated": True, "listo_para_enviar": bool(ok), "datos": data}
+        return {"updated": True, "listo_para_enviar": bool(b.listo_para_enviar), "datos": data}
 
     if tool_name == "finalizar_denuncia":
         borrador_id = args["borrador_id"]
@@ -284,6 +274,8 @@ def _execute_tool(uid: str, tool_name: str, args: dict):
             if b.conversacion_id:
                 ChatConversaciones.objects.filter(id=b.conversacion_id).update(denuncia_id=d.id, updated_at=now)
 
+            # las evidencias del borrador no pasan a la denuncia: se sueltan sus referencias
+            liberar_evidencias(b.datos_json)
             b.delete()
 
         return {"ok": True, "denuncia_id": str(d.id)}
@@ -295,13 +287,8 @@ def _execute_tool(uid: str, tool_name: str, args: dict):
 # Historial -> input messages
 # =========================================================
 def _to_openai_messages(conv_id: str):
-    qs = ChatMensajes.objects.filter(conversacion_id=conv_id).order_by("created_at")
-    msgs = list(qs)[-30:]
-    out = []
-    for m in msgs:
-        role = "user" if m.emisor == "usuario" else "assistant"
-        out.append({"role": role, "content": m.mensaje})
-    return out
+    # ventana acotada + resumen de lo anterior (ver historial.py)
+    return historial.mensajes_para_llm(conv_id)
 
 
 def _iter_function_calls(resp):
@@ -314,6 +301,35 @@ def _iter_function_calls(resp):
                 yield {"call_id": getattr(item, "call_id", None), "name": getattr(item, "name", None), "arguments": getattr(item, "arguments", None)}
 
 
+# =========================================================
+# Borrador en memoria
+# =========================================================
+CAMPOS_BORRADOR = ["tipo_denuncia_id", "descripcion", "referencia", "latitud", "longitud", "direccion_texto"]
+
+
+def _datos_completos(data: dict):
+    return (
+        bool(data.get("tipo_denuncia_id"))
+        and bool(data.get("descripcion"))
+        and data.get("latitud") is not None
+        and data.get("longitud") is not None
+    )
+
+
+def _aplicar_cambios(b, cambios: dict):
+    # solo modifica la instancia; quien llama decide cuándo guardar
+    data = b.datos_json or {}
+    for k in CAMPOS_BORRADOR:
+        if k in cambios and cambios[k] is not None:
+            data[k] = cambios[k]
+    data["origen"] = "chat"
+
+    b.datos_json = data
+    b.listo_para_enviar = _datos_completos(data)
+    b.updated_at = timezone.now()
+    return data
+
+
 # =========================================================
 # Util: crear borrador SOLO si hay datos útiles
 # =========================================================
@@ -333,11 +349,12 @@ def _should_create_borrador(extracted: dict) -> bool:
     return False
 
 
-def _create_borrador_from_extracted(uid: str, conv_id: str, extracted: dict):
+def _borrador_desde_extraido(uid: str, conv_id: str, extracted: dict):
+    # instancia sin guardar: se inserta al cerrar el turno (_Turno.guardar)
     now = timezone.now()
     data = {"origen": "chat"}
 
-    tipo_id = None
+    tipo_id = extracted.get("tipo_denuncia_id")
     if extracted.get("tipo_texto"):
         tipo_id = _match_tipo_to_id(extracted.get("tipo_texto"))
 
@@ -353,247 +370,692 @@ def _create_borrador_from_extracted(uid: str, conv_id: str, extracted: dict):
         data["latitud"] = extracted["latitud"]
         data["longitud"] = extracted["longitud"]
 
-    # listo?
-    ok = bool(data.get("tipo_denuncia_id")) and bool(data.get("descripcion")) and data.get("latitud") is not None and data.get("longitud") is not None
-
-    b = DenunciaBorradores.objects.create(
+    return DenunciaBorradores(
         id=uuid.uuid4(),
         ciudadano_id=uid,
         conversacion_id=conv_id,
         datos_json=data,
-        listo_para_enviar=bool(ok),
+        listo_para_enviar=_datos_completos(data),
         created_at=now,
         updated_at=now,
     )
-    return b
 
 
 # =========================================================
-# Views
+# Turno: estado en memoria, una sola escritura al final
 # =========================================================
-class ChatbotStartView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        uid = get_claim(request, "uid")
-        tipo = get_claim(request, "tipo")
-        if not uid or tipo != "ciudadano":
-            return Response({"detail": "Solo ciudadanos"}, status=403)
-
-        if not Ciudadanos.objects.filter(usuario_id=uid).exists():
-            return Response({"detail": "Perfil ciudadano no existe"}, status=400)
-
+BOT_TEXT_DEFAULT = "¿Me confirmas el tipo de denuncia y una breve descripción?"
+
+
+class _Turno:
+    """
+    Estado de un turno: conversación + borrador se leen una vez (cargar) y se
+    modifican en memoria; guardar() escribe borrador, mensaje del usuario,
+    mensaje del bot y conversación en una sola transacción corta.
+
+    El lease de turnos.py garantiza un turno a la vez por conversación, así que
+    nadie más escribe este borrador mientras el turno está en curso.
+    """
+
+    def __init__(self, uid, conv_id: str, text: str, clave=None):
+        self.uid = str(uid)
+        self.conv_id = str(conv_id)
+        self.text = text
+        # identidad del mensaje (turnos.clave) y la respuesta ya guardada para él, si la hay
+        self.huella = turnos.huella(clave) if clave else None
+        self.respondido = None
+        self.recibido = timezone.now()
+        self.prev = None
+        self.prev_at = None
+        self.cadena_turnos = 0
+        self.cadena_tokens = 0
+        # lo que este turno agrega a la cadena de responses (ver _preparar_llm)
+        self.encadenado = False
+        self.tokens_enviados = 0
+        # el LLM respondió sin mensajes previos del ciudadano: la respuesta se puede compartir
+        self.sin_historial = False
+        self.borr = None
+        self.borr_nuevo = False
+        self.borr_sucio = False
+        self.ruta = enrutador.COMPLETO
+        # plazo común a todas las llamadas al LLM del turno
+        self.deadline = time.monotonic() + getattr(settings, "CHAT_TURNO_DEADLINE_SEG", 75)
+        # respuesta de respaldo: no se guarda para dobles envíos, el ciudadano debe poder reintentar
+        self.reintentable = False
+
+    def sitio(self, base: str):
+        # métricas del gateway separadas por ruta (ver enrutador.py)
+        return f"{base}.{self.ruta}"
+
+    def cargar(self):
+        # conversación, borrador (OneToOne inverso) y respuesta previa a este mensaje en una consulta
+        qs = ChatConversaciones.objects.select_related("denunciaborradores").filter(id=self.conv_id)
+        if self.huella:
+            # otro worker pudo responder el mismo mensaje (su caché no es la nuestra)
+            respuesta = ChatMensajes.objects.filter(
+                conversacion_id=OuterRef("pk"), emisor="bot", clave_turno=self.huella,
+            ).values("mensaje")[:1]
+            qs = qs.annotate(respondido=Subquery(respuesta))
+        conv = qs.first()
+        if conv is None:
+            return
+        self.respondido = getattr(conv, "respondido", None)
+        self.prev, self.prev_at = conv.ultimo_response_id, conv.ultimo_response_at
+        self.cadena_turnos, self.cadena_tokens = conv.cadena_turnos, conv.cadena_tokens
+        b = getattr(conv, "denunciaborradores", None)
+        if b is not None and str(b.ciudadano_id) == self.uid:
+            self.borr = b
+
+    def crear_borrador(self, extracted: dict):
+        self.borr = _borrador_desde_extraido(self.uid, self.conv_id, extracted)
+        self.borr_nuevo = True
+
+    def actualizar_borrador(self, cambios: dict):
+        data = _aplicar_cambios(self.borr, cambios)
+        self.borr_sucio = True
+        return data
+
+    def _escribir_borrador(self):
+        if self.borr is None:
+            return
+        if self.borr_nuevo:
+            self.borr.save(force_insert=True)
+        elif self.borr_sucio:
+            self.borr.save(update_fields=["datos_json", "listo_para_enviar", "updated_at"])
+        self.borr_nuevo = self.borr_sucio = False
+
+    def finalizar(self):
+        # finalizar_denuncia bloquea el borrador en la BD: primero se escribe lo pendiente
+        self._escribir_borrador()
+        r = _execute_tool(self.uid, "finalizar_denuncia", {"borrador_id": str(self.borr.id), "confirmacion": True})
+        if r.get("ok"):
+            self.borr = None
+        return r
+
+    def guardar(self, bot_text: str, response_id=None):
         now = timezone.now()
         with transaction.atomic():
-            conv = ChatConversaciones.objects.create(
-                id=uuid.uuid4(),
-                ciudadano_id=uid,
-                denuncia_id=None,
-                created_at=now,
-                updated_at=now,
-            )
-            ChatMensajes.objects.create(
-                id=uuid.uuid4(),
-                conversacion_id=conv.id,
-                emisor="bot",
-                mensaje="Hola 👋 ¿Qué deseas denunciar hoy? (Ej: basura, alumbrado, vías...)",
-                created_at=now,
+            self._escribir_borrador()
+            ChatMensajes.objects.bulk_create([
+                ChatMensajes(id=uuid.uuid4(), conversacion_id=self.conv_id, emisor="usuario",
+                             mensaje=self.text, created_at=self.recibido),
+                # la respuesta de respaldo no se registra: el reintento vuelve a ejecutar el turno
+                ChatMensajes(id=uuid.uuid4(), conversacion_id=self.conv_id, emisor="bot",
+                             mensaje=bot_text, created_at=now,
+                             clave_turno=None if self.reintentable else self.huella),
+            ])
+            if response_id:
+                # mismo instante que el mensaje del bot: el próximo turno solo envía lo posterior
+                tokens = self.tokens_enviados + historial.tokens([{"content": bot_text}])
+                if self.encadenado:
+                    turnos, tokens = self.cadena_turnos + 1, self.cadena_tokens + tokens
+                else:
+                    turnos = 1
+                ChatConversaciones.objects.filter(id=self.conv_id).update(
+                    ultimo_response_id=response_id, ultimo_response_at=now,
+                    cadena_turnos=turnos, cadena_tokens=tokens, updated_at=now,
+                )
+
+    def snapshot(self):
+        b = self.borr
+        return {
+            "id": str(b.id) if b else None,
+            "listo_para_enviar": bool(b.listo_para_enviar) if b else False,
+            "datos": (b.datos_json if b else {}) or {},
+        }
+
+
+def _turno_previo(turno: _Turno):
+    """
+    Todo lo que se resuelve sin LLM: carga el estado, aplica al borrador lo
+    extraído, atiende confirmación/cancelación y, si el mensaje solo traía
+    datos, pregunta el siguiente slot (dialogo.py).
+    Devuelve el payload si el turno ya terminó, si no None.
+    """
+    turno.cargar()
+    if turno.respondido is not None:
+        # doble envío ya respondido en otro proceso: misma respuesta, sin guardar de nuevo
+        return {
+            "respuesta": turno.respondido,
+            "conversacion_id": turno.conv_id,
+            "borrador": turno.snapshot(),
+        }
+    payload = _turno_sin_llm(turno)
+    dialogo.registrar_turno(local=payload is not None)
+    return payload
+
+
+def _turno_sin_llm(turno: _Turno):
+    text = turno.text
+    texto_norm = text.strip().lower()
+
+    # extraemos campos del texto
+    extracted = _extract_fields_from_text(text)
+    antes = dialogo.faltantes(turno.borr.datos_json if turno.borr else {})
+
+    # sin "tipo:" explícito, el clasificador local propone el tipo desde la descripción
+    # (el ciudadano lo ve en el resumen antes de confirmar)
+    if "tipo" in antes and extracted.get("descripcion") and not extracted.get("tipo_texto"):
+        sug = sugerir_tipo(extracted["descripcion"], minimo=getattr(settings, "CLASIFICADOR_AUTO_CONFIANZA", 0.85))
+        if sug:
+            extracted["tipo_denuncia_id"] = sug["tipo_denuncia_id"]
+
+    # ✅ si NO hay borrador, solo lo creamos si hay algo útil (evita nulls)
+    if not turno.borr and _should_create_borrador(extracted):
+        turno.crear_borrador(extracted)
+
+    # ✅ si ya hay borrador, actualizamos con extracción
+    elif turno.borr and extracted:
+        cambios = {}
+
+        if extracted.get("tipo_denuncia_id"):
+            cambios["tipo_denuncia_id"] = extracted["tipo_denuncia_id"]
+        if extracted.get("tipo_texto"):
+            tipo_id = _match_tipo_to_id(extracted["tipo_texto"])
+            if tipo_id:
+                cambios["tipo_denuncia_id"] = tipo_id
+
+        for k in ["descripcion", "referencia", "direccion_texto", "latitud", "longitud"]:
+            if k in extracted:
+                cambios[k] = extracted[k]
+
+        if cambios:
+            turno.actualizar_borrador(cambios)
+
+    borr = turno.borr
+
+    # ✅ finalizar directo si listo + confirmación
+    if borr and borr.listo_para_enviar and texto_norm in CONFIRM_WORDS:
+        r = turno.finalizar()
+        if r.get("ok"):
+            bot_text = f"✅ Denuncia enviada. ID: {r['denuncia_id']}"
+            turno.guardar(bot_text)
+            return {
+                "respuesta": bot_text,
+                "conversacion_id": turno.conv_id,
+                "denuncia_id": r["denuncia_id"],
+            }
+
+    if texto_norm in CANCEL_WORDS:
+        # No borramos nada automáticamente, solo respondemos
+        bot_text = "Está bien 🙂 Cuando quieras continuamos. Si deseas enviar, dime 'sí' o presiona Enviar."
+        turno.guardar(bot_text)
+        return {
+            "respuesta": bot_text,
+            "conversacion_id": turno.conv_id,
+            "borrador": turno.snapshot(),
+        }
+
+    # camino rápido: el mensaje solo traía datos y completó un slot pendiente
+    if borr:
+        datos = borr.datos_json or {}
+        tipo_nombre = None
+        if datos.get("tipo_denuncia_id"):
+            tipo_nombre = next(
+                (t["nombre"] for t in tipos_activos() if t["id"] == int(datos["tipo_denuncia_id"])), None
             )
+        bot_text = dialogo.respuesta_local(antes, datos, extracted, _texto_residual(text), tipo_nombre)
+        if bot_text:
+            return _cerrar_turno(turno, bot_text)
 
-        return Response({"conversacion_id": str(conv.id)}, status=201)
+    # tema claramente ajeno: respuesta fija sin pasar por el modelo
+    if not extracted and getattr(settings, "CHAT_TEMA_FILTRO", True) and tema.clasificar(text) == tema.FUERA:
+        return _cerrar_turno(turno, tema.RESPUESTA_FUERA_DE_TEMA)
 
+    # pregunta general sin borrador: respuesta previa del LLM o de la FAQ
+    if not borr and not extracted:
+        bot_text = cache_respuestas.buscar(text)
+        if bot_text:
+            return _cerrar_turno(turno, bot_text)
 
-class ChatbotMessageView(APIView):
-    permission_classes = [IsAuthenticated]
+    return None
 
-    def post(self, request):
-        uid = get_claim(request, "uid")
-        tipo = get_claim(request, "tipo")
-        if not uid or tipo != "ciudadano":
-            return Response({"detail": "Solo ciudadanos"}, status=403)
 
-        conv_id = (request.data.get("conversacion_id") or "").strip()
-        text = (request.data.get("mensaje") or "").strip()
-        if not conv_id or not text:
-            return Response({"detail": "conversacion_id y mensaje son obligatorios"}, status=400)
+def _contexto_borrador(borr):
+    # solo damos borrador_id si existe
+    if borr:
+        return [{"role": "user", "content": f"(contexto interno: borrador_id={borr.id})"}]
+    return []
+
+
+def _mensaje_usuario(turno: _Turno):
+    # el mensaje del turno todavía no está en la BD (se guarda al cerrar)
+    return [{"role": "user", "content": turno.text[:historial.MAX_CHARS_MENSAJE]}]
+
+
+def _entrada_completa(turno: _Turno):
+    # las instrucciones van como mensaje developer para que queden en la cadena
+    # de responses y no haya que reenviarlas en los turnos encadenados
+    previos = _to_openai_messages(turno.conv_id)
+    conversacion = previos + _mensaje_usuario(turno) + _contexto_borrador(turno.borr)
+    # cadena nueva: el presupuesto cuenta desde esta ventana (sin las instrucciones)
+    turno.encadenado, turno.tokens_enviados = False, historial.tokens(conversacion)
+    # solo el saludo del bot antes de esta pregunta (sin resumen ni mensajes del ciudadano)
+    turno.sin_historial = all(m["role"] == "assistant" for m in previos)
+    return [{"role": "developer", "content": INSTRUCTIONS}] + conversacion
+
+
+def _preparar_llm(turno: _Turno):
+    """
+    Devuelve (entrada, tools, previous_response_id) y fija turno.ruta.
+    Si la conversación tiene un response reciente, se encadena y solo se envían
+    los mensajes posteriores a él; si no, se reenvía el historial completo.
+    La cadena guarda todo lo enviado, así que se reinicia (ventana recortada +
+    resumen) tras CHAT_CADENA_MAX_TURNOS turnos o cuando lo acumulado pasaría
+    de CHAT_HISTORIAL_MAX_TOKENS.
+    """
+    # ✅ IMPORTANTE: si no hay borrador, filtramos tools para evitar llamadas inválidas
+    tools_for_this_turn = TOOLS if turno.borr else [t for t in TOOLS if t["name"] == "get_tipos_denuncia"]
+
+    # modelo rápido o completo según el turno
+    turno.ruta, _ = enrutador.ruta_chat(turno.text, turno.borr.datos_json if turno.borr else None)
+
+    ttl = timedelta(hours=getattr(settings, "CHAT_CADENA_TTL_HORAS", 24))
+    vigente = turno.prev and turno.prev_at and turno.prev_at >= timezone.now() - ttl
+    if vigente and turno.cadena_turnos < getattr(settings, "CHAT_CADENA_MAX_TURNOS", 8):
+        previos = historial.mensajes_desde(turno.conv_id, turno.prev_at)
+        if previos is not None:
+            entrada = previos + _mensaje_usuario(turno) + _contexto_borrador(turno.borr)
+            tokens = historial.tokens(entrada)
+            if turno.cadena_tokens + tokens <= getattr(settings, "CHAT_HISTORIAL_MAX_TOKENS", 1500):
+                turno.encadenado, turno.tokens_enviados, turno.sin_historial = True, tokens, False
+                return entrada, tools_for_this_turn, turno.prev
+
+    return _entrada_completa(turno), tools_for_this_turn, None
+
+
+def _cadena_invalida(e: Exception):
+    # el proveedor ya no tiene el response (expirado/borrado)
+    return isinstance(e, (openai.NotFoundError, openai.BadRequestError)) and "previous_response" in str(e)
+
+
+async def _llamar_encadenado(sitio: str, turno: _Turno, entrada, tools, prev, **extra):
+    """Primera llamada del turno. Si la cadena ya no existe, reintenta reenviando el historial."""
+    sitio = turno.sitio(sitio)
+    kwargs = {"model": enrutador.modelo(turno.ruta), "tools": tools, "deadline": turno.deadline, **extra}
+    if prev:
+        try:
+            return await llm_gateway.acrear(sitio, input=entrada, previous_response_id=prev, **kwargs)
+        except Exception as e:
+            if not _cadena_invalida(e):
+                raise
+        entrada = await sync_to_async(_entrada_completa)(turno)
+    return await llm_gateway.acrear(sitio, input=entrada, **kwargs)
+
+
+def _herramienta(turno: _Turno, nombre: str, args: dict):
+    # el borrador del turno se lee/modifica en memoria; lo demás va a _execute_tool
+    b = turno.borr
+    propio = b is not None and str(args.get("borrador_id")) == str(b.id)
+
+    if propio and nombre == "get_borrador":
+        return {"borrador_id": str(b.id), "datos": b.datos_json or {}, "listo_para_enviar": bool(b.listo_para_enviar)}
 
-        conv = ChatConversaciones.objects.filter(id=conv_id, ciudadano_id=uid).first()
-        if not conv:
-            return Response({"detail": "Conversación no existe"}, status=404)
+    if propio and nombre == "update_borrador":
+        data = turno.actualizar_borrador(args)
+        return {"updated": True, "listo_para_enviar": bool(b.listo_para_enviar), "datos": data}
 
-        now = timezone.now()
+    if propio and nombre == "finalizar_denuncia":
+        if not bool(args.get("confirmacion")):
+            return {"error": "no_confirmado"}
+        return turno.finalizar()
+
+    return _execute_tool(turno.uid, nombre, args)
+
+
+async def _ejecutar_llamadas(turno: _Turno, calls):
+    # lecturas en paralelo, escrituras en orden (ver herramientas.py)
+    resultados = await herramientas.ejecutar(calls, lambda nombre, args: _herramienta(turno, nombre, args))
+    return [
+        {
+            "type": "function_call_output",
+            "call_id": c["call_id"],
+            "output": json.dumps(result, ensure_ascii=False),
+        }
+        for c, result in zip(calls, resultados)
+    ]
+
+
+def _cerrar_turno(turno: _Turno, bot_text: str, response_id=None):
+    bot_text = (bot_text or "").strip()
+    if not bot_text:
+        bot_text = BOT_TEXT_DEFAULT
 
-        # guardar mensaje usuario
+    # ayuda extra: si ya hay borrador pero falta ubicación/evidencias, sugerimos botones
+    if turno.borr:
+        data = turno.borr.datos_json or {}
+        falta_ubic = (data.get("latitud") is None or data.get("longitud") is None)
+        if falta_ubic and "ubic" not in bot_text.lower():
+            bot_text += "\n\n📍 Por favor envía tu ubicación con el botón de Ubicación."
+        if "evidencia" not in bot_text.lower():
+            bot_text += "\n\n📷 Si tienes, adjunta una foto o video con el botón de Adjuntar."
+
+    turno.guardar(bot_text, response_id)
+
+    return {
+        "respuesta": bot_text,
+        "conversacion_id": turno.conv_id,
+        "borrador": turno.snapshot(),
+    }
+
+
+# =========================================================
+# Views (async: el turno espera al LLM sin ocupar un worker)
+# =========================================================
+# APIView de DRF no soporta handlers async: usamos View de Django y
+# reproducimos aquí la autenticación JWT (UsuariosJWTAuthentication).
+_jwt_auth = UsuariosJWTAuthentication()
+
+
+def _json(payload: dict, status: int = 200):
+    return JsonResponse(payload, status=status, json_dumps_params={"ensure_ascii": False})
+
+
+def _json_body(request):
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+async def _autenticar(request):
+    """
+    Devuelve (uid, error_response). Solo ciudadanos.
+    """
+    try:
+        r = await sync_to_async(_jwt_auth.authenticate)(request)
+    except AuthenticationFailed as e:
+        detail = e.detail if isinstance(e.detail, dict) else {"detail": str(e.detail)}
+        resp = _json(detail, status=401)
+        resp["WWW-Authenticate"] = _jwt_auth.authenticate_header(request)
+        return None, resp
+    if not r:
+        resp = _json({"detail": "Las credenciales de autenticación no se proveyeron."}, status=401)
+        resp["WWW-Authenticate"] = _jwt_auth.authenticate_header(request)
+        return None, resp
+
+    _, token = r
+    uid = token.get("uid")
+    if not uid or token.get("tipo") != "ciudadano":
+        return None, _json({"detail": "Solo ciudadanos"}, status=403)
+    return uid, None
+
+
+def _crear_conversacion(uid):
+    now = timezone.now()
+    with transaction.atomic():
+        conv = ChatConversaciones.objects.create(
+            id=uuid.uuid4(),
+            ciudadano_id=uid,
+            denuncia_id=None,
+            created_at=now,
+            updated_at=now,
+        )
         ChatMensajes.objects.create(
             id=uuid.uuid4(),
-            conversacion_id=conv_id,
-            emisor="usuario",
-            mensaje=text,
+            conversacion_id=conv.id,
+            emisor="bot",
+            mensaje="Hola 👋 ¿Qué deseas denunciar hoy? (Ej: basura, alumbrado, vías...)",
             created_at=now,
         )
+    return conv
 
-        texto_norm = text.strip().lower()
-
-        # buscar borrador (puede no existir)
-        borr = DenunciaBorradores.objects.filter(conversacion_id=conv_id, ciudadano_id=uid).first()
-
-        # extraemos campos del texto
-        extracted = _extract_fields_from_text(text)
-
-        # ✅ si NO hay borrador, solo lo creamos si hay algo útil (evita nulls)
-        if not borr and _should_create_borrador(extracted):
-            borr = _create_borrador_from_extracted(str(uid), str(conv_id), extracted)
-
-        # ✅ si ya hay borrador, actualizamos con extracción
-        if borr and extracted:
-            update_payload = {"borrador_id": str(borr.id)}
-
-            if extracted.get("tipo_texto"):
-                tipo_id = _match_tipo_to_id(extracted["tipo_texto"])
-                if tipo_id:
-                    update_payload["tipo_denuncia_id"] = tipo_id
-
-            for k in ["descripcion", "referencia", "direccion_texto", "latitud", "longitud"]:
-                if k in extracted:
-                    update_payload[k] = extracted[k]
-
-            if len(update_payload.keys()) > 1:
-                _execute_tool(str(uid), "update_borrador", update_payload)
-                borr.refresh_from_db()
-
-        # ✅ finalizar directo si listo + confirmación
-        if borr and borr.listo_para_enviar and texto_norm in CONFIRM_WORDS:
-            r = _execute_tool(str(uid), "finalizar_denuncia", {"borrador_id": str(borr.id), "confirmacion": True})
-            if r.get("ok"):
-                ChatMensajes.objects.create(
-                    id=uuid.uuid4(),
-                    conversacion_id=conv_id,
-                    emisor="bot",
-                    mensaje=f"✅ Denuncia enviada. ID: {r['denuncia_id']}",
-                    created_at=timezone.now(),
-                )
-                return Response(
-                    {
-                        "respuesta": f"✅ Denuncia enviada. ID: {r['denuncia_id']}",
-                        "conversacion_id": str(conv_id),
-                        "denuncia_id": r["denuncia_id"],
-                    },
-                    status=200,
-                )
 
-        if texto_norm in CANCEL_WORDS:
-            # No borramos nada automáticamente, solo respondemos
-            bot_text = "Está bien 🙂 Cuando quieras continuamos. Si deseas enviar, dime 'sí' o presiona Enviar."
-            ChatMensajes.objects.create(
-                id=uuid.uuid4(),
-                conversacion_id=conv_id,
-                emisor="bot",
-                mensaje=bot_text,
-                created_at=timezone.now(),
-            )
-            # snapshot
-            borr2 = DenunciaBorradores.objects.filter(conversacion_id=conv_id, ciudadano_id=uid).first()
-            datos = (borr2.datos_json if borr2 else {}) or {}
-            return Response(
-                {
-                    "respuesta": bot_text,
-                    "conversacion_id": str(conv_id),
-                    "borrador": {
-                        "id": str(borr2.id) if borr2 else None,
-                        "listo_para_enviar": bool(borr2.listo_para_enviar) if borr2 else False,
-                        "datos": datos,
-                    },
-                },
-                status=200,
-            )
+@method_decorator(csrf_exempt, name="dispatch")
+class ChatbotStartView(View):
+    async def post(self, request):
+        uid, err = await _autenticar(request)
+        if err:
+            return err
+
+        if not await Ciudadanos.objects.filter(usuario_id=uid).aexists():
+            return _json({"detail": "Perfil ciudadano no existe"}, status=400)
+
+        conv = await sync_to_async(_crear_conversacion)(uid)
+        return _json({"conversacion_id": str(conv.id)}, status=201)
+
+
+async def _validar_mensaje(request):
+    """(uid, conv_id, text, clave, err); clave identifica el mensaje para turnos.py."""
+    uid, err = await _autenticar(request)
+    if err:
+        return None, None, None, None, err
+
+    data = _json_body(request)
+    conv_id = (data.get("conversacion_id") or "").strip()
+    text = (data.get("mensaje") or "").strip()
+    if not conv_id or not text:
+        return None, None, None, None, _json({"detail": "conversacion_id y mensaje son obligatorios"}, status=400)
+    # opcional: id generado por la app, el mismo en los reintentos de ese mensaje
+    mensaje_id = str(data.get("mensaje_id") or "").strip()[:64]
+
+    # existencia + último mensaje (para distinguir un "sí" nuevo de un doble envío) en una consulta
+    ultimo = ChatMensajes.objects.filter(conversacion_id=OuterRef("pk")).order_by("-created_at").values("id")[:1]
+    try:
+        filas = [
+            f async for f in ChatConversaciones.objects.filter(id=conv_id, ciudadano_id=uid)
+            .annotate(ultimo_id=Subquery(ultimo)).values_list("ultimo_id", flat=True)
+        ]
+    except ValidationError:
+        filas = []
+    if not filas:
+        return None, None, None, None, _json({"detail": "Conversación no existe"}, status=404)
+
+    return uid, conv_id, text, turnos.clave(text, mensaje_id, filas[0]), None
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ChatbotMessageView(View):
+    async def post(self, request):
+        uid, conv_id, text, clave, err = await _validar_mensaje(request)
+        if err:
+            return err
+
+        # un turno a la vez por conversación; un doble envío recibe el mismo resultado
+        estado, dato = await turnos.esperar(conv_id, clave)
+        if estado == "coalescido":
+            return _json(dato)
+        if estado == "ocupado":
+            return _json({"detail": "Hay un mensaje en proceso, intenta de nuevo"}, status=409)
+
+        try:
+            # el estado se lee ya con el lease: incluye lo que dejó el turno anterior
+            turno = _Turno(uid, conv_id, text, clave)
+            payload = await self._turno(turno)
+        except BaseException:
+            await turnos.liberar(conv_id, dato)
+            raise
+        if turno.reintentable:
+            await turnos.liberar(conv_id, dato)
+        else:
+            await turnos.terminar(conv_id, clave, dato, payload)
+        return _json(payload)
+
+    async def _turno(self, turno: _Turno):
+        payload = await sync_to_async(_turno_previo)(turno)
+        if payload:
+            return payload
 
         # 2) LLM
-        client = _client()
-        history = _to_openai_messages(conv_id)
+        entrada, tools_for_this_turn, prev = await sync_to_async(_preparar_llm)(turno)
+        con_borrador = turno.borr is not None
+        response_id = None
+
+        try:
+            resp = await _llamar_encadenado("chatbot.turno", turno, entrada, tools_for_this_turn, prev)
+
+            for _ in range(5):
+                calls = list(_iter_function_calls(resp))
+                if not calls:
+                    break
+
+                # si no hay borrador, ignoramos cualquier llamada a tools que lo requieran
+                if not con_borrador:
+                    break
+
+                tool_outputs = await _ejecutar_llamadas(turno, calls)
+                turno.tokens_enviados += historial.tokens(tool_outputs)
+
+                resp = await llm_gateway.acrear(
+                    turno.sitio("chatbot.turno.tools"),
+                    model=enrutador.modelo(turno.ruta),
+                    tools=tools_for_this_turn,
+                    previous_response_id=resp.id,
+                    input=tool_outputs,
+                    deadline=turno.deadline,
+                )
+            bot_text = resp.output_text
+            response_id = resp.id
+            if not con_borrador and turno.sin_historial:
+                # con historial la respuesta depende de la conversación: no se comparte
+                cache_respuestas.guardar(turno.text, bot_text)
+        except LLMNoDisponible as e:
+            bot_text = _fallback(e)
+            turno.reintentable = True
 
-        # solo damos borrador_id si existe
-        if borr:
-            history.append({"role": "user", "content": f"(contexto interno: borrador_id={borr.id})"})
+        return await sync_to_async(_cerrar_turno)(turno, bot_text, response_id)
 
-        # ✅ IMPORTANTE: si no hay borrador, filtramos tools para evitar llamadas inválidas
-        tools_for_this_turn = TOOLS if borr else [t for t in TOOLS if t["name"] == "get_tipos_denuncia"]
 
-        resp = client.responses.create(
-            model=getattr(settings, "OPENAI_MODEL", "gpt-5"),
-            instructions=INSTRUCTIONS,
-            tools=tools_for_this_turn,
-            input=history,
-        )
+# =========================================================
+# Streaming (SSE)
+# =========================================================
+class _StreamIncompleto(Exception):
+    pass
+
+
+def _sse(evento: str, data: dict):
+    return f"event: {evento}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _stream_turno(turno: _Turno, salida: dict):
+    """
+    Generador SSE:
+      delta    -> {"texto": "..."}              (tokens del modelo)
+      tool     -> {"nombre": ..., "estado": "llamando" | "ok" | "error"}
+      borrador -> snapshot final del borrador
+      done     -> {"respuesta": texto completo, "conversacion_id": ...}
+    El turno se guarda al completar el stream; el payload final
+    queda en salida["payload"].
+    """
+    entrada, tools_for_this_turn, prev = await sync_to_async(_preparar_llm)(turno)
+    con_borrador = turno.borr is not None
+    partes = []
+    response_id = None
+    anterior = None       # respuesta completa de la ronda previa (pidió tools)
+    tool_outputs = None
 
-        for _ in range(5):
-            calls = list(_iter_function_calls(resp))
-            if not calls:
-                break
+    try:
+        for _ in range(6):
+            if anterior is None:
+                stream = await _llamar_encadenado(
+                    "chatbot.stream", turno, entrada, tools_for_this_turn, prev, stream=True
+                )
+            else:
+                stream = await llm_gateway.acrear(
+                    turno.sitio("chatbot.stream.tools"),
+                    model=enrutador.modelo(turno.ruta),
+                    tools=tools_for_this_turn,
+                    stream=True,
+                    input=tool_outputs,
+                    previous_response_id=anterior.id,
+                    deadline=turno.deadline,
+                )
 
+            final = None
+            async for ev in stream:
+                t = getattr(ev, "type", "")
+                if t == "response.output_text.delta":
+                    partes.append(ev.delta)
+                    yield _sse("delta", {"texto": ev.delta})
+                elif t == "response.output_item.added" and getattr(ev.item, "type", None) == "function_call":
+                    yield _sse("tool", {"nombre": ev.item.name, "estado": "llamando"})
+                elif t == "response.completed":
+                    final = ev.response
+
+            if final is None:
+                # cortado, failed o incomplete: no se encadena ni se re-ejecutan tools
+                raise _StreamIncompleto("el stream terminó sin response.completed")
+            response_id = final.id
+            calls = list(_iter_function_calls(final))
             # si no hay borrador, ignoramos cualquier llamada a tools que lo requieran
-            if not borr:
+            if not calls or not con_borrador:
                 break
 
-            tool_outputs = []
-            for c in calls:
-                name = c["name"]
-                call_id = c["call_id"]
-
-                try:
-                    args = json.loads(c["arguments"] or "{}")
-                except Exception:
-                    args = {}
-
-                result = _execute_tool(str(uid), name, args)
-
-                tool_outputs.append({
-                    "type": "function_call_output",
-                    "call_id": call_id,
-                    "output": json.dumps(result, ensure_ascii=False),
-                })
-
-            resp = client.responses.create(
-                model=getattr(settings, "OPENAI_MODEL", "gpt-5"),
-                instructions=INSTRUCTIONS,
-                tools=tools_for_this_turn,
-                previous_response_id=resp.id,
-                input=tool_outputs,
-            )
+            tool_outputs = await _ejecutar_llamadas(turno, calls)
+            turno.tokens_enviados += historial.tokens(tool_outputs)
+            anterior = final
+            for c, out in zip(calls, tool_outputs):
+                estado = "error" if '"error"' in out["output"] else "ok"
+                yield _sse("tool", {"nombre": c["name"], "estado": estado})
+    except LLMNoDisponible as e:
+        turno.reintentable = True
+        if not partes:
+            partes.append(_fallback(e))
+            yield _sse("delta", {"texto": partes[0]})
+    except Exception:
+        turno.reintentable = True
+        response_id = None
+        yield _sse("error", {"detail": "No se pudo completar la respuesta"})
 
-        bot_text = (resp.output_text or "").strip()
-        if not bot_text:
-            bot_text = "¿Me confirmas el tipo de denuncia y una breve descripción?"
+    if not con_borrador and response_id and turno.sin_historial:
+        cache_respuestas.guardar(turno.text, "".join(partes))
+    payload = await sync_to_async(_cerrar_turno)(turno, "".join(partes), response_id)
+    salida["payload"] = payload
+    yield _sse("borrador", payload["borrador"])
+    yield _sse("done", {"respuesta": payload["respuesta"], "conversacion_id": payload["conversacion_id"]})
 
-        # ayuda extra: si ya hay borrador pero falta ubicación/evidencias, sugerimos botones
-        if borr:
-            data = borr.datos_json or {}
-            falta_ubic = (data.get("latitud") is None or data.get("longitud") is None)
-            if falta_ubic and "ubic" not in bot_text.lower():
-                bot_text += "\n\n📍 Por favor envía tu ubicación con el botón de Ubicación."
-            if "evidencia" not in bot_text.lower():
-                bot_text += "\n\n📷 Si tienes, adjunta una foto o video con el botón de Adjuntar."
 
-        ChatMensajes.objects.create(
-            id=uuid.uuid4(),
-            conversacion_id=conv_id,
-            emisor="bot",
-            mensaje=bot_text,
-            created_at=timezone.now(),
-        )
+async def _evento_unico(payload: dict):
+    # turno resuelto sin LLM (confirmación / cancelación) o coalescido con otro request
+    if "borrador" in payload:
+        yield _sse("borrador", payload["borrador"])
+    yield _sse("done", payload)
 
-        # snapshot borrador
-        borr2 = DenunciaBorradores.objects.filter(conversacion_id=conv_id, ciudadano_id=uid).first()
-        datos = (borr2.datos_json if borr2 else {}) or {}
 
-        return Response(
-            {
-                "respuesta": bot_text,
-                "conversacion_id": str(conv_id),
-                "borrador": {
-                    "id": str(borr2.id) if borr2 else None,
-                    "listo_para_enviar": bool(borr2.listo_para_enviar) if borr2 else False,
-                    "datos": datos,
-                },
-            },
-            status=200,
-        )
+async def _stream_con_lease(turno: _Turno, clave: str, token):
+    """Ejecuta el turno manteniendo el lease de la conversación hasta terminar el stream."""
+    payload = None
+    try:
+        payload = await sync_to_async(_turno_previo)(turno)
+        if payload:
+            async for chunk in _evento_unico(payload):
+                yield chunk
+        else:
+            salida = {}
+            async for chunk in _stream_turno(turno, salida):
+                yield chunk
+            payload = salida.get("payload")
+    finally:
+        if payload is not None and not turno.reintentable:
+            await turnos.terminar(turno.conv_id, clave, token, payload)
+        else:
+            await turnos.liberar(turno.conv_id, token)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ChatbotMessageStreamView(View):
+    """
+    POST /api/chatbot/message/stream/   (mismo body que /message/)
+    Responde text/event-stream con los tokens a medida que llegan.
+    """
+
+    async def post(self, request):
+        uid, conv_id, text, clave, err = await _validar_mensaje(request)
+        if err:
+            return err
+
+        estado, dato = await turnos.esperar(conv_id, clave)
+        if estado == "ocupado":
+            return _json({"detail": "Hay un mensaje en proceso, intenta de nuevo"}, status=409)
+        if estado == "coalescido":
+            gen = _evento_unico(dato)
+        else:
+            gen = _stream_con_lease(_Turno(uid, conv_id, text, clave), clave, dato)
+
+        resp = StreamingHttpResponse(gen, content_type="text/event-stream; charset=utf-8")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"  # nginx: no bufferizar SSE
+        return resp
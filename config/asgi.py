@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las vistas del chatbot son async: en producción servir con
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+para que un worker atienda muchos turnos esperando al LLM a la vez.
 """
 
 import os
@@ -20,6 +20,82 @@ load_dotenv(BASE_DIR / ".env")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5")
 
+# Gateway LLM (chatbot_api/llm_gateway.py)
+LLM_TIMEOUT_SEG = float(os.getenv("LLM_TIMEOUT_SEG", "30"))
+LLM_CONNECT_TIMEOUT_SEG = float(os.getenv("LLM_CONNECT_TIMEOUT_SEG", "5"))
+LLM_DEADLINE_SEG = float(os.getenv("LLM_DEADLINE_SEG", "60"))
+LLM_REINTENTOS = int(os.getenv("LLM_REINTENTOS", "2"))
+LLM_CB_FALLOS = int(os.getenv("LLM_CB_FALLOS", "5"))
+LLM_CB_ENFRIAMIENTO_SEG = float(os.getenv("LLM_CB_ENFRIAMIENTO_SEG", "30"))
+LLM_MAX_CONEXIONES = int(os.getenv("LLM_MAX_CONEXIONES", "20"))
+# límite global de llamadas en curso (advisory locks de Postgres, ver chatbot_api/bloqueos.py)
+LLM_MAX_CONCURRENTES = int(os.getenv("LLM_MAX_CONCURRENTES", "16"))
+LLM_COLA_ESPERA_SEG = float(os.getenv("LLM_COLA_ESPERA_SEG", "2"))
+# enrutamiento de modelos por costo (chatbot_api/enrutador.py)
+LLM_MODELO_RAPIDO = os.getenv("LLM_MODELO_RAPIDO", "gpt-4o-mini")
+LLM_MODELO_COMPLETO = os.getenv("LLM_MODELO_COMPLETO", OPENAI_MODEL)
+LLM_RUTA_PALABRAS_SIMPLE = int(os.getenv("LLM_RUTA_PALABRAS_SIMPLE", "8"))
+LLM_RUTA_PALABRAS_COMPLEJO = int(os.getenv("LLM_RUTA_PALABRAS_COMPLEJO", "40"))
+LLM_RUTA_MARGEN_TIPO = float(os.getenv("LLM_RUTA_MARGEN_TIPO", "0.2"))
+LLM_RUTA_CASO_CHARS = int(os.getenv("LLM_RUTA_CASO_CHARS", "800"))
+# cliente: "openai", "falso" (grabaciones, pruebas de carga) o "grabar" (chatbot_api/llm_falso.py)
+LLM_CLIENTE = os.getenv("LLM_CLIENTE", "openai")
+LLM_FALSO_GRABACIONES = os.getenv("LLM_FALSO_GRABACIONES", str(BASE_DIR / "chatbot_api" / "grabaciones" / "llm.json"))
+# LLM_CLIENTE="grabar": las respuestas reales (con texto de ciudadanos) van aquí, fuera del repo (.gitignore)
+LLM_GRABAR_ARCHIVO = os.getenv("LLM_GRABAR_ARCHIVO", str(BASE_DIR / "grabaciones" / "llm.json"))
+LLM_FALSO_LATENCIA = os.getenv("LLM_FALSO_LATENCIA", "lognormal:800:2500")
+# registro de uso por llamada en llm_uso (chatbot_api/uso_llm.py), escrito en lotes
+LLM_USO_REGISTRAR = os.getenv("LLM_USO_REGISTRAR", "1") == "1"
+LLM_USO_LOTE = int(os.getenv("LLM_USO_LOTE", "100"))
+LLM_USO_FLUSH_SEG = float(os.getenv("LLM_USO_FLUSH_SEG", "5"))
+LLM_USO_MAX_PENDIENTES = int(os.getenv("LLM_USO_MAX_PENDIENTES", "5000"))
+# cola de trabajos en segundo plano (denuncias_api/trabajos.py). Los trabajos (respuesta automática
+# al resolver una denuncia, resúmenes) solo se ejecutan si corre al menos un proceso
+# `python manage.py trabajos_worker` aparte del servidor web (ver README).
+# - MAX_INTENTOS: intentos por trabajo; el último deja la respuesta de respaldo.
+# - BACKOFF_*: espera entre reintentos = min(BASE * 2**(intento-1), MAX) segundos.
+# - VISIBILIDAD_SEG: un trabajo en_curso más tiempo que esto se da por abandonado (worker caído) y se reencola.
+TRABAJOS_MAX_INTENTOS = int(os.getenv("TRABAJOS_MAX_INTENTOS", "5"))
+TRABAJOS_BACKOFF_BASE_SEG = float(os.getenv("TRABAJOS_BACKOFF_BASE_SEG", "5"))
+TRABAJOS_BACKOFF_MAX_SEG = float(os.getenv("TRABAJOS_BACKOFF_MAX_SEG", "300"))
+TRABAJOS_VISIBILIDAD_SEG = int(os.getenv("TRABAJOS_VISIBILIDAD_SEG", "600"))
+
+# Historial del chatbot (chatbot_api/historial.py)
+CHAT_HISTORIAL_MENSAJES = int(os.getenv("CHAT_HISTORIAL_MENSAJES", "12"))
+CHAT_HISTORIAL_MAX_TOKENS = int(os.getenv("CHAT_HISTORIAL_MAX_TOKENS", "1500"))
+CHAT_RESUMEN_CADA = int(os.getenv("CHAT_RESUMEN_CADA", "6"))
+CHAT_RESUMEN_MODELO = os.getenv("CHAT_RESUMEN_MODELO", "gpt-4o-mini")
+# caché de respuestas a preguntas generales (chatbot_api/cache_respuestas.py)
+CHAT_CACHE_TTL_SEG = int(os.getenv("CHAT_CACHE_TTL_SEG", str(6 * 3600)))
+CHAT_CACHE_UMBRAL = float(os.getenv("CHAT_CACHE_UMBRAL", "0.9"))
+CHAT_CACHE_UMBRAL_FAQ = float(os.getenv("CHAT_CACHE_UMBRAL_FAQ", "0.75"))
+# filtro local de temas ajenos (chatbot_api/tema.py): "fuera" pide varias palabras
+# ajenas o que sean buena parte del mensaje
+CHAT_TEMA_FILTRO = os.getenv("CHAT_TEMA_FILTRO", "1") == "1"
+CHAT_TEMA_MIN_FUERA = int(os.getenv("CHAT_TEMA_MIN_FUERA", "2"))
+CHAT_TEMA_PROPORCION_FUERA = float(os.getenv("CHAT_TEMA_PROPORCION_FUERA", "0.3"))
+# un turno a la vez por conversación (chatbot_api/turnos.py): advisory lock de Postgres
+# con duración máxima CHAT_TURNO_LEASE_SEG; los dobles envíos se reconocen por mensaje_id
+# (o texto + último mensaje). La respuesta queda CHAT_DEDUP_SEG en la caché (por proceso con
+# LocMemCache) y siempre en chat_mensajes.clave_turno, que cubre los envíos a otro worker
+CHAT_TURNO_LEASE_SEG = int(os.getenv("CHAT_TURNO_LEASE_SEG", "90"))
+CHAT_TURNO_ESPERA_SEG = int(os.getenv("CHAT_TURNO_ESPERA_SEG", "60"))
+CHAT_DEDUP_SEG = int(os.getenv("CHAT_DEDUP_SEG", "10"))
+# plazo total de las llamadas al LLM de un turno (menor que el lease)
+CHAT_TURNO_DEADLINE_SEG = int(os.getenv("CHAT_TURNO_DEADLINE_SEG", "75"))
+# encadenar turnos con previous_response_id mientras el último response sea reciente;
+# la cadena se reinicia tras CHAT_CADENA_MAX_TURNOS turnos o al pasar CHAT_HISTORIAL_MAX_TOKENS
+CHAT_CADENA_TTL_HORAS = int(os.getenv("CHAT_CADENA_TTL_HORAS", "24"))
+CHAT_CADENA_MAX_TURNOS = int(os.getenv("CHAT_CADENA_MAX_TURNOS", "8"))
+
+# Índice en memoria de tipos de denuncia (catalogos_api/tipos.py)
+TIPOS_INDICE_MAX_SEG = int(os.getenv("TIPOS_INDICE_MAX_SEG", "300"))
+
+# Clasificador local de tipo de denuncia (denuncias_api/clasificador.py)
+CLASIFICADOR_PATH = os.getenv("CLASIFICADOR_PATH", str(BASE_DIR / "modelos" / "clasificador_tipos.npz"))
+CLASIFICADOR_MIN_CONFIANZA = float(os.getenv("CLASIFICADOR_MIN_CONFIANZA", "0.5"))
+CLASIFICADOR_AUTO_CONFIANZA = float(os.getenv("CLASIFICADOR_AUTO_CONFIANZA", "0.85"))
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -57,6 +133,7 @@ INSTALLED_APPS = [
     "usuarios_api",
     "denuncias_api",
     "catalogos_api",
+    "chatbot_api",  # comandos de gestión (benchmark_chatbot)
     "db",
     "web",
 ]
@@ -180,6 +257,31 @@ SIMPLE_JWT = {
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# cómo se entregan los bytes de MEDIA tras autorizar en Django:
+#   python   -> Django (FileResponse / Range)         (desarrollo)
+#   nginx    -> X-Accel-Redirect a MEDIA_ACCEL_PREFIX (location internal)
+#   sendfile -> X-Sendfile (Apache mod_xsendfile)
+MEDIA_SERVE_MODE = os.getenv("MEDIA_SERVE_MODE", "python")
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+# vigencia de las URLs firmadas (?firma=) de firmas / cédulas que la app carga en <img>
+MEDIA_FIRMA_TTL_SEG = int(os.getenv("MEDIA_FIRMA_TTL_SEG", "3600"))
+
+# almacenamiento de archivos subidos: local (MEDIA_ROOT) | s3 (AWS / MinIO, subida directa prefirmada)
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "local")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # MinIO: http://localhost:9000
+S3_BUCKET = os.getenv("S3_BUCKET", "denuncias")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PRESIGN_EXPIRA_SEG = int(os.getenv("S3_PRESIGN_EXPIRA_SEG", "900"))
+SUBIDA_MAX_MB = int(os.getenv("SUBIDA_MAX_MB", "50"))
+# firmas (denuncias_api/firmas.py): copia en firma_base64 para los clientes que aún no leen
+# firma_blobs. Con 0 ya no se escribe; luego `manage.py vaciar_firmas_base64` vacía la columna
+FIRMAS_ESCRIBIR_BASE64 = os.getenv("FIRMAS_ESCRIBIR_BASE64", "1") == "1"
+
+# procesos para generar thumbnails/medium de las imágenes subidas
+DERIVADOS_WORKERS = int(os.getenv("DERIVADOS_WORKERS", "2"))
+
 # Configuración de caché para django-select2 (sin Redis)
 CACHES = {
     "default": {
@@ -15,12 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from denuncias_api.views_media import servir_media
+
 # Handlers de error personalizados
 handler403 = 'web.views.permission_denied_view'
 handler404 = 'web.views.page_not_found_view'
@@ -39,6 +41,10 @@ urlpatterns = [
 
 ]
 
-# Servir archivos estáticos y media (desarrollo y testing con DEBUG=False)
+# Servir archivos estáticos (desarrollo y testing con DEBUG=False)
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+
+# MEDIA: autorización en Django, bytes por el proxy (X-Accel-Redirect) o con Range en Python
+urlpatterns += [
+    re_path(r"^%s(?P<ruta>.+)$" % settings.MEDIA_URL.lstrip("/"), servir_media, name="media"),
+]
\ No newline at end of file
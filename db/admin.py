@@ -10,6 +10,7 @@ admin.site.register(Ciudadanos)
 admin.site.register(DenunciaBorradores)
 admin.site.register(DenunciaEvidencias)
 admin.site.register(DenunciaFirmas)
+admin.site.register(EvidenciaBlobs)
 admin.site.register(DenunciaHistorial)
 admin.site.register(DenunciaRespuestas)
 admin.site.register(Denuncias)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0003_departamentos_color_hex_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvidenciaBlobs',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('ruta', models.TextField()),
+                ('tamano_bytes', models.BigIntegerField()),
+                ('content_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'evidencia_blobs',
+                'managed': True,
+            },
+        ),
+    ]
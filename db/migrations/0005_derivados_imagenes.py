@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0004_evidenciablobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ciudadanos',
+            name='foto_perfil_thumb_url',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='denunciaevidencias',
+            name='url_medium',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='denunciaevidencias',
+            name='url_thumb',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidenciablobs',
+            name='ruta_medium',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidenciablobs',
+            name='ruta_thumb',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0005_derivados_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FirmaBlobs',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('contenido', models.BinaryField()),
+                ('content_type', models.CharField(default='image/png', max_length=50)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'firma_blobs',
+                'managed': True,
+            },
+        ),
+        migrations.AddField(
+            model_name='ciudadanos',
+            name='firma_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='db.firmablobs'),
+        ),
+        migrations.AddField(
+            model_name='denunciafirmas',
+            name='firma_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='db.firmablobs'),
+        ),
+    ]
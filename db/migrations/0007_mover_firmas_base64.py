@@ -0,0 +1,73 @@
+import base64
+import binascii
+import hashlib
+
+from django.db import migrations
+from django.utils import timezone
+
+BATCH = 200
+
+
+def _decodificar(valor):
+    content_type = "image/png"
+    valor = (valor or "").strip()
+    if valor.startswith("data:") and "," in valor:
+        cabecera, valor = valor.split(",", 1)
+        content_type = cabecera[5:].split(";", 1)[0] or content_type
+    try:
+        return base64.b64decode(valor), content_type
+    except (binascii.Error, ValueError):
+        return None, None
+
+
+def _mover(model, FirmaBlobs):
+    # por lotes y por pk: cada lote es una transacción corta (migración no atómica)
+    ultimo = None
+    while True:
+        qs = model.objects.filter(firma_base64__isnull=False, firma_blob__isnull=True).order_by("pk")
+        if ultimo is not None:
+            qs = qs.filter(pk__gt=ultimo)
+        lote = list(qs.values_list("pk", "firma_base64")[:BATCH])
+        if not lote:
+            return
+        for pk, valor in lote:
+            contenido, content_type = _decodificar(valor)
+            if not contenido:
+                continue
+            sha = hashlib.sha256(contenido).hexdigest()
+            FirmaBlobs.objects.get_or_create(
+                sha256=sha,
+                defaults={"contenido": contenido, "content_type": content_type, "created_at": timezone.now()},
+            )
+            # firma_base64 se conserva: otros clientes de la BD todavía lo leen
+            model.objects.filter(pk=pk).update(firma_blob_id=sha)
+        ultimo = lote[-1][0]
+
+
+def mover_firmas(apps, schema_editor):
+    FirmaBlobs = apps.get_model("db", "FirmaBlobs")
+    _mover(apps.get_model("db", "Ciudadanos"), FirmaBlobs)
+    _mover(apps.get_model("db", "DenunciaFirmas"), FirmaBlobs)
+
+
+def restaurar_firmas(apps, schema_editor):
+    FirmaBlobs = apps.get_model("db", "FirmaBlobs")
+    for nombre in ("Ciudadanos", "DenunciaFirmas"):
+        model = apps.get_model("db", nombre)
+        for pk, sha in model.objects.filter(firma_blob__isnull=False).values_list("pk", "firma_blob_id").iterator():
+            blob = FirmaBlobs.objects.get(sha256=sha)
+            valor = f"data:{blob.content_type};base64," + base64.b64encode(bytes(blob.contenido)).decode("ascii")
+            model.objects.filter(pk=pk).update(firma_base64=valor, firma_blob_id=None)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('db', '0006_firma_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(mover_firmas, restaurar_firmas),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0007_mover_firmas_base64'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmensajes',
+            index=models.Index(fields=['conversacion', '-created_at'], name='chat_mensajes_conv_fecha_idx'),
+        ),
+    ]
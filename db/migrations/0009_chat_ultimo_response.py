@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0008_chat_mensajes_conv_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversaciones',
+            name='ultimo_response_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatconversaciones',
+            name='ultimo_response_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
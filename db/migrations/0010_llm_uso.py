@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0009_chat_ultimo_response'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LlmUso',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('sitio', models.CharField(max_length=100)),
+                ('modelo', models.CharField(blank=True, max_length=100, null=True)),
+                ('tokens_entrada', models.IntegerField(default=0)),
+                ('tokens_cacheados', models.IntegerField(default=0)),
+                ('tokens_salida', models.IntegerField(default=0)),
+                ('latencia_ms', models.IntegerField(default=0)),
+                ('resultado', models.CharField(max_length=20)),
+                ('reintentos', models.SmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'llm_uso',
+                'managed': True,
+                'indexes': [models.Index(fields=['created_at', 'sitio'], name='llm_uso_fecha_sitio_idx')],
+            },
+        ),
+    ]
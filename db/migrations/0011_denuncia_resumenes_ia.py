@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0010_llm_uso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DenunciaResumenesIa',
+            fields=[
+                ('denuncia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='db.denuncias')),
+                ('hash_contenido', models.CharField(max_length=64)),
+                ('resumen', models.TextField()),
+                ('sugerencias_accion', models.TextField()),
+                ('modelo', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'denuncia_resumenes_ia',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0011_denuncia_resumenes_ia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajos',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=50)),
+                ('clave', models.CharField(blank=True, max_length=150, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('estado', models.CharField(default='pendiente', max_length=20)),
+                ('intentos', models.SmallIntegerField(default=0)),
+                ('max_intentos', models.SmallIntegerField(default=5)),
+                ('disponible_en', models.DateTimeField()),
+                ('tomado_en', models.DateTimeField(blank=True, null=True)),
+                ('tomado_por', models.CharField(blank=True, max_length=100, null=True)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'trabajos',
+                'managed': True,
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='trabajos_estado_disp_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'en_curso'])), fields=('clave',), name='trabajos_clave_activa_uniq')],
+            },
+        ),
+    ]
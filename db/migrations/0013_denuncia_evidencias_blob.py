@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:37
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH = 500
+
+# .../cas/ab/cd/<sha256><ext>
+_re_cas = re.compile(r"cas/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})")
+
+
+def enlazar_blobs(apps, schema_editor):
+    DenunciaEvidencias = apps.get_model("db", "DenunciaEvidencias")
+    EvidenciaBlobs = apps.get_model("db", "EvidenciaBlobs")
+    ultimo = None
+    while True:
+        qs = DenunciaEvidencias.objects.filter(blob__isnull=True, url_archivo__contains="cas/").order_by("pk")
+        if ultimo is not None:
+            qs = qs.filter(pk__gt=ultimo)
+        lote = list(qs.values_list("pk", "url_archivo")[:BATCH])
+        if not lote:
+            return
+        shas = {pk: m.group(1) for pk, url in lote if (m := _re_cas.search(url or ""))}
+        existentes = set(EvidenciaBlobs.objects.filter(sha256__in=set(shas.values())).values_list("sha256", flat=True))
+        for pk, sha in shas.items():
+            if sha in existentes:
+                DenunciaEvidencias.objects.filter(pk=pk).update(blob_id=sha)
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0012_trabajos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denunciaevidencias',
+            name='blob',
+            field=models.ForeignKey(blank=True, db_column='blob_sha256', null=True, on_delete=django.db.models.deletion.SET_NULL, to='db.evidenciablobs'),
+        ),
+        migrations.RunPython(enlazar_blobs, migrations.RunPython.noop),
+    ]
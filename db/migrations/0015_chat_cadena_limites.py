@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0013_denuncia_evidencias_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversaciones',
+            name='cadena_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatconversaciones',
+            name='cadena_turnos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
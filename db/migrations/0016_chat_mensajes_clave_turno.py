@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0015_chat_cadena_limites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmensajes',
+            name='clave_turno',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
@@ -31,6 +31,12 @@ class ChatConversaciones(models.Model):
     id = models.UUIDField(primary_key=True)
     ciudadano = models.ForeignKey('Ciudadanos', models.DO_NOTHING)
     denuncia = models.ForeignKey('Denuncias', models.DO_NOTHING, db_column='denuncia_id', to_field='id', blank=True, null=True)
+    # último response del LLM: el siguiente turno se encadena con previous_response_id
+    ultimo_response_id = models.CharField(max_length=100, blank=True, null=True)
+    ultimo_response_at = models.DateTimeField(blank=True, null=True)
+    # turnos y tokens estimados acumulados en esa cadena (se reinicia al pasar los límites)
+    cadena_turnos = models.PositiveIntegerField(default=0)
+    cadena_tokens = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
@@ -47,11 +53,17 @@ class ChatMensajes(models.Model):
     conversacion = models.ForeignKey(ChatConversaciones, models.DO_NOTHING)
     emisor = models.CharField(max_length=10)
     mensaje = models.TextField()
+    # solo mensajes del bot: huella del mensaje del ciudadano que responden (chatbot_api/turnos.py)
+    clave_turno = models.CharField(max_length=40, blank=True, null=True)
     created_at = models.DateTimeField()
 
     class Meta:
         managed = True
         db_table = 'chat_mensajes'
+        indexes = [
+            # ventana de historial del chatbot: últimos N mensajes de una conversación
+            models.Index(fields=['conversacion', '-created_at'], name='chat_mensajes_conv_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Mensaje {self.emisor}: {self.mensaje[:50]}... - {self.created_at}"
@@ -74,6 +86,26 @@ class CiudadanoDocumentos(models.Model):
         return f"Documento {self.tipo_documento}: {self.ciudadano.nombres} {self.ciudadano.apellidos}"
 
 
+class FirmaBlobs(models.Model):
+    sha256 = models.CharField(primary_key=True, max_length=64)
+    contenido = models.BinaryField()
+    content_type = models.CharField(max_length=50, default='image/png')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'firma_blobs'
+
+    def __str__(self):
+        return f"Firma {self.sha256[:12]}... ({self.content_type})"
+
+
+class SinFirmaBase64Manager(models.Manager):
+    # firma_base64 es un blob sin límite: no lo traemos salvo que se pida
+    def get_queryset(self):
+        return super().get_queryset().defer('firma_base64')
+
+
 class Ciudadanos(models.Model):
     usuario = models.OneToOneField('Usuarios', models.DO_NOTHING, primary_key=True)
     cedula = models.CharField(unique=True, max_length=15)
@@ -82,11 +114,15 @@ class Ciudadanos(models.Model):
     telefono = models.CharField(max_length=20, blank=True, null=True)
     fecha_nacimiento = models.DateField(blank=True, null=True)
     foto_perfil_url = models.TextField(blank=True, null=True)
+    foto_perfil_thumb_url = models.TextField(blank=True, null=True)
     firma_url = models.TextField(blank=True, null=True)
     firma_base64 = models.TextField(blank=True, null=True)
+    firma_blob = models.ForeignKey(FirmaBlobs, models.DO_NOTHING, blank=True, null=True)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
+    objects = SinFirmaBase64Manager()
+
     class Meta:
         managed = True
         db_table = 'ciudadanos'
@@ -132,7 +168,10 @@ class DenunciaEvidencias(models.Model):
     denuncia = models.ForeignKey('Denuncias', models.DO_NOTHING, db_column='denuncia_id', to_field='id')
     tipo = models.TextField()  # This field type is a guess.
     url_archivo = models.TextField()
+    url_thumb = models.TextField(blank=True, null=True)
+    url_medium = models.TextField(blank=True, null=True)
     nombre_archivo = models.TextField(blank=True, null=True)
+    blob = models.ForeignKey('EvidenciaBlobs', models.SET_NULL, db_column='blob_sha256', blank=True, null=True)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
@@ -144,14 +183,36 @@ class DenunciaEvidencias(models.Model):
         return f"Evidencia {self.tipo}: {self.nombre_archivo or 'Sin nombre'} - Denuncia {self.denuncia.id}"
 
 
+class EvidenciaBlobs(models.Model):
+    sha256 = models.CharField(primary_key=True, max_length=64)
+    ruta = models.TextField()
+    tamano_bytes = models.BigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True, null=True)
+    ruta_thumb = models.TextField(blank=True, null=True)
+    ruta_medium = models.TextField(blank=True, null=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'evidencia_blobs'
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]}... - {self.ref_count} ref(s)"
+
+
 class DenunciaFirmas(models.Model):
     id = models.UUIDField(primary_key=True)
     denuncia = models.OneToOneField('Denuncias', models.DO_NOTHING, db_column='denuncia_id', to_field='id')
     firma_url = models.TextField(blank=True, null=True)
     firma_base64 = models.TextField(blank=True, null=True)
+    firma_blob = models.ForeignKey(FirmaBlobs, models.DO_NOTHING, blank=True, null=True)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
+    objects = SinFirmaBase64Manager()
+
     class Meta:
         managed = True
         db_table = 'denuncia_firmas'
@@ -177,6 +238,24 @@ class DenunciaHistorial(models.Model):
         return f"Historial: {self.estado_anterior} -> {self.estado_nuevo} - Denuncia {self.denuncia.id}"
 
 
+class DenunciaResumenesIa(models.Model):
+    # resumen/sugerencias del panel; se regenera solo si cambia hash_contenido
+    denuncia = models.OneToOneField('Denuncias', models.CASCADE, primary_key=True)
+    hash_contenido = models.CharField(max_length=64)
+    resumen = models.TextField()
+    sugerencias_accion = models.TextField()
+    modelo = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'denuncia_resumenes_ia'
+
+    def __str__(self):
+        return f"Resumen IA Denuncia {self.denuncia_id} ({self.hash_contenido[:12]}...)"
+
+
 class DenunciaRespuestas(models.Model):
     id = models.UUIDField(primary_key=True)
     denuncia = models.ForeignKey('Denuncias', models.DO_NOTHING, db_column='denuncia_id', to_field='id')
@@ -288,6 +367,30 @@ class Funcionarios(models.Model):
         return f"{self.nombres} {self.apellidos} - {self.cargo or 'Sin cargo'}"
 
 
+class LlmUso(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    sitio = models.CharField(max_length=100)
+    modelo = models.CharField(max_length=100, blank=True, null=True)
+    tokens_entrada = models.IntegerField(default=0)
+    tokens_cacheados = models.IntegerField(default=0)
+    tokens_salida = models.IntegerField(default=0)
+    latencia_ms = models.IntegerField(default=0)
+    resultado = models.CharField(max_length=20)  # ok | error | fallback | saturado
+    reintentos = models.SmallIntegerField(default=0)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'llm_uso'
+        indexes = [
+            # panel de uso: agregados diarios por sitio
+            models.Index(fields=['created_at', 'sitio'], name='llm_uso_fecha_sitio_idx'),
+        ]
+
+    def __str__(self):
+        return f"LLM {self.sitio} ({self.resultado}) - {self.created_at}"
+
+
 class Notificaciones(models.Model):
     id = models.BigAutoField(primary_key=True)
     usuario = models.ForeignKey('Usuarios', models.DO_NOTHING)
@@ -338,6 +441,43 @@ class Roles(models.Model):
         return f"Rol: {self.nombre}"
 
 
+class Trabajos(models.Model):
+    # cola de trabajos en segundo plano (denuncias_api/trabajos.py)
+    id = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=50)
+    clave = models.CharField(max_length=150, blank=True, null=True)
+    payload = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, default='pendiente')  # pendiente | en_curso | hecho | fallido
+    intentos = models.SmallIntegerField(default=0)
+    max_intentos = models.SmallIntegerField(default=5)
+    disponible_en = models.DateTimeField()
+    tomado_en = models.DateTimeField(blank=True, null=True)
+    tomado_por = models.CharField(max_length=100, blank=True, null=True)
+    resultado = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'trabajos'
+        indexes = [
+            # los workers toman los pendientes ya disponibles, en orden
+            models.Index(fields=['estado', 'disponible_en'], name='trabajos_estado_disp_idx'),
+        ]
+        constraints = [
+            # un solo trabajo activo por clave (p. ej. "resumen_ia:denuncia:12")
+            models.UniqueConstraint(
+                fields=['clave'],
+                condition=models.Q(estado__in=['pendiente', 'en_curso']),
+                name='trabajos_clave_activa_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id} {self.tipo} ({self.estado}, intento {self.intentos})"
+
+
 class TipoDenunciaDepartamento(models.Model):
     tipo_denuncia = models.OneToOneField('TiposDenuncia', models.DO_NOTHING, primary_key=True)
     departamento = models.ForeignKey(Departamentos, models.DO_NOTHING)
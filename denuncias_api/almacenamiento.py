@@ -0,0 +1,164 @@
+import base64
+import os
+import shutil
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+
+# =========================
+# Backends de almacenamiento (local / S3 compatible: AWS, MinIO)
+# =========================
+# Todo lo que lee, escribe o borra archivos subidos (evidencias, firmas,
+# cédulas, derivados) pasa por get_backend(); nadie usa default_storage directo.
+_SALT_SUBIDA = "denuncias_api.subida_local"
+
+
+def _expira():
+    return settings.S3_PRESIGN_EXPIRA_SEG
+
+
+class AlmacenamientoLocal:
+    """
+    MEDIA_ROOT en disco. La subida directa es un PUT a una URL firmada que
+    atiende Django (views_subidas.subida_local), con el mismo contrato que el
+    PUT prefirmado de S3.
+    """
+
+    def url_subida(self, key, content_type, sha256=None):
+        token = signing.dumps({"key": key, "ct": content_type, "sha": sha256}, salt=_SALT_SUBIDA, compress=True)
+        return reverse("subida_local", args=[token]), {"Content-Type": content_type}
+
+    def existe(self, key):
+        return default_storage.exists(key)
+
+    def guardar(self, key, archivo, content_type=None):
+        """Escribe el archivo en key y devuelve la key final."""
+        return default_storage.save(key, archivo)
+
+    def borrar(self, key):
+        if default_storage.exists(key):
+            default_storage.delete(key)
+
+    def info(self, key):
+        if not default_storage.exists(key):
+            return None
+        return {"tamano": default_storage.size(key), "content_type": None}
+
+    def ruta_local(self, key):
+        return default_storage.path(key)
+
+    def descargar(self, key, destino):
+        with default_storage.open(key, "rb") as src, open(destino, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+    def url_descarga(self, key):
+        return None
+
+
+class AlmacenamientoS3:
+    """
+    Bucket S3 compatible. Con MinIO basta S3_ENDPOINT_URL=http://minio:9000.
+    La app sube directo con un PUT prefirmado; Django solo registra metadatos.
+    """
+
+    def __init__(self):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY or None,
+            aws_secret_access_key=settings.S3_SECRET_KEY or None,
+            region_name=settings.S3_REGION,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def url_subida(self, key, content_type, sha256=None):
+        """
+        Devuelve (url, headers) para el PUT. Si viene sha256, S3 rechaza
+        el PUT cuando el contenido no coincide con el hash declarado.
+        """
+        params = {"Bucket": self.bucket, "Key": key, "ContentType": content_type}
+        headers = {"Content-Type": content_type}
+        if sha256:
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+            params["ChecksumSHA256"] = checksum
+            headers["x-amz-checksum-sha256"] = checksum
+        url = self.client.generate_presigned_url("put_object", Params=params, ExpiresIn=_expira())
+        return url, headers
+
+    def existe(self, key):
+        return self.info(key) is not None
+
+    def guardar(self, key, archivo, content_type=None):
+        # como Storage.save: no se pisa un objeto existente (p. ej. dos "image.jpg" en registros/)
+        base, ext = os.path.splitext(key)
+        while self.existe(key):
+            key = f"{base}_{get_random_string(7)}{ext}"
+        content_type = content_type or getattr(archivo, "content_type", None)
+        archivo.seek(0)
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(archivo, self.bucket, key, ExtraArgs=extra)
+        return key
+
+    def borrar(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def info(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            h = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return None
+        return {"tamano": h.get("ContentLength") or 0, "content_type": h.get("ContentType")}
+
+    def ruta_local(self, key):
+        return None
+
+    def descargar(self, key, destino):
+        self.client.download_file(self.bucket, key, destino)
+
+    def url_descarga(self, key):
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=_expira()
+        )
+
+
+_BACKENDS = {
+    "local": AlmacenamientoLocal,
+    "s3": AlmacenamientoS3,
+}
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = _BACKENDS[getattr(settings, "MEDIA_BACKEND", "local")]()
+    return _backend
+
+
+def reiniciar_backend():
+    """Olvida el backend elegido (tests / cambio de MEDIA_BACKEND en caliente)."""
+    global _backend
+    _backend = None
+
+
+def leer_token_subida(token: str):
+    """Datos firmados por AlmacenamientoLocal.url_subida, o None si es inválido o venció."""
+    try:
+        return signing.loads(token, salt=_SALT_SUBIDA, max_age=_expira())
+    except signing.BadSignature:
+        return None
+
+
+def key_subida(folder: str, nombre: str, uid_archivo: str):
+    ext = os.path.splitext(nombre or "")[1].lower()[:10]
+    return f"{folder}{uid_archivo}{ext}"
@@ -0,0 +1,249 @@
+"""
+Clasificador local descripcion -> tipo_denuncia_id (solo NumPy).
+
+- Features: n-gramas hasheados (palabras, bigramas y 4-gramas de caracteres)
+  con tf sublineal, IDF y normalización L2.
+- Modelo: regresión logística multinomial entrenada con minibatches.
+- Se entrena con `manage.py entrenar_clasificador` y se evalúa con
+  `manage.py benchmark_clasificador`; el modelo se carga una vez por proceso
+  (y se recarga si cambia el archivo).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from django.conf import settings
+
+from catalogos_api.tipos import normalizar, tipos_activos
+
+logger = logging.getLogger(__name__)
+
+DIM = 2 ** 16
+MIN_PALABRAS = 3
+HOLDOUT_MOD = 10  # 1 de cada 10 denuncias (por id) queda fuera del entrenamiento
+
+
+def _path():
+    return str(getattr(settings, "CLASIFICADOR_PATH", os.path.join(settings.BASE_DIR, "modelos", "clasificador_tipos.npz")))
+
+
+def es_holdout(denuncia_id):
+    return zlib.crc32(str(denuncia_id).encode()) % HOLDOUT_MOD == 0
+
+
+# =========================================================
+# Features
+# =========================================================
+def _h(s: str):
+    return zlib.crc32(s.encode()) % DIM
+
+
+def features(texto: str):
+    """Devuelve (indices, conteos) de los n-gramas hasheados del texto."""
+    palabras = normalizar(texto).split()
+    grams = list(palabras)
+    grams += [f"{a}_{b}" for a, b in zip(palabras, palabras[1:])]
+    for p in palabras:
+        p = f"#{p}#"
+        grams += [f"c:{p[i:i + 4]}" for i in range(max(1, len(p) - 3))]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    idx, cnt = np.unique(np.fromiter((_h(g) for g in grams), dtype=np.int64, count=len(grams)), return_counts=True)
+    return idx, cnt.astype(np.float32)
+
+
+def vectorizar(idx, cnt, idf):
+    """Pesos tf sublineal * IDF normalizados (L2) para los índices de features()."""
+    v = (1.0 + np.log(cnt)) * idf[idx]
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+
+def _lote(filas, idf):
+    """filas: [(idx, cnt)] -> (indices concatenados, valores, offsets, id de fila por feature)."""
+    idxs, vals, fila = [], [], []
+    for i, (idx, cnt) in enumerate(filas):
+        idxs.append(idx)
+        vals.append(vectorizar(idx, cnt, idf))
+        fila.append(np.full(len(idx), i, dtype=np.int64))
+    return np.concatenate(idxs), np.concatenate(vals).astype(np.float32), np.concatenate(fila)
+
+
+def _logits(W, b, idx, val, fila, n):
+    # W: (DIM, C); suma dispersa por fila
+    out = np.zeros((n, W.shape[1]), dtype=np.float32)
+    np.add.at(out, fila, W[idx] * val[:, None])
+    return out + b
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+# =========================================================
+# Entrenamiento
+# =========================================================
+def entrenar(textos, etiquetas, epocas=15, lr=0.5, l2=1e-5, lote=128, semilla=0):
+    """
+    textos: lista de str; etiquetas: lista de tipo_denuncia_id.
+    Devuelve el dict del modelo (ver guardar()).
+    """
+    clases = np.array(sorted(set(int(e) for e in etiquetas)), dtype=np.int64)
+    pos = {int(c): i for i, c in enumerate(clases)}
+    y = np.array([pos[int(e)] for e in etiquetas], dtype=np.int64)
+    filas = [features(t) for t in textos]
+
+    # IDF suavizado
+    df = np.zeros(DIM, dtype=np.float32)
+    for idx, _ in filas:
+        df[idx] += 1
+    idf = (np.log((1 + len(filas)) / (1 + df)) + 1).astype(np.float32)
+
+    W = np.zeros((DIM, len(clases)), dtype=np.float32)
+    b = np.zeros(len(clases), dtype=np.float32)
+    G = np.zeros_like(W)  # AdaGrad
+    Gb = np.zeros_like(b)
+    rng = np.random.default_rng(semilla)
+
+    for _ in range(epocas):
+        orden = rng.permutation(len(filas))
+        for ini in range(0, len(orden), lote):
+            sel = orden[ini:ini + lote]
+            idx, val, fila = _lote([filas[i] for i in sel], idf)
+            P = _softmax(_logits(W, b, idx, val, fila, len(sel)))
+            P[np.arange(len(sel)), y[sel]] -= 1.0
+            P /= len(sel)
+
+            gW = np.zeros_like(W)
+            np.add.at(gW, idx, P[fila] * val[:, None])
+            tocadas = np.unique(idx)
+            gW[tocadas] += l2 * W[tocadas]
+            gb = P.sum(axis=0)
+
+            G[tocadas] += gW[tocadas] ** 2
+            W[tocadas] -= lr * gW[tocadas] / (np.sqrt(G[tocadas]) + 1e-8)
+            Gb += gb ** 2
+            b -= lr * gb / (np.sqrt(Gb) + 1e-8)
+
+    return {"W": W, "b": b, "idf": idf, "clases": clases}
+
+
+def guardar(modelo: dict, meta: dict, path=None):
+    path = path or _path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp, W=modelo["W"], b=modelo["b"], idf=modelo["idf"], clases=modelo["clases"],
+        meta=np.array(json.dumps(meta, default=str)),
+    )
+    os.replace(tmp, path)
+
+
+# =========================================================
+# Predicción
+# =========================================================
+class Clasificador:
+    """Predicción con un modelo de entrenar(); el mismo camino sirve en producción y en la evaluación."""
+
+    def __init__(self, modelo: dict, meta=None, mtime=None):
+        self.W = modelo["W"]
+        self.b = modelo["b"]
+        self.idf = modelo["idf"]
+        self.clases = modelo["clases"]
+        self.meta = meta or {}
+        self.mtime = mtime
+
+    @classmethod
+    def cargar(cls, path):
+        with np.load(path) as z:
+            modelo = {k: z[k] for k in ("W", "b", "idf", "clases")}
+            meta = json.loads(str(z["meta"]))
+        return cls(modelo, meta, os.path.getmtime(path))
+
+    def probabilidades(self, texto: str):
+        idx, cnt = features(texto)
+        if not len(idx):
+            return None
+        v = vectorizar(idx, cnt, self.idf)
+        return _softmax(((self.W[idx] * v[:, None]).sum(axis=0) + self.b)[None, :])[0]
+
+    def top(self, texto: str, k=3):
+        p = self.probabilidades(texto)
+        if p is None:
+            return []
+        orden = np.argsort(-p)[:k]
+        return [(int(self.clases[i]), float(p[i])) for i in orden]
+
+
+def evaluar(clf: Clasificador, muestras, k=3):
+    """
+    muestras: [(descripcion, tipo_denuncia_id)].
+    Devuelve {"muestras", "top1", "topk", "ms"} con la latencia de cada predicción.
+    """
+    top1 = topk = 0
+    ms = []
+    for texto, tipo in muestras:
+        t0 = time.perf_counter()
+        ids = [t for t, _ in clf.top(texto, k=k)]
+        ms.append((time.perf_counter() - t0) * 1000)
+        top1 += int(bool(ids) and ids[0] == tipo)
+        topk += int(tipo in ids)
+    n = len(muestras) or 1
+    return {"muestras": len(muestras), "top1": top1 / n, "topk": topk / n, "ms": np.array(ms)}
+
+
+_modelo = None
+_modelo_revisado = 0.0
+_lock = threading.Lock()
+
+
+def get_clasificador():
+    """Modelo cargado una vez por proceso; None si aún no se entrenó."""
+    global _modelo, _modelo_revisado
+    ahora = time.monotonic()
+    if _modelo is not None and ahora - _modelo_revisado < 60:
+        return _modelo
+    with _lock:
+        _modelo_revisado = ahora
+        path = _path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            _modelo = None
+            return None
+        if _modelo is None or _modelo.mtime != mtime:
+            try:
+                _modelo = Clasificador.cargar(path)
+            except Exception:
+                logger.exception("No se pudo cargar el clasificador %s", path)
+                _modelo = None
+        return _modelo
+
+
+def sugerir_tipo(texto: str, minimo=None):
+    """
+    {"tipo_denuncia_id": id, "confianza": p} o None si no hay modelo,
+    el texto es muy corto o la confianza no llega a `minimo`.
+    Solo sugiere tipos activos: si el modelo (entrenado antes de desactivar
+    un tipo) prefiere uno retirado, pasa a la siguiente clase.
+    """
+    if len(normalizar(texto).split()) < MIN_PALABRAS:
+        return None
+    clf = get_clasificador()
+    if clf is None:
+        return None
+    activos = {t["id"] for t in tipos_activos()}
+    top = [(tid, p) for tid, p in clf.top(texto, k=len(clf.clases)) if tid in activos]
+    if not top:
+        return None
+    tid, p = top[0]
+    if p < (minimo if minimo is not None else getattr(settings, "CLASIFICADOR_MIN_CONFIANZA", 0.5)):
+        return None
+    return {"tipo_denuncia_id": tid, "confianza": round(p, 3)}
@@ -0,0 +1,164 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections
+from django.utils import timezone
+
+from db.models import Ciudadanos, DenunciaEvidencias, EvidenciaBlobs
+
+from .almacenamiento import get_backend
+from .imagenes import RENDICIONES, generar_rendiciones
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Pool de procesos para derivados (thumbnail / medium)
+# =========================
+_pool = None
+_hilos = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no heredamos conexiones a BD ni hilos del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "DERIVADOS_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _get_hilos():
+    # E/S con el backend remoto (bajar original / subir derivados); el CPU queda en _pool
+    global _hilos
+    with _pool_lock:
+        if _hilos is None:
+            _hilos = ThreadPoolExecutor(
+                max_workers=getattr(settings, "DERIVADOS_WORKERS", 2), thread_name_prefix="derivados"
+            )
+        return _hilos
+
+
+def es_imagen(content_type: str, nombre: str = ""):
+    ct = (content_type or "").lower()
+    if ct.startswith("image/"):
+        return True
+    return os.path.splitext(nombre or "")[1].lower() in (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+
+def url_media(ruta: str):
+    return (settings.MEDIA_URL + ruta) if ruta else None
+
+
+def generar(ruta: str, sha: str = None):
+    """
+    Lanza la generación de derivados de <ruta> y devuelve el future (resultado de generar_rendiciones).
+    Backend local: el pool lee y escribe en MEDIA_ROOT. Backend remoto (S3): un hilo baja
+    el original a un temporal, el pool genera ahí y el hilo sube los derivados.
+    """
+    origen = get_backend().ruta_local(ruta)
+    if origen:
+        return _get_pool().submit(generar_rendiciones, origen, str(settings.MEDIA_ROOT), sha)
+    return _get_hilos().submit(_generar_remoto, ruta, sha)
+
+
+def _generar_remoto(ruta: str, sha: str = None):
+    backend = get_backend()
+    with tempfile.TemporaryDirectory(prefix="derivados_") as tmp:
+        origen = os.path.join(tmp, "origen" + os.path.splitext(ruta)[1])
+        backend.descargar(ruta, origen)
+        res = _get_pool().submit(generar_rendiciones, origen, tmp, sha).result()
+        for nombre in RENDICIONES:
+            if backend.existe(res[nombre]):
+                continue
+            with open(os.path.join(tmp, res[nombre]), "rb") as f:
+                backend.guardar(res[nombre], File(f, name=res[nombre]), content_type="image/jpeg")
+    return res
+
+
+def encolar_derivados(ruta: str, destino: tuple):
+    """
+    Encola la generación de derivados de <ruta> (en el backend de almacenamiento).
+    destino: ("blob", sha256) | ("perfil", usuario_id)
+    """
+    # de un blob ya conocemos el hash: no se vuelve a leer el archivo para calcularlo
+    sha = destino[1] if destino[0] == "blob" else None
+    try:
+        fut = generar(ruta, sha)
+    except Exception:
+        logger.exception("No se pudo encolar derivados de %s", ruta)
+        return None
+    fut.add_done_callback(lambda f: _registrar(destino, f))
+    return fut
+
+
+def derivados_evidencia(blob: EvidenciaBlobs):
+    """
+    {"url_thumb", "url_medium"} (relativas) de una evidencia imagen si ya existen;
+    si faltan se encolan y se devuelve {} (los completa registrar_derivados).
+    """
+    if not es_imagen(blob.content_type, blob.ruta):
+        return {}
+    if blob.ruta_thumb:
+        return {"url_thumb": url_media(blob.ruta_thumb), "url_medium": url_media(blob.ruta_medium)}
+    encolar_derivados(blob.ruta, ("blob", blob.sha256))
+    return {}
+
+
+def _registrar(destino: tuple, fut):
+    # corre en el hilo del pool, fuera del request: manejamos la conexión a mano
+    close_old_connections()
+    try:
+        res = fut.result()
+    except Exception:
+        logger.exception("Fallo generando derivados para %s", destino)
+        return
+    try:
+        registrar_derivados(destino, res)
+    except Exception:
+        logger.exception("Fallo registrando derivados para %s", destino)
+    finally:
+        close_old_connections()
+
+
+def registrar_derivados(destino: tuple, res: dict):
+    now = timezone.now()
+    tipo, key = destino
+
+    if tipo == "blob":
+        if not EvidenciaBlobs.objects.filter(sha256=key).update(
+            ruta_thumb=res["thumb"], ruta_medium=res["medium"], updated_at=now
+        ):
+            return
+        # si el borrador ya se finalizó antes de terminar, completamos las evidencias
+        DenunciaEvidencias.objects.filter(blob_id=key, url_thumb__isnull=True).update(
+            url_thumb=url_media(res["thumb"]), url_medium=url_media(res["medium"]), updated_at=now
+        )
+        return
+
+    if tipo == "perfil":
+        Ciudadanos.objects.filter(usuario_id=key).update(
+            foto_perfil_thumb_url=url_media(res["thumb"]), updated_at=now
+        )
+
+
+def derivados_de_blob(sha: str):
+    """
+    Devuelve {"url_thumb": ..., "url_medium": ...} (relativas) si ya existen.
+    """
+    if not sha:
+        return {}
+    blob = EvidenciaBlobs.objects.filter(sha256=sha).only("ruta_thumb", "ruta_medium").first()
+    if not blob or not blob.ruta_thumb:
+        return {}
+    return {"url_thumb": url_media(blob.ruta_thumb), "url_medium": url_media(blob.ruta_medium)}
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from db.models import FirmaBlobs
+
+
+# =========================
+# Firmas en tabla aparte (bytea), fuera de las filas calientes
+# =========================
+# Aquí se lee primero firma_blobs. firma_base64 es solo para otros clientes de
+# la BD que todavía lo leen, y se retira en dos pasos:
+#   1. FIRMAS_ESCRIBIR_BASE64=1 (por defecto): las firmas nuevas se guardan en
+#      los dos lados; la migración 0007 copió las existentes sin vaciarlas.
+#   2. Cuando esos clientes lean firma_blobs: FIRMAS_ESCRIBIR_BASE64=0 y
+#      `python manage.py vaciar_firmas_base64` (vacía la columna en las filas
+#      que ya tienen firma_blob).
+def decodificar_firma(firma_base64: str):
+    """
+    Acepta "data:image/png;base64,...." o solo el base64.
+    Devuelve (bytes, content_type) o (None, None) si no es válido.
+    """
+    if not firma_base64:
+        return None, None
+    content_type = "image/png"
+    valor = firma_base64.strip()
+    if valor.startswith("data:") and "," in valor:
+        cabecera, valor = valor.split(",", 1)
+        content_type = cabecera[5:].split(";", 1)[0] or content_type
+    try:
+        return base64.b64decode(valor, validate=False), content_type
+    except (binascii.Error, ValueError):
+        return None, None
+
+
+def guardar_firma(contenido: bytes, content_type: str = "image/png"):
+    sha = hashlib.sha256(contenido).hexdigest()
+    blob, _ = FirmaBlobs.objects.get_or_create(
+        sha256=sha,
+        defaults={"contenido": contenido, "content_type": content_type, "created_at": timezone.now()},
+    )
+    return blob
+
+
+def guardar_firma_base64(firma_base64: str):
+    contenido, content_type = decodificar_firma(firma_base64)
+    if not contenido:
+        return None
+    return guardar_firma(contenido, content_type)
+
+
+def base64_legado(firma_base64: str):
+    """Valor para la columna firma_base64 de una firma nueva (None cuando ya no se escribe)."""
+    if not getattr(settings, "FIRMAS_ESCRIBIR_BASE64", True):
+        return None
+    return firma_base64 or None
+
+
+def vaciar_base64(modelos, lote: int = 200):
+    """Vacía firma_base64 en las filas con firma_blob, por lotes. Devuelve las filas tocadas."""
+    total = 0
+    for model in modelos:
+        while True:
+            pks = list(
+                model.objects.filter(firma_base64__isnull=False, firma_blob__isnull=False)
+                .order_by("pk").values_list("pk", flat=True)[:lote]
+            )
+            if not pks:
+                break
+            total += model.objects.filter(pk__in=pks).update(firma_base64=None)
+    return total
+
+
+def leer_firma(obj):
+    """
+    (bytes, content_type) de la firma de un Ciudadanos / DenunciaFirmas, o (None, None).
+    Usa firma_blobs y, para filas que no pasaron por la migración, firma_base64 (se carga solo aquí).
+    """
+    if obj is None:
+        return None, None
+    if obj.firma_blob_id:
+        blob = obj.firma_blob
+        return bytes(blob.contenido), blob.content_type
+    return decodificar_firma(obj.firma_base64)
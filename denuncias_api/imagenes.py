@@ -0,0 +1,71 @@
+"""
+Generación de versiones reducidas (thumbnail / medium) de imágenes.
+
+Este módulo NO importa Django: se ejecuta dentro de los procesos del pool
+de derivados (ver derivados.py).
+"""
+import hashlib
+import os
+
+from PIL import Image, ImageOps
+
+
+RENDICIONES = {
+    "thumb": 320,
+    "medium": 1280,
+}
+CALIDAD_JPEG = 82
+DERIVADOS_FOLDER = "derivados/"
+
+
+def _sha256_path(path: str):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _sin_exif(img):
+    # aplicamos la orientación y copiamos solo los píxeles (sin EXIF/GPS)
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.split()[-1])
+        return fondo
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    limpia = Image.new("RGB", img.size)
+    limpia.paste(img)
+    return limpia
+
+
+def generar_rendiciones(origen_abs: str, media_root: str, sha: str = None):
+    """
+    Crea derivados/<sha>_<rendicion>.jpg para cada tamaño de RENDICIONES.
+    sha: hash del original si ya se conoce (blobs); si no, se calcula.
+    Devuelve {"sha256": ..., "thumb": ruta_relativa, "medium": ruta_relativa}.
+    """
+    sha = sha or _sha256_path(origen_abs)
+    out = {"sha256": sha}
+
+    with Image.open(origen_abs) as img:
+        img.draft("RGB", (max(RENDICIONES.values()),) * 2)  # decodificación reducida en JPEG
+        base = _sin_exif(img)
+
+    carpeta = os.path.join(media_root, DERIVADOS_FOLDER)
+    os.makedirs(carpeta, exist_ok=True)
+
+    for nombre, lado in RENDICIONES.items():
+        rel = f"{DERIVADOS_FOLDER}{sha}_{nombre}.jpg"
+        destino = os.path.join(media_root, rel)
+        if not os.path.exists(destino):
+            r = base.copy()
+            r.thumbnail((lado, lado), Image.LANCZOS)
+            tmp = destino + ".tmp"
+            r.save(tmp, "JPEG", quality=CALIDAD_JPEG, optimize=True, progressive=True)
+            os.replace(tmp, destino)
+        out[nombre] = rel
+
+    return out
@@ -0,0 +1,31 @@
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+
+from denuncias_api import clasificador
+from denuncias_api.management.commands.entrenar_clasificador import cargar_datos
+
+
+class Command(BaseCommand):
+    help = "Mide accuracy (top-1/top-3) y latencia del clasificador sobre el holdout de denuncias."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite", type=int, default=2000)
+        parser.add_argument("--todas", action="store_true", help="Evalúa con todas las denuncias, no solo el holdout")
+
+    def handle(self, *args, **opts):
+        clf = clasificador.get_clasificador()
+        if clf is None:
+            raise CommandError("No hay modelo entrenado (ejecuta entrenar_clasificador).")
+
+        filas = [f for f in cargar_datos() if opts["todas"] or clasificador.es_holdout(f[0])][: opts["limite"]]
+        if not filas:
+            raise CommandError("No hay denuncias para evaluar.")
+
+        res = clasificador.evaluar(clf, [(d, t) for _, d, t in filas], k=3)
+        ms = res["ms"]
+        self.stdout.write(f"Modelo: {clf.meta}")
+        self.stdout.write(f"Muestras: {res['muestras']}  top-1: {res['top1']:.3f}  top-3: {res['topk']:.3f}")
+        self.stdout.write(
+            f"Latencia ms  p50: {np.percentile(ms, 50):.2f}  p95: {np.percentile(ms, 95):.2f}  max: {ms.max():.2f}"
+        )
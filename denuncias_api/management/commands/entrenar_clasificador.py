@@ -0,0 +1,58 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from db.models import Denuncias
+from denuncias_api import clasificador
+
+
+def cargar_datos():
+    """[(id, descripcion, tipo_denuncia_id)] de las denuncias con descripción y tipo activo."""
+    qs = (
+        Denuncias.objects.filter(tipo_denuncia__activo=True)
+        .exclude(descripcion__isnull=True).exclude(descripcion="")
+        .values_list("id", "descripcion", "tipo_denuncia_id")
+    )
+    return list(qs.iterator(chunk_size=2000))
+
+
+class Command(BaseCommand):
+    help = "Entrena el clasificador local descripcion -> tipo_denuncia con las denuncias históricas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--epocas", type=int, default=15)
+        parser.add_argument("--min-por-clase", type=int, default=5)
+        parser.add_argument("--todo", action="store_true", help="Entrena también con el holdout (sin evaluación)")
+
+    def handle(self, *args, **opts):
+        filas = cargar_datos()
+        conteo = Counter(t for _, _, t in filas)
+        filas = [f for f in filas if conteo[f[2]] >= opts["min_por_clase"]]
+        if len(set(t for _, _, t in filas)) < 2:
+            raise CommandError("No hay suficientes denuncias etiquetadas (se necesitan al menos 2 tipos).")
+
+        if opts["todo"]:
+            train, test = filas, []
+        else:
+            train = [f for f in filas if not clasificador.es_holdout(f[0])]
+            test = [f for f in filas if clasificador.es_holdout(f[0])]
+
+        t0 = time.perf_counter()
+        modelo = clasificador.entrenar([d for _, d, _ in train], [t for _, _, t in train], epocas=opts["epocas"])
+        seg = time.perf_counter() - t0
+
+        meta = {
+            "entrenado_en": timezone.now().isoformat(),
+            "muestras": len(train),
+            "clases": len(modelo["clases"]),
+            "segundos": round(seg, 1),
+        }
+        if test:
+            res = clasificador.evaluar(clasificador.Clasificador(modelo), [(d, t) for _, d, t in test], k=1)
+            meta["accuracy_holdout"] = round(res["top1"], 4)
+            meta["muestras_holdout"] = len(test)
+
+        clasificador.guardar(modelo, meta)
+        self.stdout.write(self.style.SUCCESS(f"Clasificador guardado: {meta}"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from denuncias_api.media_storage import GC_GRACIA_HORAS, recolectar_blobs
+
+
+class Command(BaseCommand):
+    help = "Borra los blobs de evidencias sin referencias (almacenamiento por SHA-256)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gracia-horas", type=int, default=GC_GRACIA_HORAS)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        borrados, liberados = recolectar_blobs(
+            gracia_horas=opts["gracia_horas"],
+            dry_run=opts["dry_run"],
+        )
+        prefijo = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"{prefijo}Blobs borrados: {borrados} ({liberados / 1024 / 1024:.1f} MB)")
+        )
@@ -0,0 +1,46 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from db.models import Ciudadanos, EvidenciaBlobs
+from denuncias_api.derivados import es_imagen, generar, registrar_derivados
+
+
+class Command(BaseCommand):
+    help = "Genera thumbnail/medium (sin EXIF) para evidencias y fotos de perfil que aún no los tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        trabajos = []
+
+        blobs = EvidenciaBlobs.objects.filter(ruta_thumb__isnull=True).only("sha256", "ruta", "content_type")
+        for b in blobs[: opts["limite"]]:
+            if es_imagen(b.content_type, b.ruta):
+                trabajos.append((b.ruta, ("blob", b.sha256)))
+
+        fotos = (
+            Ciudadanos.objects.filter(foto_perfil_url__contains=settings.MEDIA_URL, foto_perfil_thumb_url__isnull=True)
+            .only("usuario_id", "foto_perfil_url")
+        )
+        for c in fotos[: opts["limite"]]:
+            ruta = c.foto_perfil_url.split(settings.MEDIA_URL, 1)[1]
+            trabajos.append((ruta, ("perfil", c.usuario_id)))
+
+        futs = {
+            generar(ruta, destino[1] if destino[0] == "blob" else None): destino
+            for ruta, destino in trabajos
+        }
+
+        ok = errores = 0
+        for fut in as_completed(futs):
+            try:
+                registrar_derivados(futs[fut], fut.result())
+                ok += 1
+            except Exception as e:
+                errores += 1
+                self.stderr.write(f"{futs[fut]}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Derivados generados: {ok} (errores: {errores})"))
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from chatbot_api import llm_gateway
+from chatbot_api.llm_gateway import LLMNoDisponible
+from denuncias_api import resumen_ia, tareas_ia, trabajos
+
+ESTADOS_ABIERTOS = ("pendiente", "en_proceso")
+SITIO_LOTE = "lote.resumen_ia"
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera (fuera de hora pico) los resúmenes IA de las denuncias pendientes/en proceso que no tienen "
+        "uno vigente, con concurrencia acotada. Pensado para cron nocturno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrencia", type=int, default=4, help="Llamadas al LLM a la vez")
+        parser.add_argument("--limite", type=int, default=1000, help="Máximo de denuncias por corrida")
+        parser.add_argument("--max-minutos", type=float, default=120, help="No inicia nuevas generaciones pasado este tiempo")
+        parser.add_argument("--cola", action="store_true", help="Solo encola trabajos resumen_ia (los procesa trabajos_worker)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        t0 = time.monotonic()
+        faltan = self._sin_resumen(opts["limite"])
+        prefijo = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(f"{prefijo}Denuncias abiertas sin resumen vigente: {len(faltan)}")
+        if opts["dry_run"] or not faltan:
+            return
+
+        if opts["cola"]:
+            for d in faltan:
+                trabajos.encolar(
+                    tareas_ia.RESUMEN_IA,
+                    {"denuncia_id": d.id, "sitio": SITIO_LOTE},
+                    clave=tareas_ia.clave(tareas_ia.RESUMEN_IA, d.id),
+                )
+            self.stdout.write(self.style.SUCCESS(f"Trabajos encolados: {len(faltan)}"))
+            return
+
+        # los hilos solo llaman al LLM; el guardado va en este hilo (una conexión a la BD)
+        limite = t0 + opts["max_minutos"] * 60
+        ok = errores = omitidas = 0
+        with ThreadPoolExecutor(max_workers=max(1, opts["concurrencia"]), thread_name_prefix="resumenes") as pool:
+            futs = {pool.submit(self._llamar, d, limite): d for d in faltan}
+            for fut in as_completed(futs):
+                d = futs[fut]
+                try:
+                    r = fut.result()
+                    if r is None:
+                        omitidas += 1
+                        continue
+                    resumen_ia.guardar(d, *r)
+                    ok += 1
+                except LLMNoDisponible as e:
+                    errores += 1
+                    self.stderr.write(f"Denuncia {d.id}: LLM no disponible ({e})")
+                except Exception as e:
+                    errores += 1
+                    self.stderr.write(f"Denuncia {d.id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes generados: {ok} (errores: {errores}, sin tiempo: {omitidas}) "
+            f"en {time.monotonic() - t0:.0f}s"
+        ))
+
+    def _sin_resumen(self, limite: int):
+        # el hash se calcula en Python: se recorren los abiertos y se quedan los que no tienen resumen vigente
+        faltan = []
+        qs = resumen_ia.con_resumen().filter(estado__in=ESTADOS_ABIERTOS).order_by("created_at")
+        for d in qs.iterator(chunk_size=500):
+            if resumen_ia.guardado(d) is None:
+                faltan.append(d)
+                if len(faltan) >= limite:
+                    break
+        return faltan
+
+    def _llamar(self, denuncia, limite: float):
+        """(texto crudo, modelo, hash) o None si ya no queda tiempo."""
+        if time.monotonic() >= limite:
+            return None
+        h = resumen_ia.hash_contenido(denuncia)
+        sitio, kwargs = resumen_ia.pedir(denuncia, SITIO_LOTE)
+        response = llm_gateway.crear(sitio, api="chat", **kwargs)
+        return response.choices[0].message.content, kwargs["model"], h
@@ -0,0 +1,73 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from denuncias_api import tareas_ia, trabajos  # noqa: F401  (tareas_ia registra las tareas)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de trabajos (tabla trabajos): toma lotes con SKIP LOCKED y los ejecuta. "
+        "Se pueden correr varios en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5, help="Trabajos tomados por consulta")
+        parser.add_argument("--hilos", type=int, default=1, help="Trabajos ejecutados a la vez (E/S al LLM)")
+        parser.add_argument("--espera", type=float, default=2.0, help="Segundos de espera con la cola vacía")
+        parser.add_argument("--tipos", nargs="*", help="Solo estos tipos de trabajo")
+        parser.add_argument("--una-vez", action="store_true", help="Vacía la cola disponible y termina")
+
+    def handle(self, *args, **opts):
+        self._parar = False
+        signal.signal(signal.SIGTERM, self._senal)
+        signal.signal(signal.SIGINT, self._senal)
+
+        worker = trabajos.nombre_worker()
+        hilos = max(1, opts["hilos"])
+        lote = max(opts["lote"], hilos)
+        pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajos") if hilos > 1 else None
+        ok = errores = 0
+        ultima_recuperacion = 0.0
+        self.stdout.write(f"Worker {worker}: lote={lote} hilos={hilos}")
+
+        try:
+            while not self._parar:
+                close_old_connections()
+                if time.monotonic() - ultima_recuperacion > 60:
+                    trabajos.recuperar_vencidos()
+                    ultima_recuperacion = time.monotonic()
+
+                tomados = trabajos.tomar(worker, lote, opts["tipos"])
+                if not tomados:
+                    if opts["una_vez"]:
+                        break
+                    time.sleep(opts["espera"])
+                    continue
+
+                if pool is None:
+                    resultados = [trabajos.ejecutar(t) for t in tomados]
+                else:
+                    resultados = list(pool.map(self._en_hilo, tomados))
+                ok += sum(resultados)
+                errores += len(resultados) - sum(resultados)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Trabajos terminados: {ok} (con error: {errores})"))
+
+    def _en_hilo(self, trabajo):
+        # hilo del pool: conexión propia a la BD, se cierra si quedó vieja
+        close_old_connections()
+        try:
+            return trabajos.ejecutar(trabajo)
+        finally:
+            close_old_connections()
+
+    def _senal(self, signum, frame):
+        # termina el lote en curso y sale
+        self._parar = True
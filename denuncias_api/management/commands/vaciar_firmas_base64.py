@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from db.models import Ciudadanos, DenunciaFirmas
+from denuncias_api.firmas import vaciar_base64
+
+
+class Command(BaseCommand):
+    help = (
+        "Vacía firma_base64 en las filas que ya tienen firma_blob. Correr cuando ningún cliente "
+        "lea esa columna y con FIRMAS_ESCRIBIR_BASE64=0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        if getattr(settings, "FIRMAS_ESCRIBIR_BASE64", True):
+            raise CommandError("FIRMAS_ESCRIBIR_BASE64 sigue activo: las firmas nuevas volverían a escribirse.")
+        n = vaciar_base64([Ciudadanos, DenunciaFirmas], lote=opts["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Filas con firma_base64 vaciado: {n}"))
@@ -0,0 +1,158 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from db.models import EvidenciaBlobs
+
+from .almacenamiento import get_backend
+
+
+# =========================
+# Almacenamiento por contenido (SHA-256)
+# =========================
+CAS_FOLDER = "cas/"
+GC_GRACIA_HORAS = 24
+
+
+def sha256_archivo(archivo):
+    """
+    Calcula el SHA-256 leyendo el archivo por chunks (no lo carga entero en memoria).
+    """
+    h = hashlib.sha256()
+    for chunk in archivo.chunks():
+        h.update(chunk)
+    archivo.seek(0)
+    return h.hexdigest()
+
+
+def ruta_blob(sha: str, nombre_original: str = ""):
+    # cas/ab/cd/abcd...<ext>  (2 niveles para no tener miles de archivos en una carpeta)
+    ext = os.path.splitext(nombre_original or "")[1].lower()[:10]
+    return f"{CAS_FOLDER}{sha[:2]}/{sha[2:4]}/{sha}{ext}"
+
+
+def guardar_blob(archivo, sha: str = None):
+    """
+    Guarda el archivo deduplicado por contenido y suma una referencia.
+    Si el blob ya existe solo se actualiza el índice (no se escribe nada al almacenamiento).
+    Devuelve (blob, creado).
+    """
+    sha = sha or sha256_archivo(archivo)
+    now = timezone.now()
+    backend = get_backend()
+
+    with transaction.atomic():
+        blob = EvidenciaBlobs.objects.select_for_update().filter(sha256=sha).first()
+        if blob and backend.existe(blob.ruta):
+            blob.ref_count = F("ref_count") + 1
+            blob.updated_at = now
+            blob.save(update_fields=["ref_count", "updated_at"])
+            blob.refresh_from_db(fields=["ref_count"])
+            return blob, False
+
+        ruta = ruta_blob(sha, getattr(archivo, "name", ""))
+        if not backend.existe(ruta):
+            ruta = backend.guardar(ruta, archivo)
+
+        if blob:
+            # el índice existía pero el archivo se perdió: lo re-apuntamos (y se regeneran derivados)
+            blob.ruta = ruta
+            blob.ruta_thumb = blob.ruta_medium = None
+            blob.ref_count = F("ref_count") + 1
+            blob.updated_at = now
+            blob.save(update_fields=["ruta", "ruta_thumb", "ruta_medium", "ref_count", "updated_at"])
+            blob.refresh_from_db(fields=["ref_count"])
+            return blob, True
+
+        blob = EvidenciaBlobs.objects.create(
+            sha256=sha,
+            ruta=ruta,
+            tamano_bytes=getattr(archivo, "size", 0) or 0,
+            content_type=(getattr(archivo, "content_type", "") or None),
+            ref_count=1,
+            created_at=now,
+            updated_at=now,
+        )
+        return blob, True
+
+
+def registrar_blob(sha: str, ruta: str, tamano: int, content_type: str = None):
+    """
+    Igual que guardar_blob pero para archivos que ya están en el almacenamiento
+    (subida directa): solo índice y referencia, sin tocar bytes.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        blob = EvidenciaBlobs.objects.select_for_update().filter(sha256=sha).first()
+        if blob:
+            campos = ["ref_count", "updated_at"]
+            if blob.ruta != ruta and not get_backend().existe(blob.ruta):
+                # el índice apuntaba a un archivo que ya no está (p. ej. quedó en otro backend)
+                blob.ruta = ruta
+                blob.ruta_thumb = blob.ruta_medium = None
+                campos += ["ruta", "ruta_thumb", "ruta_medium"]
+            blob.ref_count = F("ref_count") + 1
+            blob.updated_at = now
+            blob.save(update_fields=campos)
+            blob.refresh_from_db(fields=["ref_count"])
+            return blob
+        return EvidenciaBlobs.objects.create(
+            sha256=sha,
+            ruta=ruta,
+            tamano_bytes=tamano or 0,
+            content_type=content_type,
+            ref_count=1,
+            created_at=now,
+            updated_at=now,
+        )
+
+
+def liberar_blob(sha: str):
+    """
+    Resta una referencia. El archivo NO se borra aquí; lo hace el recolector
+    (gc_evidencias) pasado el periodo de gracia, por si llega un re-intento.
+    """
+    if not sha:
+        return
+    EvidenciaBlobs.objects.filter(sha256=sha, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1,
+        updated_at=timezone.now(),
+    )
+
+
+def liberar_evidencias(datos_json: dict):
+    for ev in (datos_json or {}).get("evidencias") or []:
+        liberar_blob(ev.get("sha256"))
+
+
+def recolectar_blobs(gracia_horas: int = GC_GRACIA_HORAS, dry_run: bool = False):
+    """
+    Borra blobs sin referencias cuya última modificación supera el periodo de gracia.
+    Devuelve (cantidad, bytes_liberados).
+    """
+    limite = timezone.now() - timedelta(hours=gracia_horas)
+    candidatos = EvidenciaBlobs.objects.filter(ref_count__lte=0, updated_at__lt=limite).values_list("sha256", flat=True)
+
+    borrados = 0
+    liberados = 0
+    for sha in list(candidatos):
+        with transaction.atomic():
+            # re-chequeo con lock: una subida concurrente pudo sumar referencia
+            blob = EvidenciaBlobs.objects.select_for_update().filter(sha256=sha, ref_count__lte=0).first()
+            if not blob:
+                continue
+            borrados += 1
+            liberados += blob.tamano_bytes or 0
+            if dry_run:
+                continue
+            backend = get_backend()
+            for ruta in (blob.ruta, blob.ruta_thumb, blob.ruta_medium):
+                if ruta:
+                    backend.borrar(ruta)
+            blob.delete()
+
+    return borrados, liberados
@@ -0,0 +1,50 @@
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core import signing
+
+
+# =========================
+# URLs firmadas de MEDIA
+# =========================
+# La app carga firmas, cédulas y evidencias antiguas en <img>, sin header
+# Authorization: a esas URLs se les agrega ?firma=<ts:hmac> de corta duración
+# que servir_media acepta en lugar de la sesión / JWT.
+PARAM = "firma"
+_SALT = "denuncias_api.media"
+PUBLICAS = ("cas/", "derivados/")
+
+
+def _signer():
+    return signing.TimestampSigner(salt=_SALT)
+
+
+def firmar(ruta: str):
+    # sign() devuelve "<ruta>:<ts>:<hmac>"; en la URL solo va "<ts>:<hmac>"
+    return _signer().sign(ruta)[len(ruta) + 1:]
+
+
+def firma_valida(ruta: str, firma: str):
+    if not firma:
+        return False
+    try:
+        _signer().unsign(f"{ruta}:{firma}", max_age=getattr(settings, "MEDIA_FIRMA_TTL_SEG", 3600))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def ruta_de_url(url: str):
+    """'https://host/media/a%20b.png' -> 'a b.png' (None si no es de MEDIA)."""
+    path = unquote(urlsplit(url or "").path)
+    if not path.startswith(settings.MEDIA_URL):
+        return None
+    return path[len(settings.MEDIA_URL):] or None
+
+
+def url_firmada(url: str):
+    """Agrega la firma a una URL de MEDIA privada; las públicas y ajenas quedan igual."""
+    ruta = ruta_de_url(url)
+    if not ruta or ruta.startswith(PUBLICAS):
+        return url
+    return f"{url}{'&' if '?' in url else '?'}{PARAM}={firmar(ruta)}"
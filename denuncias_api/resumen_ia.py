@@ -0,0 +1,164 @@
+"""
+Resumen y sugerencias de acción generados por IA para el panel de funcionarios.
+
+- El resultado se guarda en denuncia_resumenes_ia junto con un hash de los
+  campos que entran al prompt (y la versión del prompt).
+- Mientras el hash no cambie se sirve lo guardado: ver un caso otra vez no
+  llama al modelo. Solo se regenera si la denuncia cambió o con forzar=True.
+- Respuestas sin JSON se devuelven tal cual pero no se guardan.
+- `manage.py pregenerar_resumenes` los genera de noche para los casos abiertos.
+"""
+import hashlib
+import json
+import re
+
+from django.utils import timezone
+
+from chatbot_api import enrutador, llm_gateway
+from db.models import DenunciaResumenesIa, Denuncias
+
+# subir si cambia el prompt: invalida todos los resúmenes guardados
+VERSION_PROMPT = 1
+SITIO = "web.llm_response"
+
+_re_json = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def con_resumen():
+    """Denuncias con lo necesario para el prompt y su resumen guardado (una consulta)."""
+    return Denuncias.objects.select_related(
+        'ciudadano',
+        'tipo_denuncia',
+        'asignado_departamento',
+        'asignado_funcionario__web_user',
+        'denunciaresumenesia',
+    ).defer('ciudadano__firma_base64')
+
+
+def cargar(denuncia_id):
+    return con_resumen().get(id=denuncia_id)
+
+
+# =========================================================
+# Contenido y hash
+# =========================================================
+def datos(denuncia: Denuncias):
+    """Campos de la denuncia que entran al prompt."""
+    return {
+        "ciudadano": f"{denuncia.ciudadano.nombres} {denuncia.ciudadano.apellidos}" if denuncia.ciudadano else 'Desconocido',
+        "descripcion": denuncia.descripcion,
+        "referencia": denuncia.referencia,
+        "tipo": denuncia.tipo_denuncia.nombre,
+        "estado": denuncia.estado,
+        "departamento": denuncia.asignado_departamento.nombre if denuncia.asignado_departamento else 'No asignado',
+        "funcionario": denuncia.asignado_funcionario.web_user.get_full_name() if denuncia.asignado_funcionario else 'No asignado',
+    }
+
+
+def hash_contenido(denuncia: Denuncias):
+    crudo = json.dumps({"v": VERSION_PROMPT, **datos(denuncia)}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def guardado(denuncia: Denuncias):
+    """Resumen guardado si sigue vigente para el contenido actual, si no None."""
+    try:
+        r = denuncia.denunciaresumenesia
+    except DenunciaResumenesIa.DoesNotExist:
+        return None
+    return r if r.hash_contenido == hash_contenido(denuncia) else None
+
+
+def texto(resumen: DenunciaResumenesIa):
+    return f"RESUMEN:\n{resumen.resumen}\n\nSUERENCIAS DE ACCIÓN:\n{resumen.sugerencias_accion}"
+
+
+# =========================================================
+# Generación
+# =========================================================
+def _prompt(d: dict):
+    return f"""
+            Eres un asistente especializado en gestión de denuncias ciudadanas
+            para la Municipalidad de Salcedo, Cotopaxi, Ecuador.
+
+            Analiza la siguiente denuncia y responde EXCLUSIVAMENTE en JSON válido
+            sin texto adicional, sin markdown, sin comentarios.
+
+            Formato requerido:
+            {{
+            "resumen": "string",
+            "sugerencias_accion": "string"
+            }}
+
+            Datos de la denuncia:
+            - Ciudadano: {d["ciudadano"]}
+            - Descripción: {d["descripcion"]}
+            - Referencia: {d["referencia"]}
+            - Tipo: {d["tipo"]}
+            - Estado: {d["estado"]}
+            - Departamento: {d["departamento"]}
+            - Funcionario: {d["funcionario"]}
+
+            Responde al ciudadano en español, Con un tono empático y cercano para que el ciudadano se sienta escuchado.
+            Asegúrate de que el JSON esté correctamente formateado.
+
+            """
+
+
+def pedir(denuncia: Denuncias, sitio: str = SITIO):
+    """kwargs de llm_gateway.crear(api="chat") para esta denuncia: (sitio, kwargs)."""
+    ruta, _ = enrutador.ruta_caso(denuncia.descripcion, denuncia.referencia)
+    return f"{sitio}.{ruta}", {
+        "model": enrutador.modelo(ruta),
+        "messages": [
+            {"role": "system", "content": "Eres un asistente útil que responde siempre en JSON."},
+            {"role": "user", "content": _prompt(datos(denuncia))},
+        ],
+        "max_tokens": 500,
+    }
+
+
+def guardar(denuncia: Denuncias, raw_text: str, modelo=None, hash_=None):
+    """
+    Parsea la respuesta del modelo y la guarda. Devuelve (resumen, texto):
+    resumen es None si la respuesta no traía JSON (texto = respuesta cruda).
+    Lanza json.JSONDecodeError si el JSON está mal formado.
+    """
+    raw_text = (raw_text or "").strip()
+    match = _re_json.search(raw_text)
+    if not match:
+        if raw_text:
+            return None, raw_text
+        raise ValueError("La respuesta no contiene JSON válido ni texto recuperable")
+
+    data = json.loads(match.group())
+    now = timezone.now()
+    campos = {
+        "hash_contenido": hash_ or hash_contenido(denuncia),
+        "resumen": str(data.get('resumen', '')),
+        "sugerencias_accion": str(data.get('sugerencias_accion', '')),
+        "modelo": modelo,
+        "updated_at": now,
+    }
+    resumen, _ = DenunciaResumenesIa.objects.update_or_create(
+        denuncia_id=denuncia.id, defaults=campos, create_defaults={**campos, "created_at": now},
+    )
+    return resumen, texto(resumen)
+
+
+def generar(denuncia: Denuncias, forzar: bool = False, sitio: str = SITIO):
+    """
+    (texto, desde_guardado). Llama al modelo solo si no hay resumen vigente
+    o si forzar=True. Propaga LLMNoDisponible.
+    """
+    if not forzar:
+        r = guardado(denuncia)
+        if r is not None:
+            return texto(r), True
+
+    # hash del contenido que se envía (si la denuncia cambia durante la llamada, queda viejo)
+    h = hash_contenido(denuncia)
+    sitio, kwargs = pedir(denuncia, sitio)
+    response = llm_gateway.crear(sitio, api="chat", **kwargs)
+    _, t = guardar(denuncia, response.choices[0].message.content, modelo=kwargs["model"], hash_=h)
+    return t, False
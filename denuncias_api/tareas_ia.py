@@ -0,0 +1,115 @@
+"""
+Tareas de la cola (trabajos.py) que llaman al LLM para el panel web.
+
+- respuesta_resolucion: mensaje al ciudadano cuando se resuelve su denuncia.
+  Si el LLM no responde se reintenta; en el último intento se usa el texto
+  de respaldo para que el ciudadano reciba igual su respuesta.
+- resumen_ia: resumen y sugerencias del caso (resumen_ia.py).
+"""
+from django.utils import timezone
+
+from chatbot_api import enrutador, llm_gateway
+from chatbot_api.llm_gateway import LLMNoDisponible
+from db.models import DenunciaRespuestas, Denuncias
+
+from . import resumen_ia, trabajos
+
+RESPUESTA_RESOLUCION = "respuesta_resolucion"
+RESUMEN_IA = "resumen_ia"
+
+RESPUESTA_RESOLUCION_FALLBACK = (
+    "Estimado/a ciudadano/a, le informamos que su denuncia ha sido atendida y marcada como resuelta. "
+    "Gracias por contribuir a mejorar nuestro cantón."
+)
+
+
+def clave(tipo: str, denuncia_id):
+    return f"{tipo}:denuncia:{denuncia_id}"
+
+
+# =========================================================
+# Respuesta de resolución
+# =========================================================
+def _prompt_resolucion(denuncia: Denuncias):
+    return f"""
+            Eres un asistente especializado en gestión de denuncias ciudadanas
+            para la Municipalidad de Salcedo, Cotopaxi, Ecuador.
+
+            Datos de la denuncia:
+            - Ciudadano: {f"{denuncia.ciudadano.nombres} {denuncia.ciudadano.apellidos}" if denuncia.ciudadano else 'Desconocido'}
+            - Descripción: {denuncia.descripcion}
+            - Referencia: {denuncia.referencia}
+            - Tipo: {denuncia.tipo_denuncia.nombre}
+            - Estado: {denuncia.estado}
+            - Departamento: {denuncia.asignado_departamento.nombre if denuncia.asignado_departamento else 'No asignado'}
+            - Funcionario: {denuncia.asignado_funcionario.web_user.get_full_name() if denuncia.asignado_funcionario else 'No asignado'}
+
+            Responde al ciudadano en español, sin formato, solo texto.
+            Tu tono debe ser empático y cercano para que el ciudadano se sienta escuchado, sobre la resolución de su denuncia.
+
+            """
+
+
+@trabajos.tarea(RESPUESTA_RESOLUCION)
+def respuesta_resolucion(payload: dict, trabajo):
+    """payload: denuncia_id, funcionario_id, respuesta_id (uuid fijado al encolar)."""
+    respuesta_id = payload["respuesta_id"]
+    # idempotente: si un intento anterior alcanzó a guardar, no se duplica
+    if DenunciaRespuestas.objects.filter(id=respuesta_id).exists():
+        return {"respuesta_id": respuesta_id}
+
+    try:
+        denuncia = Denuncias.objects.select_related(
+            'ciudadano',
+            'tipo_denuncia',
+            'asignado_departamento',
+            'asignado_funcionario__web_user'
+        ).defer('ciudadano__firma_base64').get(id=payload["denuncia_id"])
+    except Denuncias.DoesNotExist:
+        raise trabajos.SinReintento("denuncia no encontrada")
+
+    fallback = False
+    try:
+        response = llm_gateway.crear(
+            "web.resolver_denuncia",
+            api="chat",
+            model=enrutador.modelo(enrutador.RAPIDO),
+            messages=[
+                {"role": "system", "content": "Eres un asistente útil que siempre responde en texto plano."},
+                {"role": "user", "content": _prompt_resolucion(denuncia)}
+            ],
+            max_tokens=500,
+        )
+        raw_text = (response.choices[0].message.content or "").strip() or RESPUESTA_RESOLUCION_FALLBACK
+    except LLMNoDisponible:
+        if not trabajos.ultimo_intento(trabajo):
+            raise
+        raw_text = RESPUESTA_RESOLUCION_FALLBACK
+        fallback = True
+
+    now = timezone.now()
+    DenunciaRespuestas.objects.create(
+        id=respuesta_id,
+        denuncia=denuncia,
+        funcionario_id=payload.get("funcionario_id"),
+        mensaje=raw_text,
+        created_at=now,
+        updated_at=now,
+    )
+    return {"respuesta_id": respuesta_id, "fallback": fallback}
+
+
+# =========================================================
+# Resumen del caso
+# =========================================================
+@trabajos.tarea(RESUMEN_IA)
+def resumen(payload: dict, trabajo):
+    """payload: denuncia_id, forzar, sitio (opcional, para el panel de uso)."""
+    try:
+        denuncia = resumen_ia.cargar(payload["denuncia_id"])
+    except Denuncias.DoesNotExist:
+        raise trabajos.SinReintento("denuncia no encontrada")
+    texto, guardado = resumen_ia.generar(
+        denuncia, forzar=bool(payload.get("forzar")), sitio=payload.get("sitio") or resumen_ia.SITIO,
+    )
+    return {"texto": texto, "guardado": guardado}
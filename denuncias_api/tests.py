@@ -1,3 +1,568 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import boto3
+from moto import mock_aws
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from catalogos_api import tipos
+from db.models import Ciudadanos, DenunciaBorradores, Denuncias, EvidenciaBlobs, TiposDenuncia, Trabajos, Usuarios
+
+from . import almacenamiento, clasificador, derivados, firmas, trabajos
+
+BUCKET = "denuncias-test"
+
+
+def _jpeg():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class SubidasBase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.usuario = Usuarios.objects.create(
+            id=uuid.uuid4(), tipo="ciudadano", correo="ciudadano@test.ec", password_hash="x",
+            activo=True, correo_verificado=True, created_at=now, updated_at=now,
+        )
+        Ciudadanos.objects.create(
+            usuario=cls.usuario, cedula="0500000001", nombres="Ana", apellidos="Pérez",
+            created_at=now, updated_at=now,
+        )
+
+    def setUp(self):
+        almacenamiento.reiniciar_backend()
+        self.addCleanup(almacenamiento.reiniciar_backend)
+        token = AccessToken()
+        token["uid"] = str(self.usuario.id)
+        token["tipo"] = "ciudadano"
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.borr = self._borrador()
+
+    def _borrador(self):
+        now = timezone.now()
+        return DenunciaBorradores.objects.create(
+            id=uuid.uuid4(), ciudadano_id=self.usuario.id, datos_json={"origen": "formulario"},
+            listo_para_enviar=False, created_at=now, updated_at=now,
+        )
+
+    def _presign(self, borr, **data):
+        return self.client.post(
+            reverse("borrador_subida_presign", args=[borr.id]), data=data, content_type="application/json", **self.auth,
+        )
+
+    def _confirmar(self, borr, **data):
+        return self.client.post(
+            reverse("borrador_subida_confirmar", args=[borr.id]), data=data, content_type="application/json", **self.auth,
+        )
+
+
+@mock_aws
+@override_settings(
+    MEDIA_BACKEND="s3", S3_BUCKET=BUCKET, S3_ENDPOINT_URL="", S3_ACCESS_KEY="test", S3_SECRET_KEY="test",
+    S3_REGION="us-east-1",
+)
+class SubidasS3Tests(SubidasBase):
+    """Subida directa al bucket (moto hace de S3 / MinIO)."""
+
+    def setUp(self):
+        super().setUp()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket=BUCKET)
+        self.contenido = _jpeg()
+        self.sha = hashlib.sha256(self.contenido).hexdigest()
+
+    def _subir(self, key):
+        # lo que hace la app con upload_url
+        self.s3.put_object(Bucket=BUCKET, Key=key, Body=self.contenido, ContentType="image/jpeg")
+
+    def test_presign_con_sha_usa_cas_y_checksum(self):
+        r = self._presign(self.borr, nombre_archivo="foto.JPG", content_type="image/jpeg", sha256=self.sha)
+
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertFalse(body["ya_existe"])
+        self.assertEqual(body["key"], f"cas/{self.sha[:2]}/{self.sha[2:4]}/{self.sha}.jpg")
+        self.assertIn(BUCKET, body["upload_url"])
+        self.assertIn("x-amz-checksum-sha256", body["headers"])
+
+    @mock.patch.object(derivados, "encolar_derivados")
+    def test_confirmar_registra_blob_y_encola_derivados(self, encolar):
+        key = self._presign(self.borr, nombre_archivo="foto.jpg", content_type="image/jpeg", sha256=self.sha).json()["key"]
+        self._subir(key)
+
+        r = self._confirmar(self.borr, key=key, sha256=self.sha)
+
+        self.assertEqual(r.status_code, 201)
+        blob = EvidenciaBlobs.objects.get(sha256=self.sha)
+        self.assertEqual((blob.ruta, blob.ref_count, blob.tamano_bytes), (key, 1, len(self.contenido)))
+        encolar.assert_called_once_with(key, ("blob", self.sha))
+        self.borr.refresh_from_db()
+        self.assertEqual(self.borr.datos_json["evidencias"][0]["sha256"], self.sha)
+
+    @mock.patch.object(derivados, "encolar_derivados")
+    def test_mismo_contenido_no_se_sube_dos_veces(self, encolar):
+        key = self._presign(self.borr, nombre_archivo="a.jpg", content_type="image/jpeg", sha256=self.sha).json()["key"]
+        self._subir(key)
+        self.assertEqual(self._confirmar(self.borr, key=key, sha256=self.sha).status_code, 201)
+
+        otro = self._borrador()
+        r = self._presign(otro, nombre_archivo="b.jpg", content_type="image/jpeg", sha256=self.sha)
+        self.assertEqual(r.json(), {"ya_existe": True, "key": key})
+        self.assertEqual(self._confirmar(otro, key=key, sha256=self.sha).status_code, 201)
+
+        # re-intento en el mismo borrador: no suma otra referencia
+        self.assertEqual(self._confirmar(otro, key=key, sha256=self.sha).status_code, 200)
+
+        self.assertEqual(EvidenciaBlobs.objects.get(sha256=self.sha).ref_count, 2)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET)["KeyCount"], 1)
+
+    def test_indice_sin_objeto_en_el_bucket_pide_subirlo(self):
+        # blob que quedó solo en el disco local: no se puede confirmar sin PUT
+        now = timezone.now()
+        EvidenciaBlobs.objects.create(
+            sha256=self.sha, ruta=f"cas/{self.sha[:2]}/{self.sha[2:4]}/{self.sha}.png", tamano_bytes=1,
+            ref_count=1, created_at=now, updated_at=now,
+        )
+
+        r = self._presign(self.borr, nombre_archivo="foto.jpg", content_type="image/jpeg", sha256=self.sha)
+
+        self.assertFalse(r.json()["ya_existe"])
+        key = r.json()["key"]
+        self._subir(key)
+        with mock.patch.object(derivados, "encolar_derivados"):
+            self.assertEqual(self._confirmar(self.borr, key=key, sha256=self.sha).status_code, 201)
+        blob = EvidenciaBlobs.objects.get(sha256=self.sha)
+        self.assertEqual((blob.ruta, blob.ref_count), (key, 2))
+
+    def test_confirmar_sin_subir_devuelve_409(self):
+        key = self._presign(self.borr, destino="firma", nombre_archivo="f.png", content_type="image/png").json()["key"]
+
+        r = self._confirmar(self.borr, destino="firma", key=key)
+
+        self.assertEqual(r.status_code, 409)
+        self.borr.refresh_from_db()
+        self.assertNotIn("firma_url", self.borr.datos_json)
+
+    def test_key_de_otro_borrador_rechazada(self):
+        otro = self._borrador()
+        key = self._presign(otro, destino="firma", nombre_archivo="f.png", content_type="image/png").json()["key"]
+
+        self.assertEqual(self._confirmar(self.borr, destino="firma", key=key).status_code, 400)
+
+    def test_evidencia_sin_sha256_rechazada(self):
+        r = self._presign(self.borr, nombre_archivo="foto.jpg", content_type="image/jpeg")
+        self.assertEqual(r.status_code, 400)
+
+        # una key suelta del borrador tampoco sirve como evidencia (no pasa por EvidenciaBlobs)
+        key = f"denuncias/borradores/{self.borr.id}/foto.jpg"
+        self._subir(key)
+        self.assertEqual(self._confirmar(self.borr, key=key).status_code, 400)
+
+    @mock.patch.object(derivados, "encolar_derivados")
+    def test_subida_multipart_va_al_bucket(self, encolar):
+        archivo = SimpleUploadedFile("foto.jpg", self.contenido, content_type="image/jpeg")
+
+        r = self.client.post(
+            reverse("borrador_subir_evidencia", args=[self.borr.id]), data={"archivo": archivo}, **self.auth,
+        )
+
+        self.assertEqual(r.status_code, 201)
+        blob = EvidenciaBlobs.objects.get(sha256=self.sha)
+        self.assertEqual(self.s3.head_object(Bucket=BUCKET, Key=blob.ruta)["ContentLength"], len(self.contenido))
+        encolar.assert_called_once()
+
+    def test_derivados_se_generan_y_suben_al_bucket(self):
+        key = f"cas/{self.sha[:2]}/{self.sha[2:4]}/{self.sha}.jpg"
+        self._subir(key)
+
+        res = derivados.generar(key, self.sha).result(timeout=60)
+
+        self.assertEqual(res["sha256"], self.sha)
+        for rendicion in ("thumb", "medium"):
+            self.assertEqual(self.s3.head_object(Bucket=BUCKET, Key=res[rendicion])["ContentType"], "image/jpeg")
+
+
+class SubidaLocalTests(SubidasBase):
+    """Backend local: el PUT firmado lo atiende Django con el mismo contrato que S3."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        ajustes = override_settings(MEDIA_BACKEND="local", MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.contenido = b"%PDF-1.4 evidencia"
+        self.sha = hashlib.sha256(self.contenido).hexdigest()
+
+    def _put(self, url, contenido):
+        return self.client.generic("PUT", url, data=contenido, content_type="application/pdf")
+
+    def test_put_firmado_y_confirmar(self):
+        r = self._presign(self.borr, nombre_archivo="acta.pdf", content_type="application/pdf", sha256=self.sha)
+        body = r.json()
+        self.assertTrue(body["upload_url"].startswith("http://testserver/api/denuncias/subidas/local/"))
+
+        self.assertEqual(self._put(body["upload_url"], self.contenido).status_code, 200)
+        self.assertTrue(almacenamiento.get_backend().existe(body["key"]))
+        self.assertEqual(self._confirmar(self.borr, key=body["key"], sha256=self.sha).status_code, 201)
+
+    def test_put_con_contenido_distinto_al_sha(self):
+        url = self._presign(
+            self.borr, nombre_archivo="acta.pdf", content_type="application/pdf", sha256=self.sha,
+        ).json()["upload_url"]
+
+        self.assertEqual(self._put(url, b"otra cosa").status_code, 400)
+
+    def test_put_con_token_alterado(self):
+        url = self._presign(self.borr, destino="firma", nombre_archivo="f.png", content_type="image/png").json()["upload_url"]
+
+        self.assertEqual(self._put(url.rstrip("/") + "x/", self.contenido).status_code, 403)
+
+
+# descripciones sintéticas por tipo para el clasificador
+_TEMAS = {
+    "basura": ["basura acumulada", "fundas de basura", "desechos en la vereda", "el recolector no pasa"],
+    "alumbrado": ["poste sin luz", "lámpara apagada", "foco quemado en el poste", "calle oscura sin alumbrado"],
+    "agua": ["fuga de agua", "tubería rota", "no llega agua potable", "alcantarilla tapada con agua"],
+}
+_LUGARES = ["en la esquina del parque", "frente a la escuela", "junto al mercado", "en el barrio centro", "cerca de la iglesia"]
+
+
+def _corpus():
+    return [(f"hay {frase} {lugar} desde hace días", tema) for tema, frases in _TEMAS.items()
+            for frase in frases for lugar in _LUGARES]
+
+
+class ClasificadorTests(TestCase):
+    """Entrenamiento, predicción y sugerencia de tipo antes de enviar."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.usuario = Usuarios.objects.create(
+            id=uuid.uuid4(), tipo="ciudadano", correo="ciudadano@test.ec", password_hash="x",
+            activo=True, correo_verificado=True, created_at=now, updated_at=now,
+        )
+        cls.ciudadano = Ciudadanos.objects.create(
+            usuario=cls.usuario, cedula="0500000001", nombres="Ana", apellidos="Pérez",
+            created_at=now, updated_at=now,
+        )
+        cls.tipos = {
+            tema: TiposDenuncia.objects.create(nombre=tema, activo=True, created_at=now, updated_at=now).id
+            for tema in _TEMAS
+        }
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, True)
+        self.path = os.path.join(carpeta, "clasificador.npz")
+        ajustes = override_settings(CLASIFICADOR_PATH=self.path)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        clasificador._modelo = None
+        self.addCleanup(setattr, clasificador, "_modelo", None)
+        tipos.invalidar()
+
+    def _entrenado(self):
+        corpus = _corpus()
+        modelo = clasificador.entrenar([t for t, _ in corpus], [self.tipos[tema] for _, tema in corpus])
+        return clasificador.Clasificador(modelo)
+
+    def test_predice_el_tipo(self):
+        clf = self._entrenado()
+
+        tid, p = clf.top("el poste de la calle está sin luz", k=1)[0]
+        self.assertEqual(tid, self.tipos["alumbrado"])
+        self.assertGreater(p, 0.5)
+        self.assertEqual(clf.top("", k=1), [])
+
+    def test_evaluar_usa_el_mismo_camino_que_la_prediccion(self):
+        clf = self._entrenado()
+        muestras = [("se rompió la tubería y hay fuga de agua", self.tipos["agua"])]
+
+        res = clasificador.evaluar(clf, muestras, k=3)
+
+        self.assertEqual((res["muestras"], res["top1"], res["topk"]), (1, 1.0, 1.0))
+        self.assertEqual(len(res["ms"]), 1)
+
+    def _guardar_entrenado(self):
+        clasificador.guardar(
+            {k: getattr(self._entrenado(), k) for k in ("W", "b", "idf", "clases")}, {}, path=self.path,
+        )
+
+    def test_no_sugiere_tipos_desactivados(self):
+        self._guardar_entrenado()
+        texto = "foco quemado en el poste de mi calle"
+        self.assertEqual(clasificador.sugerir_tipo(texto, minimo=0)["tipo_denuncia_id"], self.tipos["alumbrado"])
+
+        TiposDenuncia.objects.filter(id=self.tipos["alumbrado"]).update(activo=False)
+        tipos.invalidar()
+
+        sug = clasificador.sugerir_tipo(texto, minimo=0)
+        self.assertNotEqual(sug["tipo_denuncia_id"], self.tipos["alumbrado"])
+        self.assertIsNone(clasificador.sugerir_tipo(texto))
+
+    def test_sin_modelo_no_sugiere(self):
+        self.assertIsNone(clasificador.sugerir_tipo("hay basura acumulada en la esquina"))
+
+    def test_comando_entrena_y_guarda(self):
+        now = timezone.now()
+        Denuncias.objects.bulk_create([
+            Denuncias(
+                ciudadano=self.ciudadano, tipo_denuncia_id=self.tipos[tema], descripcion=texto,
+                latitud=-0.93, longitud=-78.61, origen="formulario", estado="pendiente",
+                created_at=now, updated_at=now,
+            )
+            for texto, tema in _corpus()
+        ])
+        retirado = TiposDenuncia.objects.create(nombre="retirado", activo=False, created_at=now, updated_at=now)
+        Denuncias.objects.bulk_create([
+            Denuncias(
+                ciudadano=self.ciudadano, tipo_denuncia=retirado, descripcion=texto,
+                latitud=-0.93, longitud=-78.61, origen="formulario", estado="pendiente",
+                created_at=now, updated_at=now,
+            )
+            for texto, tema in _corpus() if tema == "basura"
+        ])
+
+        call_command("entrenar_clasificador", stdout=io.StringIO())
+
+        clf = clasificador.get_clasificador()
+        self.assertIsNotNone(clf)
+        self.assertEqual(sorted(int(c) for c in clf.clases), sorted(self.tipos.values()))
+        self.assertIn("accuracy_holdout", clf.meta)
+        self.assertNotIn(retirado.id, [int(c) for c in clf.clases])
+        sug = clasificador.sugerir_tipo("hay fundas de basura junto al mercado")
+        self.assertEqual(sug["tipo_denuncia_id"], self.tipos["basura"])
+
+    def test_endpoint_sugiere_antes_de_enviar(self):
+        self._guardar_entrenado()
+        token = AccessToken()
+        token["uid"] = str(self.usuario.id)
+        token["tipo"] = "ciudadano"
+        url = reverse("denuncias_tipo_sugerido")
+
+        r = self.client.post(
+            url, data={"descripcion": "foco quemado en el poste de mi calle"}, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["tipo_sugerido"]["tipo_denuncia_id"], self.tipos["alumbrado"])
+        r = self.client.post(url, data={}, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(r.status_code, 400)
+
+
+# tareas de prueba: cada test decide qué hace la tarea con _efecto
+_efecto = {}
+
+
+@trabajos.tarea("prueba")
+def _tarea_prueba(payload, trabajo):
+    _efecto.setdefault("ultimos", []).append(trabajos.ultimo_intento(trabajo))
+    error = _efecto.get("error")
+    if error is not None:
+        raise error
+    return {"ok": payload.get("n")}
+
+
+@override_settings(TRABAJOS_BACKOFF_BASE_SEG=10, TRABAJOS_BACKOFF_MAX_SEG=60, TRABAJOS_VISIBILIDAD_SEG=600)
+class TrabajosTests(TestCase):
+    def setUp(self):
+        _efecto.clear()
+
+    def _tomar_uno(self):
+        tomados = trabajos.tomar("w1", 1)
+        self.assertEqual(len(tomados), 1)
+        return tomados[0]
+
+    def test_tomar_marca_en_curso_en_orden_y_respeta_disponible_en(self):
+        primero = trabajos.encolar("prueba", {"n": 1})
+        segundo = trabajos.encolar("prueba", {"n": 2})
+        trabajos.encolar("prueba", {"n": 3}, retraso_seg=60)
+        trabajos.encolar("otro", {"n": 4})
+
+        lote = trabajos.tomar("w1", 5, ["prueba"])
+
+        self.assertEqual([t.id for t in lote], [primero.id, segundo.id])
+        primero.refresh_from_db()
+        self.assertEqual((primero.estado, primero.intentos, primero.tomado_por), (trabajos.EN_CURSO, 1, "w1"))
+        self.assertEqual(lote[0].intentos, 1)
+        self.assertEqual(trabajos.tomar("w2", 5, ["prueba"]), [])
+
+    def test_ejecutar_ok_guarda_resultado(self):
+        trabajos.encolar("prueba", {"n": 7})
+        t = self._tomar_uno()
+
+        self.assertTrue(trabajos.ejecutar(t))
+
+        t.refresh_from_db()
+        self.assertEqual((t.estado, t.resultado, t.error), (trabajos.HECHO, {"ok": 7}, None))
+
+    def test_error_reintenta_con_backoff_y_falla_en_el_ultimo_intento(self):
+        _efecto["error"] = RuntimeError("LLM caído")
+        trabajo = trabajos.encolar("prueba", max_intentos=2)
+
+        with mock.patch.object(trabajos.random, "uniform", return_value=1.0):
+            antes = timezone.now()
+            self.assertFalse(trabajos.ejecutar(self._tomar_uno()))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, trabajos.PENDIENTE)
+        self.assertEqual(trabajo.error, "LLM caído")
+        espera = (trabajo.disponible_en - antes).total_seconds()
+        self.assertTrue(9 <= espera <= 11, espera)
+        self.assertEqual(trabajos.tomar("w1", 1), [])
+
+        Trabajos.objects.filter(id=trabajo.id).update(disponible_en=timezone.now())
+        self.assertFalse(trabajos.ejecutar(self._tomar_uno()))
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (trabajos.FALLIDO, 2))
+        self.assertEqual(_efecto["ultimos"], [False, True])
+
+    def test_backoff_exponencial_con_tope(self):
+        with mock.patch.object(trabajos.random, "uniform", return_value=1.0):
+            self.assertEqual([trabajos._backoff(i) for i in (1, 2, 3, 4, 5)], [10, 20, 40, 60, 60])
+
+    def test_sin_reintento_falla_de_una(self):
+        _efecto["error"] = trabajos.SinReintento("no existe")
+        trabajo = trabajos.encolar("prueba")
+
+        self.assertFalse(trabajos.ejecutar(self._tomar_uno()))
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (trabajos.FALLIDO, 1))
+
+    def test_clave_un_solo_trabajo_activo(self):
+        a = trabajos.encolar("prueba", clave="prueba:1")
+        b = trabajos.encolar("prueba", clave="prueba:1")
+        self.assertEqual(a.id, b.id)
+
+        trabajos.ejecutar(self._tomar_uno())
+        c = trabajos.encolar("prueba", clave="prueba:1")
+
+        self.assertNotEqual(c.id, a.id)
+        self.assertEqual(Trabajos.objects.filter(clave="prueba:1").count(), 2)
+
+    def test_clave_carrera_devuelve_el_activo(self):
+        a = trabajos.encolar("prueba", clave="prueba:1")
+
+        # otro proceso lo creó entre la consulta y el INSERT
+        with mock.patch.object(trabajos, "_activo", side_effect=[None, a]):
+            b = trabajos.encolar("prueba", clave="prueba:1")
+
+        self.assertEqual(b.id, a.id)
+
+    def test_reintentar_fallido(self):
+        _efecto["error"] = trabajos.SinReintento("x")
+        trabajo = trabajos.encolar("prueba", clave="prueba:1")
+        trabajos.ejecutar(self._tomar_uno())
+
+        t = trabajos.reintentar(trabajo.id)
+
+        self.assertEqual((t.id, t.estado, t.intentos, t.error), (trabajo.id, trabajos.PENDIENTE, 0, None))
+        self.assertEqual(trabajos.reintentar(trabajo.id).estado, trabajos.PENDIENTE)
+
+    def test_reintentar_con_otro_activo_devuelve_el_activo(self):
+        _efecto["error"] = trabajos.SinReintento("x")
+        fallido = trabajos.encolar("prueba", clave="prueba:1")
+        trabajos.ejecutar(self._tomar_uno())
+        activo = trabajos.encolar("prueba", clave="prueba:1")
+
+        t = trabajos.reintentar(fallido.id)
+
+        self.assertEqual(t.id, activo.id)
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.estado, trabajos.FALLIDO)
+
+    def _vencer(self, trabajo):
+        Trabajos.objects.filter(id=trabajo.id).update(tomado_en=timezone.now() - timedelta(seconds=601))
+
+    def test_recuperar_vencidos_reencola(self):
+        trabajo = trabajos.encolar("prueba", max_intentos=3)
+        self._tomar_uno()
+        trabajos.recuperar_vencidos()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, trabajos.EN_CURSO)
+
+        self._vencer(trabajo)
+        self.assertEqual(trabajos.recuperar_vencidos(), 1)
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (trabajos.PENDIENTE, 1))
+
+    def test_vencido_en_el_ultimo_intento_se_ejecuta_como_ultimo(self):
+        trabajo = trabajos.encolar("prueba", max_intentos=1)
+        self._tomar_uno()
+        self._vencer(trabajo)
+
+        trabajos.recuperar_vencidos()
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, trabajos.PENDIENTE)
+        t = self._tomar_uno()
+        self.assertTrue(trabajos.ultimo_intento(t))
+        self.assertTrue(trabajos.ejecutar(t))
+        self.assertEqual(_efecto["ultimos"], [True])
+
+    def test_vencido_dos_veces_en_el_ultimo_intento_falla(self):
+        trabajo = trabajos.encolar("prueba", max_intentos=1)
+        for _ in range(2):
+            self._tomar_uno()
+            self._vencer(trabajo)
+            trabajos.recuperar_vencidos()
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.error), (trabajos.FALLIDO, trabajos.VENCIDO))
+
+
+class FirmasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        usuario = Usuarios.objects.create(
+            id=uuid.uuid4(), tipo="ciudadano", correo="firma@test.ec", password_hash="x",
+            activo=True, correo_verificado=True, created_at=now, updated_at=now,
+        )
+        cls.valor = "data:image/png;base64," + base64.b64encode(b"firma").decode()
+        cls.ciudadano = Ciudadanos.objects.create(
+            usuario=usuario, cedula="0500000003", nombres="Eva", apellidos="Mora",
+            firma_base64=cls.valor, firma_blob=firmas.guardar_firma_base64(cls.valor),
+            created_at=now, updated_at=now,
+        )
+
+    def test_base64_legado_segun_ajuste(self):
+        self.assertEqual(firmas.base64_legado(self.valor), self.valor)
+        with override_settings(FIRMAS_ESCRIBIR_BASE64=False):
+            self.assertIsNone(firmas.base64_legado(self.valor))
+
+    def test_vaciar_exige_apagar_la_escritura(self):
+        with self.assertRaises(CommandError):
+            call_command("vaciar_firmas_base64", stdout=io.StringIO())
+
+        with override_settings(FIRMAS_ESCRIBIR_BASE64=False):
+            call_command("vaciar_firmas_base64", stdout=io.StringIO())
+
+        self.ciudadano.refresh_from_db()
+        self.assertIsNone(self.ciudadano.firma_base64)
+        self.assertEqual(firmas.leer_firma(self.ciudadano), (b"firma", "image/png"))
@@ -0,0 +1,218 @@
+"""
+Cola de trabajos en la BD (tabla trabajos) para sacar del request lo lento
+(llamadas al LLM del panel web).
+
+- encolar() se llama dentro de la misma transacción que el cambio que origina
+  el trabajo: si el cambio no se confirma, el trabajo tampoco existe.
+- Los workers (`manage.py trabajos_worker`) toman lotes con
+  SELECT ... FOR UPDATE SKIP LOCKED y los marcan en_curso antes de soltar el
+  lock: varios workers no se pisan ni se esperan entre sí.
+- Si la tarea lanza una excepción se reintenta con backoff exponencial hasta
+  max_intentos y luego queda fallida (SinReintento la deja fallida de una).
+- Un trabajo en_curso cuyo worker murió vuelve a pendiente pasados
+  TRABAJOS_VISIBILIDAD_SEG. Si murió en el último intento se ejecuta una vez
+  más como último intento (para que la tarea deje su respaldo); si vuelve a
+  morir queda fallido.
+- clave: a lo sumo un trabajo activo por clave (restricción parcial única).
+"""
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from db.models import Trabajos
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+HECHO = "hecho"
+FALLIDO = "fallido"
+ACTIVOS = (PENDIENTE, EN_CURSO)
+
+VENCIDO = "worker sin respuesta"
+VENCIDO_ULTIMO = "worker sin respuesta (última ejecución)"
+
+
+class SinReintento(Exception):
+    """Error definitivo (p. ej. la denuncia ya no existe): no reintentar."""
+
+
+def _cfg(nombre: str, default):
+    return getattr(settings, nombre, default)
+
+
+def nombre_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# =========================================================
+# Registro de tareas
+# =========================================================
+_tareas = {}
+
+
+def tarea(tipo: str):
+    """Decorador: fn(payload, trabajo) -> dict (queda en trabajo.resultado)."""
+    def deco(fn):
+        _tareas[tipo] = fn
+        return fn
+    return deco
+
+
+def ultimo_intento(trabajo: Trabajos):
+    return trabajo.intentos >= trabajo.max_intentos
+
+
+# =========================================================
+# Encolar / consultar
+# =========================================================
+def _activo(clave):
+    return Trabajos.objects.filter(clave=clave, estado__in=ACTIVOS).first()
+
+
+def encolar(tipo: str, payload=None, clave=None, max_intentos=None, retraso_seg=0):
+    """Crea el trabajo; con clave, devuelve el activo existente en vez de duplicarlo."""
+    if clave:
+        existente = _activo(clave)
+        if existente is not None:
+            return existente
+
+    now = timezone.now()
+    try:
+        # savepoint: si choca la clave no se rompe la transacción del llamador
+        with transaction.atomic():
+            return Trabajos.objects.create(
+                tipo=tipo,
+                clave=clave,
+                payload=payload or {},
+                estado=PENDIENTE,
+                max_intentos=max_intentos or _cfg("TRABAJOS_MAX_INTENTOS", 5),
+                disponible_en=now + timedelta(seconds=retraso_seg),
+                created_at=now,
+                updated_at=now,
+            )
+    except IntegrityError:
+        existente = _activo(clave) if clave else None
+        if existente is None:
+            raise
+        return existente
+
+
+def estado(trabajo: Trabajos):
+    """Dict para el polling desde el panel."""
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "intentos": trabajo.intentos,
+        "max_intentos": trabajo.max_intentos,
+        "resultado": trabajo.resultado,
+        "error": trabajo.error,
+    }
+
+
+def reintentar(trabajo_id):
+    """Vuelve a encolar un trabajo fallido. Devuelve el trabajo activo para su clave."""
+    t = Trabajos.objects.get(id=trabajo_id)
+    if t.estado != FALLIDO:
+        return t
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            Trabajos.objects.filter(id=t.id, estado=FALLIDO).update(
+                estado=PENDIENTE, intentos=0, disponible_en=now, error=None, updated_at=now,
+            )
+    except IntegrityError:
+        # ya hay otro trabajo activo con la misma clave
+        return _activo(t.clave) or t
+    t.refresh_from_db()
+    return t
+
+
+# =========================================================
+# Worker
+# =========================================================
+def tomar(worker: str, n: int = 1, tipos=None):
+    """Toma hasta n trabajos disponibles y los marca en_curso (SKIP LOCKED)."""
+    now = timezone.now()
+    with transaction.atomic():
+        qs = Trabajos.objects.select_for_update(skip_locked=True).filter(estado=PENDIENTE, disponible_en__lte=now)
+        if tipos:
+            qs = qs.filter(tipo__in=tipos)
+        lote = list(qs.order_by("disponible_en", "id")[:n])
+        if not lote:
+            return []
+        Trabajos.objects.filter(id__in=[t.id for t in lote]).update(
+            estado=EN_CURSO, intentos=F("intentos") + 1, tomado_en=now, tomado_por=worker, updated_at=now,
+        )
+    for t in lote:
+        t.estado, t.intentos, t.tomado_en, t.tomado_por = EN_CURSO, t.intentos + 1, now, worker
+    return lote
+
+
+def _backoff(intentos: int):
+    base = _cfg("TRABAJOS_BACKOFF_BASE_SEG", 5)
+    tope = _cfg("TRABAJOS_BACKOFF_MAX_SEG", 300)
+    return min(tope, base * (2 ** (intentos - 1))) * random.uniform(0.8, 1.2)
+
+
+def _cerrar(trabajo: Trabajos, **campos):
+    # solo si sigue siendo nuestro (no lo recuperó otro worker por vencido)
+    campos["updated_at"] = timezone.now()
+    Trabajos.objects.filter(id=trabajo.id, estado=EN_CURSO, tomado_por=trabajo.tomado_por).update(**campos)
+    for k, v in campos.items():
+        setattr(trabajo, k, v)
+
+
+def ejecutar(trabajo: Trabajos):
+    """Corre la tarea y deja el trabajo hecho, pendiente (reintento) o fallido. True si terminó bien."""
+    fn = _tareas.get(trabajo.tipo)
+    try:
+        if fn is None:
+            raise SinReintento(f"tipo de trabajo desconocido: {trabajo.tipo}")
+        resultado = fn(trabajo.payload or {}, trabajo)
+    except Exception as e:
+        definitivo = isinstance(e, SinReintento) or ultimo_intento(trabajo)
+        logger.warning(
+            "trabajo id=%s tipo=%s intento=%s/%s error=%s%s", trabajo.id, trabajo.tipo,
+            trabajo.intentos, trabajo.max_intentos, e, " (fallido)" if definitivo else "",
+            exc_info=not isinstance(e, SinReintento),
+        )
+        if definitivo:
+            _cerrar(trabajo, estado=FALLIDO, error=str(e)[:2000])
+        else:
+            espera = _backoff(trabajo.intentos)
+            _cerrar(
+                trabajo, estado=PENDIENTE, error=str(e)[:2000],
+                disponible_en=timezone.now() + timedelta(seconds=espera),
+            )
+        return False
+
+    _cerrar(trabajo, estado=HECHO, resultado=resultado, error=None)
+    logger.info("trabajo id=%s tipo=%s hecho intento=%s", trabajo.id, trabajo.tipo, trabajo.intentos)
+    return True
+
+
+def recuperar_vencidos():
+    """Devuelve a pendiente los trabajos en_curso de workers que no respondieron."""
+    now = timezone.now()
+    limite = now - timedelta(seconds=_cfg("TRABAJOS_VISIBILIDAD_SEG", 600))
+    vencidos = Trabajos.objects.filter(estado=EN_CURSO, tomado_en__lt=limite)
+    n = vencidos.filter(intentos__lt=F("max_intentos")).update(
+        estado=PENDIENTE, disponible_en=now, error=VENCIDO, updated_at=now,
+    )
+    # murió en el último intento: una ejecución más, que tomar() vuelve a contar como la última
+    n += vencidos.exclude(error=VENCIDO_ULTIMO).update(
+        estado=PENDIENTE, intentos=F("max_intentos") - 1, disponible_en=now, error=VENCIDO_ULTIMO, updated_at=now,
+    )
+    n += vencidos.update(estado=FALLIDO, error=VENCIDO, updated_at=now)
+    if n:
+        logger.warning("trabajos recuperados por vencimiento: %s", n)
+    return n
@@ -10,13 +10,14 @@ from .views_borradores import (
     BorradoresUpdateDeleteView,
     BorradoresFinalizarManualView,
 )
-from .views import CrearDenunciaView, MisDenunciasView, MapaDenunciasView
+from .views import CrearDenunciaView, MisDenunciasView, MapaDenunciasView, SugerirTipoView
 
 urlpatterns = [
 
     path("", CrearDenunciaView.as_view(), name="crear_denuncia"),
     path("mias/", MisDenunciasView.as_view(), name="mis_denuncias"),
     path("mapa/", MapaDenunciasView.as_view(), name="denuncias_mapa"),
+    path("tipo-sugerido/", SugerirTipoView.as_view(), name="denuncias_tipo_sugerido"),
     path("borradores/", BorradoresCreateView.as_view(), name="borrador_create"),
     path("borradores/mios/", BorradoresMiosView.as_view(), name="borrador_mios"),
     path("borradores/<uuid:borrador_id>/",BorradoresUpdateDeleteView.as_view(),name="borrador_put_delete"),
@@ -40,3 +41,24 @@ urlpatterns += [
         name="borrador_subir_firma",
     ),
 ]
+
+from .views_subidas import (
+    BorradorPresignSubidaView,
+    BorradorConfirmarSubidaView,
+    subida_local,
+)
+
+# Subida directa al almacenamiento (S3 / MinIO) con URL prefirmada
+urlpatterns += [
+    path(
+        "borradores/<uuid:borrador_id>/subidas/presign/",
+        BorradorPresignSubidaView.as_view(),
+        name="borrador_subida_presign",
+    ),
+    path(
+        "borradores/<uuid:borrador_id>/subidas/confirmar/",
+        BorradorConfirmarSubidaView.as_view(),
+        name="borrador_subida_confirmar",
+    ),
+    path("subidas/local/<str:token>/", subida_local, name="subida_local"),
+]
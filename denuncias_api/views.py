@@ -8,6 +8,7 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from db.models import Denuncias, Ciudadanos
+from .clasificador import sugerir_tipo
 from .serializers import DenunciaCreateSerializer
 
 
@@ -55,17 +56,41 @@ class CrearDenunciaView(APIView):
             updated_at=now,
         )
 
+        # sugerencia del clasificador local (la app puede ofrecer corregir el tipo)
+        sugerido = sugerir_tipo(v["descripcion"])
+
         return Response(
             {
                 "id": str(denuncia.id),
                 "estado": str(denuncia.estado),
                 "asignado_departamento_id": getattr(denuncia, "asignado_departamento_id", None),
                 "created_at": denuncia.created_at,
+                "tipo_sugerido": sugerido,
             },
             status=status.HTTP_201_CREATED
         )
 
 
+class SugerirTipoView(APIView):
+    """
+    POST /api/denuncias/tipo-sugerido/
+    json: { "descripcion": "..." }
+    Sugerencia del clasificador local mientras el ciudadano escribe, antes de enviar.
+    tipo_sugerido es null si no hay modelo, el texto es corto o la confianza es baja.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if get_claim(request, "tipo") != "ciudadano":
+            return Response({"detail": "Solo ciudadanos"}, status=403)
+
+        descripcion = (request.data.get("descripcion") or "").strip()
+        if not descripcion:
+            return Response({"detail": "descripcion es obligatoria"}, status=400)
+
+        return Response({"tipo_sugerido": sugerir_tipo(descripcion[:2000])}, status=200)
+
+
 class MisDenunciasView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -16,7 +16,12 @@ from .serializers_borradores import (
     DenunciaBorradorUpdateSerializer,
 )
 
-from db.models import DenunciaEvidencias, DenunciaFirmas
+from db.models import DenunciaEvidencias, DenunciaFirmas, EvidenciaBlobs
+
+from .media_storage import liberar_evidencias
+from .derivados import derivados_de_blob, url_media
+from .media_urls import url_firmada
+from .firmas import base64_legado, guardar_firma_base64
 
 # =========================
 # Helpers
@@ -79,28 +84,37 @@ def finalize_borrador_to_denuncia(b: DenunciaBorradores):
     )
         # ===== firma =====
     firma_url = data.get("firma_url")
-    firma_base64 = data.get("firma_base64")  # por si luego usas base64
+    # base64 -> tabla firma_blobs; firma_base64 solo mientras FIRMAS_ESCRIBIR_BASE64 (ver firmas.py)
+    firma_blob = guardar_firma_base64(data.get("firma_base64"))
 
-    if firma_url or firma_base64:
+    if firma_url or firma_blob:
         DenunciaFirmas.objects.create(
             id=uuid.uuid4(),
             denuncia_id=denuncia.id,
             firma_url=firma_url,
-            firma_base64=firma_base64,
+            firma_base64=base64_legado(data.get("firma_base64")) if firma_blob else None,
+            firma_blob=firma_blob,
             created_at=now,
             updated_at=now,
         )
 
     # ===== evidencias =====
     evidencias = data.get("evidencias") or []
+    shas = {ev.get("sha256") for ev in evidencias if ev.get("sha256")}
+    blobs = set(EvidenciaBlobs.objects.filter(sha256__in=shas).values_list("sha256", flat=True)) if shas else set()
     for ev in evidencias:
+        # si el derivado terminó después de la subida, lo tomamos del índice
+        deriv = {} if ev.get("url_thumb") else derivados_de_blob(ev.get("sha256"))
         try:
             DenunciaEvidencias.objects.create(
                 id=uuid.uuid4(),
                 denuncia_id=denuncia.id,
                 tipo=(ev.get("tipo") or "foto"),
                 url_archivo=(ev.get("url_archivo") or ""),
+                url_thumb=ev.get("url_thumb") or deriv.get("url_thumb"),
+                url_medium=ev.get("url_medium") or deriv.get("url_medium"),
                 nombre_archivo=ev.get("nombre_archivo"),
+                blob_id=ev.get("sha256") if ev.get("sha256") in blobs else None,
                 created_at=now,
                 updated_at=now,
             )
@@ -122,6 +136,33 @@ def finalize_borrador_to_denuncia(b: DenunciaBorradores):
     return denuncia
 
 
+def _completar_derivados(request, evidencias):
+    # una sola consulta para los thumbnails que terminaron después de la subida
+    pendientes = [ev for ev in evidencias if ev.get("sha256") and not ev.get("url_thumb")]
+    if not pendientes:
+        return
+    blobs = {
+        x.sha256: x
+        for x in EvidenciaBlobs.objects.filter(
+            sha256__in=[ev["sha256"] for ev in pendientes], ruta_thumb__isnull=False
+        ).only("sha256", "ruta_thumb", "ruta_medium")
+    }
+    for ev in pendientes:
+        blob = blobs.get(ev["sha256"])
+        if blob:
+            ev["url_thumb"] = request.build_absolute_uri(url_media(blob.ruta_thumb))
+            ev["url_medium"] = request.build_absolute_uri(url_media(blob.ruta_medium))
+
+
+def _firmar_urls(data):
+    # firma y evidencias fuera de cas/ se cargan en <img> sin Authorization (solo en la respuesta)
+    if data.get("firma_url"):
+        data["firma_url"] = url_firmada(data["firma_url"])
+    for ev in data.get("evidencias") or []:
+        if ev.get("url_archivo"):
+            ev["url_archivo"] = url_firmada(ev["url_archivo"])
+
+
 # =========================
 # Views
 # =========================
@@ -220,6 +261,7 @@ class BorradoresUpdateDeleteView(APIView):
         if borrador_expirado(b):
             return Response({"detail": "Borrador expirado: ya no se puede eliminar"}, status=409)
 
+        liberar_evidencias(b.datos_json)
         b.delete()
         return Response({"detail": "Borrador eliminado"}, status=200)
 
@@ -252,6 +294,8 @@ class BorradoresMiosView(APIView):
                 continue
 
             data = b.datos_json or {}
+            _completar_derivados(request, data.get("evidencias") or [])
+            _firmar_urls(data)
             borradores.append({
                 "id": str(b.id),
                 "expira_en_seg": seconds_left(b),
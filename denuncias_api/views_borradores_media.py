@@ -1,7 +1,6 @@
 import uuid
 from django.conf import settings
 from django.utils import timezone
-from django.core.files.storage import default_storage
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -11,6 +10,11 @@ from rest_framework.parsers import MultiPartParser, FormParser
 
 from db.models import DenunciaBorradores
 
+from .almacenamiento import get_backend
+from .media_storage import guardar_blob, sha256_archivo
+from .derivados import derivados_evidencia
+from .media_urls import url_firmada
+
 # mismo helper que ya usas
 def get_claim(request, key: str, default=None):
     token = getattr(request, "auth", None)
@@ -58,22 +62,42 @@ class BorradorSubirEvidenciaView(APIView):
             ct = (getattr(archivo, "content_type", "") or "").lower()
             tipo = "video" if ct.startswith("video/") else "foto"
 
-        # Guardar en MEDIA
-        folder = f"denuncias/borradores/{borrador_id}/"
-        safe_name = f"{uuid.uuid4()}_{archivo.name}"
-        path = default_storage.save(folder + safe_name, archivo)
-
-        url = settings.MEDIA_URL + path  # relativa
-        url_abs = _build_abs(request, url)
+        sha = sha256_archivo(archivo)
 
         data = b.datos_json or {}
         evids = data.get("evidencias") or []
-        evids.append({
+
+        # re-intento del mismo archivo en el mismo borrador: no duplicamos
+        previa = next((e for e in evids if e.get("sha256") == sha), None)
+        if previa:
+            return Response(
+                {
+                    "detail": "Evidencia ya subida",
+                    "url_archivo": previa.get("url_archivo"),
+                    "tipo": previa.get("tipo"),
+                    "total": len(evids),
+                },
+                status=200
+            )
+
+        # Guardar por contenido en el backend (si ya existe, solo suma referencia)
+        blob, _ = guardar_blob(archivo, sha=sha)
+
+        url = settings.MEDIA_URL + blob.ruta  # relativa
+        url_abs = _build_abs(request, url)
+
+        ev = {
             "tipo": tipo,
             "url_archivo": url_abs,
             "nombre_archivo": archivo.name,
+            "sha256": sha,
             "subido_en": timezone.now().isoformat(),
-        })
+        }
+        if tipo == "foto":
+            # thumbnail/medium: los ya generados o se encolan en segundo plano
+            for k, v in derivados_evidencia(blob).items():
+                ev[k] = _build_abs(request, v)
+        evids.append(ev)
         data["evidencias"] = evids
 
         b.datos_json = data
@@ -117,7 +141,7 @@ class BorradorSubirFirmaView(APIView):
 
         folder = f"denuncias/borradores/{borrador_id}/"
         safe_name = f"firma_{uuid.uuid4()}.png"
-        path = default_storage.save(folder + safe_name, firma)
+        path = get_backend().guardar(folder + safe_name, firma)
 
         url = settings.MEDIA_URL + path
         url_abs = _build_abs(request, url)
@@ -130,6 +154,6 @@ class BorradorSubirFirmaView(APIView):
         b.save(update_fields=["datos_json", "updated_at"])
 
         return Response(
-            {"detail": "Firma subida", "firma_url": url_abs},
+            {"detail": "Firma subida", "firma_url": url_firmada(url_abs)},
             status=201
         )
@@ -0,0 +1,226 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from db.models import CiudadanoDocumentos, DenunciaBorradores, DenunciaEvidencias, DenunciaFirmas, Funcionarios
+from usuarios_api.authentication import UsuariosJWTAuthentication
+
+from .almacenamiento import get_backend
+from .media_urls import PARAM, PUBLICAS, firma_valida, ruta_de_url
+
+
+# =========================
+# Servir MEDIA (evidencias, firmas, cédulas)
+# =========================
+# Archivos direccionados por contenido: el nombre ES el hash, nunca cambian.
+INMUTABLES = PUBLICAS
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_PRIVADO = "private, max-age=0, must-revalidate"
+CHUNK = 64 * 1024
+
+_re_range = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _es_inmutable(ruta: str):
+    return ruta.startswith(INMUTABLES)
+
+
+def _jwt_uid(request):
+    try:
+        r = UsuariosJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None, None
+    if not r:
+        return None, None
+    _, token = r
+    return token.get("uid"), token.get("tipo")
+
+
+def _puede_ver(request, ruta: str):
+    """
+    - cas/ y derivados/: nombre = SHA-256 (no adivinable), se sirven como antes sin login.
+    - resto (cédulas, firmas): URL firmada (?firma=, para <img>), funcionario/staff
+      con sesión web o el ciudadano dueño (JWT).
+    """
+    if _es_inmutable(ruta):
+        return True
+
+    if firma_valida(ruta, request.GET.get(PARAM)):
+        return True
+
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        if user.is_staff or Funcionarios.objects.filter(web_user=user).exists():
+            return True
+
+    uid, tipo = _jwt_uid(request)
+    if not uid or tipo != "ciudadano":
+        return False
+
+    # denuncias/borradores/<borrador_id>/...
+    partes = ruta.split("/")
+    if len(partes) >= 4 and partes[0] == "denuncias" and partes[1] == "borradores":
+        if DenunciaBorradores.objects.filter(id=partes[2], ciudadano_id=uid).exists():
+            return True
+        if DenunciaFirmas.objects.filter(firma_url__endswith=ruta, denuncia__ciudadano_id=uid).exists():
+            return True
+        return DenunciaEvidencias.objects.filter(url_archivo__endswith=ruta, denuncia__ciudadano_id=uid).exists()
+
+    # registros/<registro_uid>/...: cédula del propio ciudadano (pocas filas, se compara ya decodificada)
+    if partes[0] == "registros":
+        docs = CiudadanoDocumentos.objects.filter(ciudadano_id=uid).values_list("url_frontal", "url_trasera")
+        return any(ruta in (ruta_de_url(f), ruta_de_url(t)) for f, t in docs)
+
+    return False
+
+
+def _etag(ruta: str, st):
+    if _es_inmutable(ruta):
+        return '"%s"' % os.path.splitext(os.path.basename(ruta))[0]
+    return '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+
+
+def _no_modificado(request, etag: str, mtime: float):
+    inm = request.headers.get("If-None-Match")
+    if inm is not None:
+        return inm.strip() == "*" or etag in [x.strip() for x in inm.split(",")]
+    ims = parse_http_date_safe(request.headers.get("If-Modified-Since") or "")
+    return ims is not None and int(mtime) <= ims
+
+
+def _parse_range(header: str, size: int):
+    """
+    Devuelve (inicio, fin) inclusivo, None si no aplica (se sirve completo)
+    o "invalido" si el rango no es satisfacible. Solo un rango (lo que piden los reproductores).
+    """
+    m = _re_range.match((header or "").strip())
+    if not m:
+        return None
+    a, b = m.group(1), m.group(2)
+    if a == "" and b == "":
+        return None
+    if a == "":
+        largo = int(b)
+        if largo == 0:
+            return "invalido"
+        return max(0, size - largo), size - 1
+    inicio = int(a)
+    fin = int(b) if b else size - 1
+    if inicio >= size or fin < inicio:
+        return "invalido"
+    return inicio, min(fin, size - 1)
+
+
+def _leer_rango(path: str, inicio: int, largo: int):
+    with open(path, "rb") as f:
+        f.seek(inicio)
+        restante = largo
+        while restante > 0:
+            data = f.read(min(CHUNK, restante))
+            if not data:
+                break
+            restante -= len(data)
+            yield data
+
+
+def _cabeceras(resp, ruta: str, etag: str, st, content_type: str):
+    resp["Content-Type"] = content_type
+    resp["ETag"] = etag
+    resp["Last-Modified"] = http_date(st.st_mtime)
+    resp["Accept-Ranges"] = "bytes"
+    resp["Cache-Control"] = CACHE_INMUTABLE if _es_inmutable(ruta) else CACHE_PRIVADO
+    return resp
+
+
+@require_safe
+def servir_media(request, ruta):
+    """
+    GET/HEAD /media/<ruta>
+    Autoriza en Django y delega los bytes al proxy (X-Accel-Redirect / X-Sendfile)
+    según MEDIA_SERVE_MODE; si no hay proxy, sirve en Python con Range y 304.
+    """
+    try:
+        path = safe_join(str(settings.MEDIA_ROOT), ruta)
+    except SuspiciousFileOperation:
+        raise Http404("Archivo no existe")
+
+    if not _puede_ver(request, ruta):
+        # 404 y no 403: no revelamos qué archivos existen
+        raise Http404("Archivo no existe")
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        # subido directo al bucket: redirigimos a una URL prefirmada de corta duración
+        url = get_backend().url_descarga(ruta)
+        if not url:
+            raise Http404("Archivo no existe")
+        resp = HttpResponseRedirect(url)
+        resp["Cache-Control"] = "private, max-age=60"
+        return resp
+    if not os.path.isfile(path):
+        raise Http404("Archivo no existe")
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    etag = _etag(ruta, st)
+
+    if _no_modificado(request, etag, st.st_mtime):
+        resp = HttpResponseNotModified()
+        resp["ETag"] = etag
+        resp["Cache-Control"] = CACHE_INMUTABLE if _es_inmutable(ruta) else CACHE_PRIVADO
+        return resp
+
+    modo = getattr(settings, "MEDIA_SERVE_MODE", "python")
+    if modo == "nginx":
+        # location interna en nginx, p.ej.:  location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+        resp = HttpResponse()
+        # nginx decodifica la URI interna: nombres con tildes o espacios van codificados
+        resp["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(ruta)
+        return _cabeceras(resp, ruta, etag, st, content_type)
+    if modo == "sendfile":
+        # Apache mod_xsendfile / lighttpd
+        resp = HttpResponse()
+        resp["X-Sendfile"] = path
+        return _cabeceras(resp, ruta, etag, st, content_type)
+
+    # ===== fallback Python =====
+    rango = None
+    if_range = request.headers.get("If-Range")
+    if "Range" in request.headers and (if_range is None or if_range.strip() == etag):
+        rango = _parse_range(request.headers["Range"], st.st_size)
+
+    if rango == "invalido":
+        resp = HttpResponse(status=416)
+        resp["Content-Range"] = f"bytes */{st.st_size}"
+        return resp
+
+    if rango:
+        inicio, fin = rango
+        largo = fin - inicio + 1
+        if request.method == "HEAD":
+            resp = HttpResponse(status=206)
+        else:
+            resp = StreamingHttpResponse(_leer_rango(path, inicio, largo), status=206)
+        resp["Content-Range"] = f"bytes {inicio}-{fin}/{st.st_size}"
+        resp["Content-Length"] = str(largo)
+        return _cabeceras(resp, ruta, etag, st, content_type)
+
+    if request.method == "HEAD":
+        resp = HttpResponse()
+        resp["Content-Length"] = str(st.st_size)
+    else:
+        # FileResponse usa wsgi.file_wrapper (sendfile del servidor) cuando existe
+        resp = FileResponse(open(path, "rb"))
+    return _cabeceras(resp, ruta, etag, st, content_type)
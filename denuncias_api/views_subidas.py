@@ -0,0 +1,236 @@
+import hashlib
+import re
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+
+from db.models import DenunciaBorradores, EvidenciaBlobs
+
+from .almacenamiento import get_backend, leer_token_subida
+from .derivados import derivados_evidencia
+from .media_storage import registrar_blob, ruta_blob
+from .media_urls import url_firmada
+
+
+def get_claim(request, key: str, default=None):
+    token = getattr(request, "auth", None)
+    if token is None:
+        return default
+    try:
+        return token.get(key, default)
+    except Exception:
+        return default
+
+
+_re_sha256 = re.compile(r"^[0-9a-f]{64}$")
+DESTINOS = ("evidencia", "firma")
+
+
+def _max_bytes():
+    return settings.SUBIDA_MAX_MB * 1024 * 1024
+
+
+def _get_borrador(request, borrador_id):
+    uid = get_claim(request, "uid")
+    tipo_user = get_claim(request, "tipo")
+    if not uid or tipo_user != "ciudadano":
+        return None, Response({"detail": "Solo ciudadanos"}, status=403)
+    b = DenunciaBorradores.objects.filter(id=borrador_id, ciudadano_id=uid).first()
+    if not b:
+        return None, Response({"detail": "Borrador no existe"}, status=404)
+    return b, None
+
+
+class BorradorPresignSubidaView(APIView):
+    """
+    POST /api/denuncias/borradores/<id>/subidas/presign/
+    json:
+      - destino: "evidencia" | "firma"
+      - nombre_archivo, content_type (required)
+      - sha256 (required para evidencia): la evidencia se guarda por contenido (EvidenciaBlobs,
+        derivados y GC como en la subida multipart) y el almacenamiento verifica el hash en el PUT;
+        si ya existe ese contenido no hace falta subirlo
+      - tamano (optional, bytes)
+    La app hace PUT a upload_url con los headers devueltos y luego llama a /confirmar/.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, borrador_id):
+        b, err = _get_borrador(request, borrador_id)
+        if err:
+            return err
+
+        backend = get_backend()
+        destino = (request.data.get("destino") or "evidencia").strip().lower()
+        nombre = (request.data.get("nombre_archivo") or "").strip()
+        content_type = (request.data.get("content_type") or "").strip().lower()
+        sha = (request.data.get("sha256") or "").strip().lower()
+
+        if destino not in DESTINOS:
+            return Response({"detail": "destino inválido"}, status=400)
+        if not nombre or not content_type:
+            return Response({"detail": "nombre_archivo y content_type son obligatorios"}, status=400)
+        if sha and not _re_sha256.match(sha):
+            return Response({"detail": "sha256 inválido"}, status=400)
+        if destino == "evidencia" and not sha:
+            return Response({"detail": "sha256 es obligatorio para evidencias"}, status=400)
+        try:
+            if int(request.data.get("tamano") or 0) > _max_bytes():
+                return Response({"detail": f"Archivo supera {settings.SUBIDA_MAX_MB} MB"}, status=413)
+        except (TypeError, ValueError):
+            return Response({"detail": "tamano inválido"}, status=400)
+
+        if destino == "evidencia":
+            blob = EvidenciaBlobs.objects.filter(sha256=sha).only("ruta").first()
+            if blob and backend.existe(blob.ruta):
+                # mismo contenido ya almacenado: solo hay que confirmar (sin PUT)
+                return Response({"ya_existe": True, "key": blob.ruta}, status=200)
+            key = ruta_blob(sha, nombre)
+        else:
+            key = f"denuncias/borradores/{b.id}/firma_{uuid.uuid4()}.png"
+
+        url, headers = backend.url_subida(key, content_type, sha256=sha or None)
+        return Response(
+            {
+                "ya_existe": False,
+                "key": key,
+                "upload_url": request.build_absolute_uri(url),
+                "metodo": "PUT",
+                "headers": headers,
+                "expira_en_seg": settings.S3_PRESIGN_EXPIRA_SEG,
+            },
+            status=200
+        )
+
+
+class BorradorConfirmarSubidaView(APIView):
+    """
+    POST /api/denuncias/borradores/<id>/subidas/confirmar/
+    json:
+      - destino: "evidencia" | "firma"
+      - key (la devuelta por /presign/)
+      - sha256 (evidencia: el mismo de /presign/)
+      - tipo: "foto" | "video" (optional), nombre_archivo (optional)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, borrador_id):
+        b, err = _get_borrador(request, borrador_id)
+        if err:
+            return err
+
+        destino = (request.data.get("destino") or "evidencia").strip().lower()
+        key = (request.data.get("key") or "").strip()
+        sha = (request.data.get("sha256") or "").strip().lower()
+        nombre = (request.data.get("nombre_archivo") or "").strip() or None
+
+        if destino not in DESTINOS or not key:
+            return Response({"detail": "destino y key son obligatorios"}, status=400)
+
+        # firma: key de este borrador; evidencia: del almacén por contenido con ese hash
+        if destino == "firma":
+            valida = key.startswith(f"denuncias/borradores/{b.id}/")
+        else:
+            valida = bool(_re_sha256.match(sha)) and key.startswith(ruta_blob(sha))
+        if not valida:
+            return Response({"detail": "key inválida"}, status=400)
+
+        info = get_backend().info(key)
+        if not info:
+            return Response({"detail": "El archivo no llegó al almacenamiento"}, status=409)
+        if info["tamano"] > _max_bytes():
+            return Response({"detail": f"Archivo supera {settings.SUBIDA_MAX_MB} MB"}, status=413)
+
+        url_abs = request.build_absolute_uri(settings.MEDIA_URL + key)
+        data = b.datos_json or {}
+
+        if destino == "firma":
+            data["firma_url"] = url_abs
+            b.datos_json = data
+            b.updated_at = timezone.now()
+            b.save(update_fields=["datos_json", "updated_at"])
+            return Response({"detail": "Firma subida", "firma_url": url_firmada(url_abs)}, status=201)
+
+        evids = data.get("evidencias") or []
+        previa = next((e for e in evids if e.get("sha256") == sha), None)
+        if previa:
+            return Response(
+                {"detail": "Evidencia ya subida", "url_archivo": previa.get("url_archivo"), "total": len(evids)},
+                status=200
+            )
+        blob = registrar_blob(sha, key, info["tamano"], info.get("content_type"))
+
+        tipo = (request.data.get("tipo") or "").strip().lower()
+        if tipo not in ("foto", "video"):
+            tipo = "video" if (info.get("content_type") or "").startswith("video/") else "foto"
+
+        ev = {
+            "tipo": tipo,
+            "url_archivo": url_abs,
+            "nombre_archivo": nombre,
+            "subido_en": timezone.now().isoformat(),
+            "sha256": sha,
+        }
+        if tipo == "foto":
+            # thumbnail/medium como en la subida multipart
+            for k, v in derivados_evidencia(blob).items():
+                ev[k] = request.build_absolute_uri(v)
+        evids.append(ev)
+        data["evidencias"] = evids
+
+        b.datos_json = data
+        b.updated_at = timezone.now()
+        b.save(update_fields=["datos_json", "updated_at"])
+
+        return Response(
+            {"detail": "Evidencia subida", "url_archivo": url_firmada(url_abs), "tipo": tipo, "total": len(evids)},
+            status=201
+        )
+
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def subida_local(request, token):
+    """
+    PUT /api/denuncias/subidas/local/<token>/
+    Destino de upload_url con el backend local: la URL firmada hace de credencial
+    (como el PUT prefirmado de S3). Si se declaró sha256 en /presign/ el contenido debe coincidir.
+    """
+    datos = leer_token_subida(token)
+    if not datos:
+        return JsonResponse({"detail": "URL de subida inválida o vencida"}, status=403)
+    try:
+        if int(request.META.get("CONTENT_LENGTH") or 0) > _max_bytes():
+            return JsonResponse({"detail": f"Archivo supera {settings.SUBIDA_MAX_MB} MB"}, status=413)
+    except ValueError:
+        return JsonResponse({"detail": "Content-Length inválido"}, status=400)
+
+    backend = get_backend()
+    with tempfile.TemporaryFile() as tmp:
+        h = hashlib.sha256()
+        tamano = 0
+        for chunk in iter(lambda: request.read(64 * 1024), b""):
+            tamano += len(chunk)
+            if tamano > _max_bytes():
+                return JsonResponse({"detail": f"Archivo supera {settings.SUBIDA_MAX_MB} MB"}, status=413)
+            h.update(chunk)
+            tmp.write(chunk)
+        if datos.get("sha") and h.hexdigest() != datos["sha"]:
+            return JsonResponse({"detail": "El contenido no coincide con el sha256 declarado"}, status=400)
+
+        if backend.existe(datos["key"]):
+            # re-intento del mismo PUT: la key es única (uuid o hash del contenido)
+            return HttpResponse(status=200)
+        tmp.seek(0)
+        backend.guardar(datos["key"], File(tmp, name=datos["key"]), content_type=datos.get("ct"))
+    return HttpResponse(status=200)
@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     LoginView,
     RegisterPaso1View, RegisterEnviarCodigoView, RegisterVerificarCodigoView,
-    RegisterFechaView, RegisterDocumentosView, RegisterFinalizarView
+    RegisterFechaView, RegisterDocumentosView, RegisterFinalizarView,
+    RegisterDocumentosPresignView, RegisterDocumentosConfirmarView,
 )
 from .views_password_reset import (ResetEnviarCodigoView,ResetVerificarCodigoView,ResetCambiarPasswordView)
 from .views_perfil import PerfilView
@@ -15,6 +16,8 @@ urlpatterns = [
     path("register/paso2/verificar-codigo/", RegisterVerificarCodigoView.as_view()),
     path("register/paso3/fecha/", RegisterFechaView.as_view()),
     path("register/paso4/documentos/", RegisterDocumentosView.as_view()),
+    path("register/paso4/documentos/presign/", RegisterDocumentosPresignView.as_view()),
+    path("register/paso4/documentos/confirmar/", RegisterDocumentosConfirmarView.as_view()),
     path("register/paso5/finalizar/", RegisterFinalizarView.as_view()),
     path("password-reset/paso1/enviar-codigo/", ResetEnviarCodigoView.as_view()),
     path("password-reset/paso2/verificar-codigo/", ResetVerificarCodigoView.as_view()),
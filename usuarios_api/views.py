@@ -7,7 +7,6 @@ from datetime import timedelta
 from django.utils import timezone
 from django.db import transaction
 from django.conf import settings
-from django.core.files.storage import default_storage
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -17,6 +16,8 @@ from rest_framework.permissions import AllowAny
 import bcrypt
 
 from db.models import Usuarios, Ciudadanos, CiudadanoDocumentos
+from denuncias_api.almacenamiento import get_backend, key_subida
+from denuncias_api.media_urls import url_firmada
 from .models import RegistroCiudadanoBorrador
 
 # Create your views here.
@@ -228,10 +229,11 @@ class RegisterDocumentosView(APIView):
         if not frontal or not trasera:
             return Response({"detail": "Debes enviar cedula_frontal y cedula_trasera"}, status=400)
 
-        # Guarda archivos en MEDIA (local)
+        # Guarda archivos en el backend de almacenamiento (MEDIA local o bucket)
         folder = f"registros/{uid}/"
-        frontal_path = default_storage.save(folder + frontal.name, frontal)
-        trasera_path = default_storage.save(folder + trasera.name, trasera)
+        backend = get_backend()
+        frontal_path = backend.guardar(folder + frontal.name, frontal)
+        trasera_path = backend.guardar(folder + trasera.name, trasera)
 
         # URLs absolutas para Flutter
         frontal_url = request.build_absolute_uri(settings.MEDIA_URL + frontal_path)
@@ -241,7 +243,77 @@ class RegisterDocumentosView(APIView):
         borrador.cedula_trasera_url = trasera_url
         borrador.save()
 
-        return Response({"detail": "Documentos guardados", "url_frontal": frontal_url, "url_trasera": trasera_url}, status=200)
+        # firmadas: la app las muestra en <img> antes de tener sesión
+        return Response(
+            {"detail": "Documentos guardados", "url_frontal": url_firmada(frontal_url), "url_trasera": url_firmada(trasera_url)},
+            status=200
+        )
+
+
+class RegisterDocumentosPresignView(APIView):
+    """
+    Subida directa de la cédula al bucket (S3 / MinIO).
+    json: uid, lado ("frontal" | "trasera"), nombre_archivo, content_type
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        uid = (request.data.get("uid") or "").strip()
+        lado = (request.data.get("lado") or "").strip().lower()
+        nombre = (request.data.get("nombre_archivo") or "").strip()
+        content_type = (request.data.get("content_type") or "").strip().lower()
+
+        if not uid or lado not in ("frontal", "trasera") or not nombre or not content_type:
+            return Response({"detail": "uid, lado, nombre_archivo y content_type son obligatorios"}, status=400)
+
+        if not RegistroCiudadanoBorrador.objects.filter(id=uid).exists():
+            return Response({"detail": "uid inválido"}, status=404)
+
+        key = key_subida(f"registros/{uid}/{lado}_", nombre, uuid.uuid4())
+        url, headers = get_backend().url_subida(key, content_type)
+
+        return Response(
+            {"key": key, "upload_url": request.build_absolute_uri(url), "metodo": "PUT", "headers": headers, "expira_en_seg": settings.S3_PRESIGN_EXPIRA_SEG},
+            status=200
+        )
+
+
+class RegisterDocumentosConfirmarView(APIView):
+    """
+    json: uid, lado ("frontal" | "trasera"), key (la devuelta por presign)
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        uid = (request.data.get("uid") or "").strip()
+        lado = (request.data.get("lado") or "").strip().lower()
+        key = (request.data.get("key") or "").strip()
+
+        if not uid or lado not in ("frontal", "trasera") or not key:
+            return Response({"detail": "uid, lado y key son obligatorios"}, status=400)
+
+        try:
+            borrador = RegistroCiudadanoBorrador.objects.get(id=uid)
+        except RegistroCiudadanoBorrador.DoesNotExist:
+            return Response({"detail": "uid inválido"}, status=404)
+
+        if not key.startswith(f"registros/{uid}/{lado}_"):
+            return Response({"detail": "key inválida"}, status=400)
+
+        info = get_backend().info(key)
+        if not info:
+            return Response({"detail": "El archivo no llegó al almacenamiento"}, status=409)
+        if info["tamano"] > settings.SUBIDA_MAX_MB * 1024 * 1024:
+            return Response({"detail": f"Archivo supera {settings.SUBIDA_MAX_MB} MB"}, status=413)
+
+        url = request.build_absolute_uri(settings.MEDIA_URL + key)
+        if lado == "frontal":
+            borrador.cedula_frontal_url = url
+        else:
+            borrador.cedula_trasera_url = url
+        borrador.save()
+
+        return Response({"detail": "Documento guardado", f"url_{lado}": url_firmada(url)}, status=200)
 
 
 class RegisterFinalizarView(APIView):
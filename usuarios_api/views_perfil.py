@@ -49,6 +49,7 @@ class PerfilView(APIView):
             # opcional útil para frontend (si quieres)
             "cedula": c.cedula if c else None,
             "foto_perfil_url": c.foto_perfil_url if c else None,
+            "foto_perfil_thumb_url": (c.foto_perfil_thumb_url or c.foto_perfil_url) if c else None,
         }
 
         return Response(data, status=200)
@@ -18,6 +18,9 @@ urlpatterns = [
     path('api/user-data/<int:user_id>/', get_user_data_ajax, name='get_user_data'),
     path('api/generate-llm-response/<int:denuncia_id>/',llm_response , name='generate_llm_response'),
     path('resolver-denuncia/<int:denuncia_id>/', resolver_denuncia, name='resolver_denuncia'),
+    path('api/trabajos/<int:trabajo_id>/', trabajo_estado, name='trabajo_estado'),
+    path('api/trabajos/<int:trabajo_id>/reintentar/', trabajo_reintentar, name='trabajo_reintentar'),
+    path('uso-llm/', uso_llm_view, name='uso_llm'),
 
     path('funcionarios/', FuncionariosListView.as_view(), name='funcionario_list'),
     path('funcionarios/create/', FuncionariosCreateView.as_view(), name='funcionario_create'),
@@ -58,6 +61,8 @@ urlpatterns = [
     path('denuncias/mis-denuncias/', MisDenunciasListView.as_view(), name='mis_denuncias'),
     path('denuncias/<int:pk>/', DenunciaDetailView.as_view(), name='denuncia_detail'),
     path('denuncias/<int:pk>/respuestas/create/', crear_respuesta_denuncia, name='denuncia_respuesta_create'),
+    path('denuncias/<int:pk>/firma/', denuncia_firma_imagen, name='denuncia_firma'),
+    path('ciudadanos/<uuid:pk>/firma/', ciudadano_firma_imagen, name='ciudadano_firma'),
     path('denuncias/<int:pk>/update/', DenunciaUpdateView.as_view(), name='denuncia_update'),
     path('denuncias/<int:pk>/delete/', DenunciaDeleteView.as_view(), name='denuncia_delete'),
 
@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.views import LoginView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.models import Group
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -15,12 +15,17 @@ from django.utils import timezone
 from .forms import *
 from django.contrib.auth.decorators import login_required, permission_required
 from .forms import CrudMessageMixin
-from openai import OpenAI
 from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
 from chartkick.django import PieChart, BarChart, ColumnChart, LineChart
 
+from chatbot_api import uso_llm
+from denuncias_api import resumen_ia, tareas_ia, trabajos
+from denuncias_api.firmas import leer_firma
+
 api_key = getattr(settings, 'OPENAI_API_KEY', None)
-client = OpenAI(api_key=api_key)
 
 def get_uuid():
     """Genera un UUID4 como cadena"""
@@ -276,7 +281,7 @@ def dashboard_view(request):
     # Denuncias con coordenadas para el mapa
     denuncias_mapa = denuncias_qs.select_related(
         'ciudadano', 'tipo_denuncia', 'asignado_departamento'
-    )[:100]  # Limitar a 100 para rendimiento
+    ).defer('ciudadano__firma_base64')[:100]  # Limitar a 100 para rendimiento
     
     context = {
         'total_denuncias': total_denuncias,
@@ -485,7 +490,7 @@ class DenunciaListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
 
         qs = Denuncias.objects.select_related(
             'ciudadano', 'tipo_denuncia', 'asignado_departamento', 'asignado_funcionario'
-        )
+        ).defer('ciudadano__firma_base64')
 
         funcionario = Funcionarios.objects.filter(web_user=self.request.user).first()
 
@@ -559,9 +564,16 @@ class DenunciaDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView
     permission_required = 'db.view_denuncias'
     login_url = 'web:login'
 
+    def get_queryset(self):
+        # trae el resumen IA guardado en la misma consulta
+        return resumen_ia.con_resumen()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         denuncia = self.object
+
+        # resumen IA vigente (pregenerado de noche o por el botón), sin llamar al modelo
+        context['resumen_ia'] = resumen_ia.guardado(denuncia)
         
         # Traer toda la información relacionada
         context['asignaciones'] = DenunciaAsignaciones.objects.filter(denuncia=denuncia).select_related('funcionario').order_by('-asignado_en')
@@ -583,11 +595,14 @@ class DenunciaDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView
 
         context['respuestas'] = respuestas_queryset
         
-        # Intentar obtener firma si existe (OneToOne)
-        try:
-            context['firma'] = denuncia.denunciafirmas
-        except DenunciaFirmas.DoesNotExist:
-            context['firma'] = None
+        # Intentar obtener firma si existe (OneToOne, sin traer firma_base64)
+        context['firma'] = DenunciaFirmas.objects.filter(denuncia=denuncia).first()
+
+        # respuesta automática de resolución (cola de trabajos): en curso o fallida
+        trabajo = Trabajos.objects.filter(
+            clave=tareas_ia.clave(tareas_ia.RESPUESTA_RESOLUCION, denuncia.id),
+        ).order_by('-id').first()
+        context['trabajo_respuesta'] = trabajo if trabajo and trabajo.estado != trabajos.HECHO else None
             
         return context
 
@@ -625,6 +640,29 @@ class DenunciaDeleteView(CrudMessageMixin, LoginRequiredMixin, PermissionRequire
     login_url = 'web:login'
 
 
+@login_required
+@permission_required('db.view_denuncias', raise_exception=True)
+def denuncia_firma_imagen(request, pk):
+    """Devuelve la imagen de la firma de la denuncia (firma_blobs; solo se carga aquí)."""
+    return _firma_response(DenunciaFirmas.objects.select_related('firma_blob').filter(denuncia_id=pk).first())
+
+
+@login_required
+@permission_required('db.view_denuncias', raise_exception=True)
+def ciudadano_firma_imagen(request, pk):
+    """Devuelve la imagen de la firma registrada en el perfil del ciudadano."""
+    return _firma_response(Ciudadanos.objects.select_related('firma_blob').filter(usuario_id=pk).first())
+
+
+def _firma_response(obj):
+    contenido, content_type = leer_firma(obj)
+    if not contenido:
+        raise Http404("Firma no existe")
+    response = HttpResponse(contenido, content_type=content_type)
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
 # --- Crear respuesta para una denuncia ---
 @login_required
 @permission_required('db.add_denunciarespuestas', raise_exception=True)
@@ -811,7 +849,7 @@ class MisDenunciasListView(LoginRequiredMixin, ListView):
                     'tipo_denuncia',
                     'asignado_departamento',
                     'asignado_funcionario'
-                ).order_by('-created_at')
+                ).defer('ciudadano__firma_base64').order_by('-created_at')
             else:
                 queryset = Denuncias.objects.filter(
                     Q(asignado_funcionario=funcionario) |
@@ -821,7 +859,7 @@ class MisDenunciasListView(LoginRequiredMixin, ListView):
                     'tipo_denuncia',
                     'asignado_departamento',
                     'asignado_funcionario'
-                ).order_by('-created_at')
+                ).defer('ciudadano__firma_base64').order_by('-created_at')
             
             # Filtros adicionales por parámetros GET
             estado = self.request.GET.get('estado')
@@ -865,14 +903,10 @@ class MisDenunciasListView(LoginRequiredMixin, ListView):
             
         return context
 
-from django.views.decorators.http import require_POST
-import json
-import re
 @login_required
 @require_POST
 def llm_response(request, denuncia_id):
     import logging
-    from django.http import JsonResponse
     logger = logging.getLogger(__name__)
     
     if not api_key:
@@ -881,65 +915,28 @@ def llm_response(request, denuncia_id):
 
     
     try:
-        denuncia = Denuncias.objects.select_related(
-            'tipo_denuncia',
-            'asignado_departamento',
-            'asignado_funcionario__web_user'
-        ).get(id=denuncia_id)
-
-        if denuncia.estado == 'pendiente':
-            denuncia.estado = 'en_proceso'
-            denuncia.save()
-
-        prompt = f"""
-            Eres un asistente especializado en gestión de denuncias ciudadanas
-            para la Municipalidad de Salcedo, Cotopaxi, Ecuador.
-
-            Analiza la siguiente denuncia y responde EXCLUSIVAMENTE en JSON válido
-            sin texto adicional, sin markdown, sin comentarios.
-
-            Formato requerido:
-            {{
-            "resumen": "string",
-            "sugerencias_accion": "string"
-            }}
-
-            Datos de la denuncia:
-            - Ciudadano: {f"{denuncia.ciudadano.nombres} {denuncia.ciudadano.apellidos}" if denuncia.ciudadano else 'Desconocido'}
-            - Descripción: {denuncia.descripcion}
-            - Referencia: {denuncia.referencia}
-            - Tipo: {denuncia.tipo_denuncia.nombre}
-            - Estado: {denuncia.estado}
-            - Departamento: {denuncia.asignado_departamento.nombre if denuncia.asignado_departamento else 'No asignado'}
-            - Funcionario: {denuncia.asignado_funcionario.web_user.get_full_name() if denuncia.asignado_funcionario else 'No asignado'}
-
-            Responde al ciudadano en español, Con un tono empático y cercano para que el ciudadano se sienta escuchado.
-            Asegúrate de que el JSON esté correctamente formateado. 
-
-            """
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un asistente útil que responde siempre en JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
+        # resumen guardado mientras la denuncia no cambie; forzar=1 lo regenera
+        denuncia = resumen_ia.cargar(denuncia_id)
+        forzar = request.GET.get('forzar') == '1'
+        if not forzar:
+            resumen = resumen_ia.guardado(denuncia)
+            if resumen is not None:
+                return JsonResponse({"success": True, "response": resumen_ia.texto(resumen), "guardado": True})
+
+        # la generación va a la cola; el panel consulta el estado del trabajo
+        trabajo = trabajos.encolar(
+            tareas_ia.RESUMEN_IA,
+            {"denuncia_id": denuncia.id, "forzar": forzar},
+            clave=tareas_ia.clave(tareas_ia.RESUMEN_IA, denuncia.id),
+        )
+        return JsonResponse(
+            {
+                "success": True,
+                "trabajo": trabajos.estado(trabajo),
+                "estado_url": reverse('web:trabajo_estado', args=[trabajo.id]),
+            },
+            status=202
         )
-
-        raw_text = response.choices[0].message.content.strip()
-
-        match = re.search(r'\{.*\}', raw_text, re.DOTALL)
-        if not match:
-            if raw_text:
-                return JsonResponse({"response": raw_text})
-            raise ValueError("La respuesta no contiene JSON válido ni texto recuperable")
-
-        data = json.loads(match.group())
-        
-        formatted_response = f"RESUMEN:\n{data.get('resumen', '')}\n\nSUERENCIAS DE ACCIÓN:\n{data.get('sugerencias_accion', '')}"
-        
-        return JsonResponse({"success": True, "response": formatted_response})
 
     except Denuncias.DoesNotExist:
         return JsonResponse(
@@ -947,12 +944,6 @@ def llm_response(request, denuncia_id):
             status=404
         )
 
-    except json.JSONDecodeError:
-        return JsonResponse(
-            {"success": False, "error": "Error al decodificar JSON del modelo"},
-            status=500
-        )
-
     except Exception as e:
             return JsonResponse(
             {"success": False, "error": str(e)},
@@ -962,66 +953,146 @@ def llm_response(request, denuncia_id):
 @require_POST
 @login_required
 def resolver_denuncia(request, denuncia_id):
-    """Marca una denuncia como resuelta."""
-    denuncia = Denuncias.objects.select_related(
-            'tipo_denuncia',
-            'asignado_departamento',
-            'asignado_funcionario__web_user'
-        ).get(id=denuncia_id)
-    
-    denuncia.estado = 'resuelto'
-    denuncia.save()
-
-    prompt = f"""
-            Eres un asistente especializado en gestión de denuncias ciudadanas
-            para la Municipalidad de Salcedo, Cotopaxi, Ecuador.
-
-            Datos de la denuncia:
-            - Ciudadano: {f"{denuncia.ciudadano.nombres} {denuncia.ciudadano.apellidos}" if denuncia.ciudadano else 'Desconocido'}
-            - Descripción: {denuncia.descripcion}
-            - Referencia: {denuncia.referencia}
-            - Tipo: {denuncia.tipo_denuncia.nombre}
-            - Estado: {denuncia.estado}
-            - Departamento: {denuncia.asignado_departamento.nombre if denuncia.asignado_departamento else 'No asignado'}
-            - Funcionario: {denuncia.asignado_funcionario.web_user.get_full_name() if denuncia.asignado_funcionario else 'No asignado'}
-
-            Responde al ciudadano en español, sin formato, solo texto.
-            Tu tono debe ser empático y cercano para que el ciudadano se sienta escuchado, sobre la resolución de su denuncia.
-
-            """
-    response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un asistente útil que siempre responde en texto plano."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-        )
+    """Marca una denuncia como resuelta; la respuesta al ciudadano se genera en segundo plano."""
 
-    raw_text = response.choices[0].message.content.strip()
+    funcionario = Funcionarios.objects.filter(web_user=request.user).first()
 
+    # cambio de estado, historial y trabajo en la misma transacción
+    with transaction.atomic():
+        denuncia = get_object_or_404(Denuncias.objects.select_for_update(), id=denuncia_id)
+        estado_anterior = denuncia.estado
+        denuncia.estado = 'resuelto'
+        denuncia.updated_at = timezone.now()
+        denuncia.save(update_fields=['estado', 'updated_at'])
 
+        DenunciaHistorial.objects.create(
+                **{
+                    "id": get_uuid(),
+                    "estado_anterior": estado_anterior,
+                    "estado_nuevo": 'resuelto',
+                    "comentario": "Denuncia marcada como resuelta.",
+                    "cambiado_por_funcionario": funcionario,
+                    "created_at": timezone.now(),
+                    "denuncia_id": denuncia.id
+                }
+            )
 
-    #Crear respuesta LLM automática
-    DenunciaHistorial.objects.create(
-            **{
-                "id": get_uuid(),
-                "estado_anterior": 'en_proceso',
-                "estado_nuevo": 'resuelto',
-                "comentario": "Denuncia marcada como resuelta.",
-                "cambiado_por_funcionario": Funcionarios.objects.get(user=request.user) if hasattr(request.user, 'funcionarios') else None,
-                "created_at": timezone.now(),
-                "denuncia_id": denuncia.id
-            }
-        )
-    
-    DenunciaRespuestas.objects.create(
-            id=get_uuid(),
-            denuncia=denuncia,
-            funcionario=request.user.funcionarios if hasattr(request.user, 'funcionarios') else None,
-            mensaje=raw_text,
-            created_at=timezone.now(),
-            updated_at=timezone.now(),
+        #Crear respuesta LLM automática (worker de trabajos)
+        trabajos.encolar(
+            tareas_ia.RESPUESTA_RESOLUCION,
+            {
+                "denuncia_id": denuncia.id,
+                "funcionario_id": funcionario.pk if funcionario else None,
+                "respuesta_id": get_uuid(),
+            },
+            clave=tareas_ia.clave(tareas_ia.RESPUESTA_RESOLUCION, denuncia.id),
         )
 
     return redirect('web:denuncia_detail', pk=denuncia_id)
+
+
+@login_required
+@permission_required('db.view_denuncias', raise_exception=True)
+def trabajo_estado(request, trabajo_id):
+    """Estado de un trabajo en segundo plano (polling desde el panel)."""
+    trabajo = get_object_or_404(Trabajos, id=trabajo_id)
+    return JsonResponse({"success": True, "trabajo": trabajos.estado(trabajo)})
+
+
+@login_required
+@require_POST
+@permission_required('db.view_denuncias', raise_exception=True)
+def trabajo_reintentar(request, trabajo_id):
+    """Vuelve a encolar un trabajo fallido."""
+    get_object_or_404(Trabajos, id=trabajo_id)
+    trabajo = trabajos.reintentar(trabajo_id)
+    return JsonResponse(
+        {
+            "success": True,
+            "trabajo": trabajos.estado(trabajo),
+            "estado_url": reverse('web:trabajo_estado', args=[trabajo.id]),
+        },
+        status=202
+    )
+
+
+@login_required
+@permission_required('db.view_llmuso', raise_exception=True)
+def uso_llm_view(request):
+    """Panel de uso del LLM: llamadas, tokens, costo estimado y latencia por día y sitio."""
+    from django.db.models import Avg, Count, Max, Q, Sum
+    from django.db.models.functions import TruncDate
+    from datetime import timedelta
+
+    try:
+        dias = min(max(int(request.GET.get('dias', 14)), 1), 90)
+    except ValueError:
+        dias = 14
+    desde = timezone.now() - timedelta(days=dias)
+
+    filas = LlmUso.objects.filter(created_at__gte=desde).annotate(
+        dia=TruncDate('created_at')
+    ).values('dia', 'sitio', 'modelo').annotate(
+        llamadas=Count('id'),
+        fallidas=Count('id', filter=~Q(resultado=uso_llm.OK)),
+        entrada=Sum('tokens_entrada'),
+        cacheados=Sum('tokens_cacheados'),
+        salida=Sum('tokens_salida'),
+        latencia_media=Avg('latencia_ms'),
+        latencia_max=Max('latencia_ms'),
+    ).order_by('-dia', 'sitio')
+
+    # diario por flujo (sitio sin la ruta rápido/completo) y totales del período por sitio
+    diario = {}
+    por_sitio = {}
+    costo_por_dia = {}
+    for f in filas:
+        f['costo'] = uso_llm.costo(f['modelo'], f['entrada'], f['cacheados'], f['salida'])
+        flujo = uso_llm.familia(f['sitio'])
+        dia = f['dia'].strftime('%Y-%m-%d')
+
+        d = diario.setdefault((dia, flujo), {
+            'dia': dia, 'flujo': flujo, 'llamadas': 0, 'fallidas': 0, 'entrada': 0,
+            'cacheados': 0, 'salida': 0, 'costo': 0.0, 'latencia_total': 0.0, 'latencia_max': 0,
+        })
+        t = por_sitio.setdefault(f['sitio'], {
+            'sitio': f['sitio'], 'modelos': set(), 'llamadas': 0, 'fallidas': 0, 'entrada': 0,
+            'cacheados': 0, 'salida': 0, 'costo': 0.0, 'latencia_total': 0.0, 'latencia_max': 0,
+        })
+        t['modelos'].add(f['modelo'] or '-')
+        for acc in (d, t):
+            acc['llamadas'] += f['llamadas']
+            acc['fallidas'] += f['fallidas']
+            acc['entrada'] += f['entrada'] or 0
+            acc['cacheados'] += f['cacheados'] or 0
+            acc['salida'] += f['salida'] or 0
+            acc['costo'] += f['costo'] or 0
+            acc['latencia_total'] += (f['latencia_media'] or 0) * f['llamadas']
+            acc['latencia_max'] = max(acc['latencia_max'], f['latencia_max'] or 0)
+        costo_por_dia.setdefault(flujo, {}).setdefault(dia, 0.0)
+        costo_por_dia[flujo][dia] += f['costo'] or 0
+
+    for acc in list(diario.values()) + list(por_sitio.values()):
+        acc['latencia_media'] = round(acc['latencia_total'] / acc['llamadas']) if acc['llamadas'] else 0
+        acc['costo'] = round(acc['costo'], 4)
+    for t in por_sitio.values():
+        t['modelos'] = ', '.join(sorted(t['modelos']))
+
+    chart_costo = LineChart(
+        [{'name': flujo, 'data': {k: round(v, 4) for k, v in sorted(datos.items())}} for flujo, datos in sorted(costo_por_dia.items())],
+        title="Costo estimado por día (USD)",
+        xtitle="Día",
+        ytitle="USD",
+        download={'filename': 'uso_llm_costo'}
+    )
+
+    context = {
+        'dias': dias,
+        'diario': sorted(diario.values(), key=lambda d: (d['dia'], d['flujo']), reverse=True),
+        'por_sitio': sorted(por_sitio.values(), key=lambda t: t['costo'], reverse=True),
+        'total_llamadas': sum(t['llamadas'] for t in por_sitio.values()),
+        'total_costo': round(sum(t['costo'] for t in por_sitio.values()), 4),
+        'chart_costo': chart_costo,
+        'pendientes': uso_llm.metricas()['pendientes'],
+    }
+    return render(request, 'uso_llm/panel.html', context)